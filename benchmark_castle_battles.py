@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+محاكاة آلاف معارك القلاع: المسار القديم مقابل محرك المعارك
+Castle Battle Simulation - legacy multi-statement path vs battle engine
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import config.database
+from config.database import enable_wal
+from config.migrations import apply_migrations
+
+
+def seed_database(path: str, castles: int) -> None:
+    """إنشاء قاعدة بيانات تجريبية بقلاع وموارد"""
+    apply_migrations(path)
+    enable_wal(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, username, first_name, balance) VALUES (?, ?, ?, ?)",
+            [(1000 + i, f"user{i}", f"User {i}", 1000) for i in range(castles)]
+        )
+        conn.executemany(
+            "INSERT INTO user_castles (user_id, name, castle_id, level) VALUES (?, ?, ?, ?)",
+            [(1000 + i, f"Castle {i}", f"C{i:07d}", 1 + i % 5) for i in range(castles)]
+        )
+        conn.executemany(
+            "INSERT INTO user_resources (user_id, gold, workers) VALUES (?, ?, ?)",
+            [(1000 + i, 200, 10) for i in range(castles)]
+        )
+    conn.close()
+
+
+def total_gold(path: str) -> float:
+    """مجموع الذهب لدى جميع اللاعبين"""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT SUM(gold) FROM user_resources").fetchone()[0]
+    finally:
+        conn.close()
+
+
+async def legacy_battle(attacker_id: int, target_castle_id: str, rng: random.Random) -> None:
+    """المسار القديم: قراءات منفصلة ثم ست كتابات كل منها باتصال مستقل"""
+    from database.operations import execute_query
+
+    attacker_castle = await execute_query(
+        "SELECT * FROM user_castles WHERE user_id = ?", (attacker_id,), fetch_one=True)
+    target_castle = await execute_query(
+        "SELECT * FROM user_castles WHERE castle_id = ? AND user_id != ?",
+        (target_castle_id, attacker_id), fetch_one=True)
+    if not attacker_castle or not target_castle:
+        return
+    await execute_query(
+        "SELECT created_at FROM castle_battles WHERE attacker_user_id = ? ORDER BY created_at DESC LIMIT 1",
+        (attacker_id,), fetch_one=True)
+    attacker_resources = await execute_query(
+        "SELECT * FROM user_resources WHERE user_id = ?", (attacker_id,), fetch_one=True)
+    defender_resources = await execute_query(
+        "SELECT * FROM user_resources WHERE user_id = ?", (target_castle['user_id'],), fetch_one=True)
+
+    attacker_power = attacker_castle['level'] * 100 + attacker_resources['gold'] * 10 + rng.randint(50, 150)
+    defender_power = target_castle['level'] * 120 + defender_resources['gold'] * 10 + rng.randint(75, 175)
+    attacker_wins = attacker_power > defender_power
+    gold_stolen = 0
+    if attacker_wins:
+        max_steal = min(int(defender_resources['gold']) // 2, 100)
+        gold_stolen = rng.randint(max_steal // 2, max_steal) if max_steal > 0 else 0
+        if gold_stolen > 0:
+            await execute_query(
+                "UPDATE user_resources SET gold = CASE WHEN gold >= ? THEN gold - ? ELSE 0 END WHERE user_id = ?",
+                (gold_stolen, gold_stolen, target_castle['user_id']))
+            # قراءة ثم كتابة كما في add_resource_to_user
+            current = await execute_query(
+                "SELECT gold FROM user_resources WHERE user_id = ?", (attacker_id,), fetch_one=True)
+            await execute_query(
+                "UPDATE user_resources SET gold = ? WHERE user_id = ?",
+                (current['gold'] + gold_stolen, attacker_id))
+
+    winner, loser = (attacker_id, target_castle['user_id']) if attacker_wins else (target_castle['user_id'], attacker_id)
+    await execute_query(
+        "UPDATE user_castles SET wins = wins + 1, total_battles = total_battles + 1 WHERE user_id = ?", (winner,))
+    await execute_query(
+        "UPDATE user_castles SET losses = losses + 1, total_battles = total_battles + 1 WHERE user_id = ?", (loser,))
+    await execute_query(
+        """INSERT INTO castle_battles (attacker_user_id, defender_user_id, attacker_castle_id, defender_castle_id,
+           winner, attacker_power, defender_power, gold_stolen, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (attacker_id, target_castle['user_id'], attacker_castle['castle_id'], target_castle['castle_id'],
+         'attacker' if attacker_wins else 'defender', attacker_power, defender_power, gold_stolen,
+         datetime.now().isoformat()))
+
+
+async def engine_battle(attacker_id: int, target_castle_id: str, rng: random.Random) -> None:
+    """محرك المعارك: استعلام تحميل واحد ومعاملة واحدة"""
+    from modules.castle_battle import BattleEngine, resolve_battle
+
+    # محرك جديد لكل معركة حتى لا تمنع فترة الانتظار المحاكاة
+    engine = BattleEngine()
+    sides = await engine.load_sides(attacker_id, target_castle_id)
+    if not sides or sides['d_user_id'] is None:
+        return
+    outcome = resolve_battle(
+        {'level': sides['a_level'], 'gold': sides['a_gold'], 'workers': sides['a_workers']},
+        {'level': sides['d_level'], 'gold': sides['d_gold'], 'workers': sides['d_workers']},
+        rng
+    )
+    await engine.apply(attacker_id, sides['d_user_id'], sides['a_castle_id'], sides['d_castle_id'], outcome)
+
+
+async def run_battles(battle, battles: int, castles: int, concurrency: int) -> float:
+    """تشغيل المعارك بالتوازي وإرجاع الزمن الكلي"""
+    semaphore = asyncio.Semaphore(concurrency)
+    rng = random.Random(42)
+    workload = []
+    for _ in range(battles):
+        attacker, defender = rng.sample(range(castles), 2)
+        workload.append((1000 + attacker, f"C{defender:07d}"))
+
+    async def worker(attacker_id: int, target_castle_id: str):
+        async with semaphore:
+            await battle(attacker_id, target_castle_id, rng)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(attacker_id, castle_id) for attacker_id, castle_id in workload))
+    return time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="مقارنة مسار المعارك القديم بمحرك المعارك")
+    parser.add_argument("--battles", type=int, default=3000)
+    parser.add_argument("--castles", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for label, battle in (("old", legacy_battle), ("new", engine_battle)):
+            path = os.path.join(tmp, f"{label}.db")
+            seed_database(path, args.castles)
+            config.database.DATABASE_URL = path
+            gold_before = total_gold(path)
+            results[label] = await run_battles(battle, args.battles, args.castles, args.concurrency)
+            # الذهب ينتقل بين اللاعبين فقط - أي فرق يعني ذهباً مكرراً أو مفقوداً
+            drift = total_gold(path) - gold_before
+            print(f"{label:>4}: {results[label]:.2f}s  ({args.battles / results[label]:.0f} معركة/ث)  "
+                  f"فرق الذهب: {drift:+.0f}")
+
+    print(f"تسريع: {results['old'] / results['new']:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+قياس مطابقة الأوامر المخصصة: المرور الخطي القديم مقابل الفهرس المُجمّع
+Custom Command Matching Benchmark - legacy linear keyword scan vs compiled matcher
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List, Optional
+
+from utils.text_matcher import KeywordMatcher
+
+SYLLABLES = ("يو", "كي", "سا", "لم", "حب", "نو", "ري", "دا", "مي", "تا", "شو", "فر", "قل", "بي", "هو")
+CHAT_WORDS = ("هلا", "والله", "شلونكم", "صباح", "الخير", "يا", "جماعة", "وين", "الناس", "تمام", "ههههه")
+
+
+def make_keyword(rng: random.Random) -> str:
+    words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(1, 2))]
+    return " ".join(words)
+
+
+def make_message(rng: random.Random, keywords: List[str], hit_ratio: float) -> str:
+    words = [rng.choice(CHAT_WORDS) for _ in range(rng.randint(2, 12))]
+    roll = rng.random()
+    if roll < hit_ratio / 3:
+        return rng.choice(keywords)
+    if roll < hit_ratio:
+        words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+    return " ".join(words)
+
+
+def legacy_match(commands: Dict[str, List[str]], message_text: str) -> Optional[str]:
+    """نسخة من حلقة get_custom_response القديمة"""
+    message_lower = message_text.lower().strip()
+    for keyword, responses in commands.items():
+        if (message_lower == keyword.lower() or
+                keyword.lower() in message_lower or
+                any(word.strip() == keyword.lower() for word in message_lower.split())):
+            if responses:
+                return keyword
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="قياس مطابقة الأوامر المخصصة")
+    parser.add_argument("--keywords", type=int, default=1000, help="عدد الأوامر في المجموعة")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--hit-ratio", type=float, default=0.2, help="نسبة الرسائل التي تحتوي أمراً")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    commands: Dict[str, List[str]] = {}
+    while len(commands) < args.keywords:
+        commands[make_keyword(rng)] = ["رد"]
+    keywords = list(commands)
+    messages = [make_message(rng, keywords, args.hit_ratio) for _ in range(args.messages)]
+
+    started = time.perf_counter()
+    matcher = KeywordMatcher(keywords)
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    legacy = [legacy_match(commands, text) for text in messages]
+    legacy_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    indexed = [matcher.match(text) for text in messages]
+    indexed_time = time.perf_counter() - started
+
+    same_hit = sum((a is None) == (b is None) for a, b in zip(legacy, indexed))
+    same_keyword = sum(a == b for a, b in zip(legacy, indexed))
+    hits = sum(a is not None for a in legacy)
+
+    print(f"الأوامر: {args.keywords}  الرسائل: {args.messages}  رسائل مطابقة: {hits}")
+    print(f"بناء الفهرس: {build_time * 1000:.1f}ms  ({len(matcher._automaton)} عقدة)")
+    print(f"  القديم: {legacy_time * 1e6 / args.messages:8.1f}µs/رسالة")
+    print(f"  الفهرس: {indexed_time * 1e6 / args.messages:8.1f}µs/رسالة")
+    print(f"التسريع: {legacy_time / max(indexed_time, 1e-9):.0f}x")
+    print(f"نفس قرار المطابقة: {same_hit}/{args.messages}  نفس الأمر: {same_keyword}/{args.messages}")
+    if same_keyword != args.messages:
+        raise SystemExit("❌ الفهرس اختار أمراً مختلفاً عن الحلقة القديمة")
+
+
+if __name__ == "__main__":
+    main()
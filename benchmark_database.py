@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+قياس أداء إعدادات قاعدة البيانات تحت عاصفة رسائل
+Database Settings Benchmark - message-storm replay
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import aiosqlite
+
+from config.database import TunedConnection, enable_wal
+from config.migrations import apply_migrations
+
+
+def seed_database(path: str, users: int) -> None:
+    """إنشاء قاعدة بيانات تجريبية بعدد من المستخدمين"""
+    apply_migrations(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, username, first_name, balance) VALUES (?, ?, ?, ?)",
+            [(1000 + i, f"user{i}", f"User {i}", 1000) for i in range(users)]
+        )
+    conn.close()
+
+
+async def handle_message(connect, user_id: int, chat_id: int) -> None:
+    """محاكاة ما يكتبه البوت لكل رسالة: قراءة المستخدم، النشاط، الخبرة، التحليلات"""
+    async with connect() as db:
+        async with db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)) as cursor:
+            await cursor.fetchone()
+        await db.execute(
+            "UPDATE users SET updated_at = ? WHERE user_id = ?",
+            (datetime.now().isoformat(), user_id)
+        )
+        await db.commit()
+
+    async with connect() as db:
+        await db.execute("UPDATE users SET xp = xp + 1 WHERE user_id = ?", (user_id,))
+        await db.commit()
+
+    async with connect() as db:
+        await db.execute(
+            "INSERT INTO activity_logs (chat_id, user_id, activity_type) VALUES (?, ?, ?)",
+            (chat_id, user_id, "message")
+        )
+        await db.commit()
+
+
+async def run_storm(connect, messages: int, users: int, concurrency: int) -> float:
+    """إعادة تشغيل عاصفة الرسائل وإرجاع الزمن الكلي"""
+    semaphore = asyncio.Semaphore(concurrency)
+    rng = random.Random(42)
+    workload = [(1000 + rng.randrange(users), -100 - rng.randrange(5)) for _ in range(messages)]
+
+    async def worker(user_id: int, chat_id: int):
+        async with semaphore:
+            await handle_message(connect, user_id, chat_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(user_id, chat_id) for user_id, chat_id in workload))
+    return time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="مقارنة إعدادات SQLite القديمة والجديدة")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for label in ("old", "new"):
+            path = os.path.join(tmp, f"{label}.db")
+            seed_database(path, args.users)
+
+            if label == "old":
+                def connect(path=path):
+                    return aiosqlite.connect(path)
+            else:
+                enable_wal(path)
+
+                def connect(path=path):
+                    return aiosqlite.connect(path, factory=TunedConnection)
+
+            results[label] = await run_storm(connect, args.messages, args.users, args.concurrency)
+
+    for label, elapsed in results.items():
+        print(f"{label:>4}: {elapsed:.2f}s  ({args.messages / elapsed:.0f} رسالة/ث)")
+    print(f"تسريع: {results['old'] / results['new']:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+قياس توقف حلقة الأحداث بسبب التسجيل أثناء سيل من الرسائل
+Logging Benchmark - event-loop stall under a message storm, file handler vs queue pipeline
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from utils.log_pipeline import LOG_FORMAT, setup_queue_logging, stop_queue_logging
+
+HOT_LOGGER = "modules.custom_replies"
+
+
+class SlowDiskHandler(logging.FileHandler):
+    """معالج ملف يحاكي قرصاً بطيئاً أو مزدحماً بانتظار ثابت لكل كتابة"""
+
+    def __init__(self, log_file: str, latency: float):
+        super().__init__(log_file, encoding='utf-8')
+        self.latency = latency
+
+    def emit(self, record: logging.LogRecord) -> None:
+        super().emit(record)
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def setup_legacy(log_file: str, latency: float) -> None:
+    """الإعداد القديم: FileHandler متزامن على المسجل الرئيسي"""
+    handler = SlowDiskHandler(log_file, latency)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+def legacy_message(text: str, group_id: int) -> None:
+    """تسجيل رسالة واحدة كما كان يفعل check_for_custom_replies"""
+    logging.info(f"فحص رد مخصص للنص: '{text}' في المجموعة: {group_id}")
+    logging.info(f"نتيجة البحث في المجموعة: {None}")
+    logging.info(f"نتيجة البحث العامة: {None}")
+    logging.info("لم يتم العثور على رد مخصص")
+
+
+def pipeline_message(text: str, group_id: int) -> None:
+    """تسجيل رسالة واحدة كما يفعل check_for_custom_replies الآن"""
+    logger = logging.getLogger(HOT_LOGGER)
+    logger.debug("فحص رد مخصص للنص: '%s' في المجموعة: %s", text, group_id)
+    logger.debug("نتيجة البحث في المجموعة: %s", None)
+    logger.debug("نتيجة البحث العامة: %s", None)
+    logger.info("تم العثور على رد مخصص في المجموعة %s: %s", group_id, text)
+
+
+async def measure(log_message, messages: int, batch: int) -> dict:
+    """تشغيل سيل رسائل مع نبضة تقيس تأخر حلقة الأحداث"""
+    stalls = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        interval = 0.001
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            stalls.append(max(0.0, time.perf_counter() - started - interval))
+
+    async def storm():
+        for i in range(messages):
+            log_message(f"رسالة تجريبية رقم {i}", -1000 - i % 50)
+            if i % batch == 0:
+                await asyncio.sleep(0)
+        done.set()
+
+    started = time.perf_counter()
+    await asyncio.gather(heartbeat(), storm())
+    elapsed = time.perf_counter() - started
+    stalls.sort()
+    return {
+        "elapsed": elapsed,
+        "total_stall": sum(stalls),
+        "p99": stalls[int(len(stalls) * 0.99)] if stalls else 0.0,
+        "max": stalls[-1] if stalls else 0.0
+    }
+
+
+def report(label: str, result: dict) -> None:
+    print(f"{label:>6}: الزمن {result['elapsed']:.2f}s  التوقف الكلي {result['total_stall'] * 1000:.0f}ms  "
+          f"p99 {result['p99'] * 1000:.2f}ms  الأقصى {result['max'] * 1000:.2f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="قياس توقف حلقة الأحداث بسبب التسجيل")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--batch", type=int, default=50, help="عدد الرسائل بين كل إفساح لحلقة الأحداث")
+    parser.add_argument("--disk-latency-ms", type=float, default=0.0, help="انتظار محاكى لكل كتابة على القرص")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        latency = args.disk_latency_ms / 1000
+        setup_legacy(os.path.join(tmp, "legacy.log"), latency)
+        legacy = asyncio.run(measure(legacy_message, args.messages, args.batch))
+        report("القديم", legacy)
+
+        listener = setup_queue_logging(
+            logging.INFO, os.path.join(tmp, "pipeline.log"), 10 * 1024 * 1024, 5, 10000,
+            sampled_loggers=(HOT_LOGGER,), sample_window=60, sample_burst=20
+        )
+        # استبدال الملف ووحدة التحكم بنفس معالج القرص المستخدم في الإعداد القديم
+        listener.handlers = (SlowDiskHandler(os.path.join(tmp, "pipeline.log"), latency),)
+        listener.handlers[0].setFormatter(logging.Formatter(LOG_FORMAT))
+        queue_handler = logging.getLogger().handlers[0]
+        # نفس السجلات القديمة عبر الطابور لفصل أثر الطابور عن أثر أخذ العينات
+        queued = asyncio.run(measure(legacy_message, args.messages, args.batch))
+        report("الطابور", queued)
+        pipeline = asyncio.run(measure(pipeline_message, args.messages, args.batch))
+        stop_queue_logging(listener)
+        report("العينات", pipeline)
+        # الطابور الممتلئ يُسقط السجلات بدل حجب حلقة الأحداث
+        print(f"سجلات أُسقطت لامتلاء الطابور: {queue_handler.dropped}")
+
+        print(f"تقليل التوقف الكلي: {legacy['total_stall'] / max(pipeline['total_stall'], 1e-9):.1f}x")
+        logging.getLogger().handlers.clear()
+
+
+if __name__ == "__main__":
+    main()
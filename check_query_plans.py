@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+فحص خطط استعلامات المسارات الساخنة - يفشل عند وجود مسح كامل للجدول
+Hot-Path Query Plan Check - fails on full table scans
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+from config.migrations import apply_migrations
+from database.operations import GROUP_MEMBERS_QUERY
+from modules import castle, castle_battle, dashboard, farm, resource_ledger, stocks, theft
+
+# الاستعلامات الساخنة مستوردة من الوحدات التي تنفذها حتى لا تنحرف عنها (الوحدة، الاستعلام)
+HOT_QUERIES = [
+    ("theft.get_theft_stats", theft.THEFT_STATS_QUERY),
+    ("theft.show_top_thieves", theft.TOP_THIEVES_QUERY),
+    ("farm.get_farm_statistics", farm.HARVEST_INCOME_QUERY),
+    ("farm.get_farm_statistics", farm.PLANTING_COSTS_QUERY),
+    ("stocks.get_user_stocks", stocks.USER_STOCK_QUERY),
+    ("stocks.get_user_stocks", stocks.USER_STOCKS_QUERY),
+    ("castle.get_user_castle", castle.USER_CASTLE_QUERY),
+    ("castle.get_castle_by_id", castle.CASTLE_BY_ID_QUERY),
+    ("resource_ledger.get_resources", resource_ledger.USER_RESOURCES_QUERY),
+    ("castle_battle.load_sides", castle_battle.BATTLE_SIDES_QUERY),
+    ("dashboard.get_activity_trends", dashboard.DAILY_ACTIVE_USERS_QUERY),
+    ("dashboard.get_activity_trends", dashboard.DAILY_TRANSACTIONS_QUERY),
+    ("dashboard.get_member_statistics", dashboard.ACTIVE_MEMBERS_QUERY),
+    ("dashboard.get_member_statistics", dashboard.NEW_MEMBERS_QUERY),
+    ("dashboard.get_financial_statistics", dashboard.MEMBERS_BALANCE_QUERY),
+    ("operations.get_all_group_members", GROUP_MEMBERS_QUERY),
+    # صفحات الترقيم المفتاحي: الصفحة الأولى ثم التالية والسابقة بعد المؤشر
+    *(
+        (f"castle.build_castles_page ({direction}, {'cursor' if has_cursor else 'first'})",
+         castle.castles_page_query(direction, has_cursor))
+        for direction, has_cursor in (("next", False), ("next", True), ("prev", True))
+    ),
+    *(
+        (f"castle.build_battles_page ({direction}, {'cursor' if has_cursor else 'first'})",
+         castle.battles_page_query(direction, has_cursor))
+        for direction, has_cursor in (("next", False), ("next", True), ("prev", True))
+    ),
+]
+
+
+def find_full_scans(conn: sqlite3.Connection, query: str) -> list:
+    """إرجاع خطوات الخطة التي تمسح جدولاً كاملاً"""
+    params = (None,) * query.count("?")
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    # مسح نتيجة استعلام فرعي محدود (MATERIALIZE) ليس مسحاً لجدول
+    return [row[3] for row in plan if row[3].startswith("SCAN ") and not row[3].startswith("SCAN (subquery")]
+
+
+def check_query_plans(db_path: str) -> int:
+    """فحص جميع الاستعلامات الساخنة وإرجاع عدد المخالفات"""
+    failures = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        for name, query in HOT_QUERIES:
+            scans = find_full_scans(conn, query)
+            if scans:
+                failures += 1
+                print(f"❌ {name}: {', '.join(scans)}")
+            else:
+                print(f"✅ {name}")
+    finally:
+        conn.close()
+    return failures
+
+
+def main() -> int:
+    """بناء مخطط جديد من الترحيلات ثم فحص الخطط عليه"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "plans.db")
+        apply_migrations(db_path)
+        failures = check_query_plans(db_path)
+
+    if failures:
+        print(f"❌ {failures} استعلام يمسح جداول كاملة")
+        return 1
+    print("✅ جميع الاستعلامات الساخنة تستخدم الفهارس")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
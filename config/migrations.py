@@ -0,0 +1,709 @@
+"""
+محرك ترحيل مخطط قاعدة البيانات
+Versioned Schema Migration Engine
+"""
+
+import asyncio
+import logging
+import sqlite3
+from typing import Callable, List, Tuple, Union
+
+from .settings import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+MigrationStep = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+def add_column(table: str, column_def: str) -> Callable[[sqlite3.Connection], None]:
+    """إضافة عمود فقط إذا لم يكن موجوداً بدلاً من تجاهل أخطاء ALTER TABLE"""
+    column_name = column_def.split()[0]
+
+    def _step(conn: sqlite3.Connection) -> None:
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column_name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column_def}")
+
+    return _step
+
+
+# المخطط الأساسي (كان يُعاد تنفيذه في كل تشغيل داخل init_database)
+_BASELINE_SCHEMA: List[MigrationStep] = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        balance REAL DEFAULT 0,
+        bank_balance REAL DEFAULT 0,
+        total_earned REAL DEFAULT 0,
+        total_spent REAL DEFAULT 0,
+        level INTEGER DEFAULT 1,
+        xp INTEGER DEFAULT 0,
+        daily_bonus_last TIMESTAMP,
+        bank_type TEXT DEFAULT 'الأهلي',
+        security_level INTEGER DEFAULT 1,
+        successful_thefts INTEGER DEFAULT 0,
+        failed_thefts INTEGER DEFAULT 0,
+        times_stolen INTEGER DEFAULT 0,
+        is_banned BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        transaction_type TEXT,
+        amount REAL,
+        description TEXT,
+        from_user_id INTEGER,
+        to_user_id INTEGER,
+        status TEXT DEFAULT 'completed',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        FOREIGN KEY (from_user_id) REFERENCES users (user_id),
+        FOREIGN KEY (to_user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_properties (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        property_type TEXT,
+        quantity INTEGER DEFAULT 1,
+        purchase_price REAL,
+        income_per_hour REAL,
+        last_income_collected TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS properties (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        property_type TEXT,
+        location TEXT,
+        price REAL,
+        income_per_hour REAL,
+        purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_stocks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        stock_symbol TEXT,
+        quantity INTEGER,
+        purchase_price REAL,
+        purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_investments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        investment_type TEXT,
+        amount REAL,
+        expected_return REAL,
+        start_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        end_date TIMESTAMP,
+        status TEXT DEFAULT 'active',
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_farms (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        farm_type TEXT,
+        level INTEGER DEFAULT 1,
+        productivity REAL,
+        last_harvest TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        upgrade_cost REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_castles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        name TEXT,
+        castle_id TEXT UNIQUE,
+        level INTEGER DEFAULT 1,
+        defense_points INTEGER DEFAULT 100,
+        attack_points INTEGER DEFAULT 50,
+        gold_storage REAL DEFAULT 0,
+        walls_level INTEGER DEFAULT 1,
+        towers_level INTEGER DEFAULT 1,
+        moats_level INTEGER DEFAULT 1,
+        warriors_count INTEGER DEFAULT 10,
+        wins INTEGER DEFAULT 0,
+        losses INTEGER DEFAULT 0,
+        total_battles INTEGER DEFAULT 0,
+        last_treasure_hunt TIMESTAMP,
+        treasure_hunt_stats TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS castle_battles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        attacker_castle_id TEXT,
+        defender_castle_id TEXT,
+        attacker_user_id INTEGER,
+        defender_user_id INTEGER,
+        battle_type TEXT DEFAULT 'raid',
+        attacker_power INTEGER,
+        defender_power INTEGER,
+        winner TEXT,
+        gold_stolen REAL DEFAULT 0,
+        battle_log TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (attacker_user_id) REFERENCES users (user_id),
+        FOREIGN KEY (defender_user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_resources (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        money REAL DEFAULT 0,
+        gold REAL DEFAULT 0,
+        stones REAL DEFAULT 0,
+        workers REAL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_prices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol TEXT,
+        price REAL,
+        change_percent REAL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS activity_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        activity_type TEXT,
+        description TEXT,
+        amount REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS system_settings (
+        key TEXT PRIMARY KEY,
+        value TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS group_ranks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        chat_id INTEGER,
+        rank_type TEXT,
+        promoted_by INTEGER,
+        promoted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        UNIQUE(user_id, chat_id, rank_type)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS banned_users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        chat_id INTEGER,
+        banned_by INTEGER,
+        ban_reason TEXT,
+        banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        UNIQUE(user_id, chat_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS muted_users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        chat_id INTEGER,
+        muted_by INTEGER,
+        mute_reason TEXT,
+        muted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        until_date TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        UNIQUE(user_id, chat_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_warnings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        chat_id INTEGER,
+        warned_by INTEGER,
+        warn_level TEXT,
+        warn_reason TEXT,
+        warned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS group_settings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER,
+        setting_key TEXT,
+        setting_value TEXT,
+        updated_by INTEGER,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(chat_id, setting_key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS forbidden_words (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER,
+        word TEXT,
+        added_by INTEGER,
+        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(chat_id, word)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS admin_actions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        chat_id INTEGER,
+        action_type TEXT,
+        target TEXT,
+        details TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS entertainment_ranks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        chat_id INTEGER,
+        rank_type TEXT,
+        given_by INTEGER,
+        given_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        UNIQUE(user_id, chat_id, rank_type)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS entertainment_marriages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user1_id INTEGER,
+        user2_id INTEGER,
+        chat_id INTEGER,
+        dowry_amount REAL DEFAULT 0,
+        judge_commission REAL DEFAULT 0,
+        married_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user1_id) REFERENCES users (user_id),
+        FOREIGN KEY (user2_id) REFERENCES users (user_id),
+        UNIQUE(user1_id, chat_id),
+        UNIQUE(user2_id, chat_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS marriage_proposals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        proposer_id INTEGER,
+        target_id INTEGER,
+        chat_id INTEGER,
+        dowry_amount REAL,
+        status TEXT DEFAULT 'pending',
+        proposed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        responded_at TIMESTAMP,
+        FOREIGN KEY (proposer_id) REFERENCES users (user_id),
+        FOREIGN KEY (target_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS teams (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        team_name TEXT NOT NULL,
+        team_code TEXT UNIQUE NOT NULL,
+        leader_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        members_count INTEGER DEFAULT 1,
+        points INTEGER DEFAULT 0,
+        level INTEGER DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS team_members (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        team_code TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (team_code) REFERENCES teams (team_code)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS custom_replies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        trigger_word TEXT NOT NULL,
+        reply_text TEXT NOT NULL,
+        created_by INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS custom_commands (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        keyword TEXT NOT NULL,
+        responses TEXT NOT NULL,
+        created_by INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(chat_id, keyword)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS banned_words (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        word TEXT NOT NULL,
+        added_by INTEGER NOT NULL,
+        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_user_id ON transactions(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_user_id ON user_properties(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_stocks_user_id ON user_stocks(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_investments_user_id ON user_investments(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_activity_user_id ON activity_log(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_group_ranks_chat_user ON group_ranks(chat_id, user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_group_settings_chat ON group_settings(chat_id)",
+    "CREATE INDEX IF NOT EXISTS idx_banned_users_chat ON banned_users(chat_id)",
+    "CREATE INDEX IF NOT EXISTS idx_muted_users_chat ON muted_users(chat_id)",
+    "CREATE INDEX IF NOT EXISTS idx_entertainment_ranks_chat ON entertainment_ranks(chat_id)",
+    "CREATE INDEX IF NOT EXISTS idx_teams_chat ON teams(chat_id)",
+    "CREATE INDEX IF NOT EXISTS idx_team_members_code ON team_members(team_code)",
+    "CREATE INDEX IF NOT EXISTS idx_custom_replies_chat ON custom_replies(chat_id)",
+    "CREATE INDEX IF NOT EXISTS idx_banned_words_chat ON banned_words(chat_id)",
+    """
+    CREATE TABLE IF NOT EXISTS activity_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        chat_id INTEGER,
+        activity_type TEXT NOT NULL,
+        activity_data TEXT,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+        date_only TEXT DEFAULT (DATE('now'))
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        active_users INTEGER DEFAULT 0,
+        new_users INTEGER DEFAULT 0,
+        total_transactions INTEGER DEFAULT 0,
+        total_money_flow REAL DEFAULT 0,
+        messages_count INTEGER DEFAULT 0,
+        moderation_actions INTEGER DEFAULT 0,
+        UNIQUE(chat_id, date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS performance_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        metric_name TEXT NOT NULL,
+        metric_value REAL NOT NULL,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+        date_only TEXT DEFAULT (DATE('now'))
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_activity_logs_chat_date ON activity_logs(chat_id, date_only)",
+    "CREATE INDEX IF NOT EXISTS idx_daily_stats_chat_date ON daily_stats(chat_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_performance_metrics_chat_date ON performance_metrics(chat_id, date_only)",
+]
+
+# أعمدة نظام حروب القلاع التي كانت تضاف بمحاولة ALTER TABLE وتجاهل الخطأ
+_CASTLE_WAR_COLUMNS: List[MigrationStep] = [
+    add_column("user_castles", column) for column in [
+        "name TEXT",
+        "level INTEGER DEFAULT 1",
+        "defense_points INTEGER DEFAULT 100",
+        "attack_points INTEGER DEFAULT 50",
+        "gold_storage REAL DEFAULT 0",
+        "last_treasure_hunt TIMESTAMP",
+        "treasure_hunt_stats TEXT",
+        "castle_id TEXT",
+        "walls_level INTEGER DEFAULT 1",
+        "towers_level INTEGER DEFAULT 1",
+        "moats_level INTEGER DEFAULT 1",
+        "warriors_count INTEGER DEFAULT 10",
+        "wins INTEGER DEFAULT 0",
+        "losses INTEGER DEFAULT 0",
+        "total_battles INTEGER DEFAULT 0"
+    ]
+]
+
+# جداول الألعاب التي كانت تنشأ في database_setup.py و database/config/database.py أو يدوياً
+_GAME_TABLES: List[MigrationStep] = [
+    """
+    CREATE TABLE IF NOT EXISTS stocks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        symbol TEXT NOT NULL,
+        quantity INTEGER NOT NULL DEFAULT 0,
+        purchase_price REAL NOT NULL DEFAULT 0.0,
+        purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS investments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        investment_type TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        expected_return REAL NOT NULL,
+        maturity_date TEXT NOT NULL,
+        status TEXT DEFAULT 'active',
+        created_at TEXT NOT NULL,
+        withdrawn_at TEXT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS levels (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER UNIQUE NOT NULL,
+        xp INTEGER DEFAULT 0,
+        level_name TEXT DEFAULT 'نجم 1',
+        world_name TEXT DEFAULT 'عالم النجوم',
+        last_xp_gain REAL DEFAULT 0,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS farm (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        crop_type TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        planted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        harvest_time TIMESTAMP,
+        status TEXT DEFAULT 'growing',
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS castle (
+        user_id INTEGER PRIMARY KEY,
+        level INTEGER DEFAULT 1,
+        defense_points INTEGER DEFAULT 100,
+        attack_points INTEGER DEFAULT 50,
+        gold_production INTEGER DEFAULT 10,
+        last_upgrade TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        action_type TEXT NOT NULL,
+        action_data TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_investments_status ON investments(status)",
+    "CREATE INDEX IF NOT EXISTS idx_investments_maturity ON investments(maturity_date)",
+    "CREATE INDEX IF NOT EXISTS idx_levels_user_id ON levels(user_id)",
+]
+
+# أعمدة أضيفت يدوياً على قاعدة البيانات الحية ولا يعرفها أي مسار تهيئة
+_MANUAL_COLUMNS: List[MigrationStep] = [
+    add_column("users", "bank_name TEXT"),
+    add_column("users", "last_salary_time TIMESTAMP"),
+    add_column("users", "last_simple_investment TEXT"),
+    add_column("user_castles", "is_hidden INTEGER DEFAULT 0"),
+    add_column("entertainment_marriages", "dowry_amount REAL DEFAULT 0"),
+    add_column("entertainment_marriages", "judge_commission REAL DEFAULT 0"),
+]
+
+# فهارس المسارات الساخنة (السرقة، المزرعة، الأسهم، القلاع)
+_HOT_PATH_INDEXES: List[MigrationStep] = [
+    "CREATE INDEX IF NOT EXISTS idx_transactions_type_user ON transactions(transaction_type, user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_to_user ON transactions(to_user_id, transaction_type)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_from_user ON transactions(from_user_id, transaction_type)",
+    "CREATE INDEX IF NOT EXISTS idx_stocks_user_symbol ON stocks(user_id, symbol)",
+    "CREATE INDEX IF NOT EXISTS idx_castle_battles_attacker ON castle_battles(attacker_user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_castle_battles_defender ON castle_battles(defender_user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_user_resources_user ON user_resources(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_user_castles_user ON user_castles(user_id)",
+]
+
+# عدادات السرقة: تعبئة لمرة واحدة من سجل المعاملات ثم تُحدث ذرياً مع كل سرقة
+# (السجلات القديمة من أمر الرد كتبت نوع المعاملة في حقل الوصف: theft / theft_penalty)
+_THEFT_COUNTERS: List[MigrationStep] = [
+    """
+    UPDATE users SET
+        successful_thefts = (
+            SELECT COUNT(*) FROM transactions t
+            WHERE t.user_id = users.user_id
+              AND (t.transaction_type = 'theft_success' OR (t.description = 'theft' AND t.amount > 0))
+        ),
+        failed_thefts = (
+            SELECT COUNT(*) FROM transactions t
+            WHERE t.user_id = users.user_id
+              AND (t.transaction_type = 'theft_failed' OR t.description = 'theft_penalty')
+        ),
+        times_stolen = (
+            SELECT COUNT(*) FROM transactions t
+            WHERE (t.transaction_type = 'theft_success' AND t.from_user_id = users.user_id)
+               OR (t.user_id = users.user_id AND t.description = 'theft' AND t.amount < 0)
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_users_successful_thefts ON users(successful_thefts)",
+]
+
+# فهرس نطاقات التاريخ لاتجاهات لوحة التحكم
+_TREND_INDEXES: List[MigrationStep] = [
+    "CREATE INDEX IF NOT EXISTS idx_transactions_created_at ON transactions(created_at)",
+]
+
+# عضوية المجموعات: صف لكل (مجموعة، مستخدم) بدلاً من فلترة users بعمود chat_id غير موجود
+_CHAT_MEMBERS: List[MigrationStep] = [
+    """
+    CREATE TABLE IF NOT EXISTS chat_members (
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        first_seen TEXT NOT NULL,
+        last_seen TEXT NOT NULL,
+        msg_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (chat_id, user_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_chat_members_last_seen ON chat_members(chat_id, last_seen)",
+    "CREATE INDEX IF NOT EXISTS idx_chat_members_first_seen ON chat_members(chat_id, first_seen)",
+    # تعبئة أولية من سجل الأنشطة (بصيغة ISO نفسها التي يكتبها المتتبع)
+    """
+    INSERT OR IGNORE INTO chat_members (chat_id, user_id, first_seen, last_seen, msg_count)
+    SELECT chat_id, user_id,
+           replace(MIN(timestamp), ' ', 'T'), replace(MAX(timestamp), ' ', 'T'), 0
+    FROM activity_logs
+    WHERE chat_id IS NOT NULL AND user_id IS NOT NULL
+    GROUP BY chat_id, user_id
+    """,
+]
+
+# ترقيم مفتاحي لقائمة القلاع: توحيد القيم الفارغة حتى تطابق شروط الفهرس
+_CASTLE_PAGINATION: List[MigrationStep] = [
+    "UPDATE user_castles SET is_hidden = 0 WHERE is_hidden IS NULL",
+    "UPDATE user_castles SET level = COALESCE(level, 1), wins = COALESCE(wins, 0) WHERE level IS NULL OR wins IS NULL",
+    "CREATE INDEX IF NOT EXISTS idx_user_castles_browse ON user_castles(is_hidden, level, wins)",
+]
+
+# معرفات ملفات تيليجرام المرفوعة: مفتاح المصدر (مسار أو رابط) وبصمة محتواه
+_TELEGRAM_FILE_CACHE: List[MigrationStep] = [
+    """
+    CREATE TABLE IF NOT EXISTS telegram_file_cache (
+        cache_key TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL DEFAULT '',
+        file_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    ) WITHOUT ROWID
+    """,
+]
+
+# قائمة الترحيلات المرتبة - لا تعدل ترحيلاً منشوراً، أضف ترحيلاً جديداً بدلاً من ذلك
+MIGRATIONS: List[Tuple[int, str, List[MigrationStep]]] = [
+    (1, "baseline_schema", _BASELINE_SCHEMA),
+    (2, "castle_war_columns", _CASTLE_WAR_COLUMNS),
+    (3, "game_tables", _GAME_TABLES),
+    (4, "manual_columns", _MANUAL_COLUMNS),
+    (5, "hot_path_indexes", _HOT_PATH_INDEXES),
+    (6, "theft_counters", _THEFT_COUNTERS),
+    (7, "trend_indexes", _TREND_INDEXES),
+    (8, "chat_members", _CHAT_MEMBERS),
+    (9, "castle_pagination", _CASTLE_PAGINATION),
+    (10, "telegram_file_cache", _TELEGRAM_FILE_CACHE),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """قراءة إصدار المخطط الحالي (0 إذا لم يُطبق أي ترحيل)"""
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def apply_migrations(db_path: str = DATABASE_URL) -> int:
+    """تطبيق الترحيلات المعلقة في معاملة واحدة وإرجاع الإصدار النهائي"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # المسار السريع: قاعدة البيانات محدثة فلا يُنفذ أي DDL
+        if get_schema_version(conn) >= LATEST_VERSION:
+            return LATEST_VERSION
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # إعادة القراءة داخل المعاملة في حال سبقتنا عملية أخرى
+            current = get_schema_version(conn)
+            for version, name, steps in MIGRATIONS:
+                if version <= current:
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(
+                    "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                    (version, name)
+                )
+                logger.info(f"🔧 تم تطبيق ترحيل المخطط {version}: {name}")
+
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return get_schema_version(conn)
+    finally:
+        conn.close()
+
+
+async def run_migrations(db_path: str = DATABASE_URL) -> int:
+    """تطبيق الترحيلات دون حجب حلقة الأحداث"""
+    return await asyncio.to_thread(apply_migrations, db_path)
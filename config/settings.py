@@ -23,6 +23,125 @@ OWNERS = [6524680126]
 # إعدادات قاعدة البيانات
 DATABASE_URL = "bot_database.db"
 
+# إعدادات أداء SQLite (تطبق على كل اتصال)
+DATABASE_PRAGMAS = {
+    "synchronous": "NORMAL",  # آمن مع WAL ويتجنب fsync في كل commit
+    "temp_store": "MEMORY",
+    "cache_size": -16000,  # بالكيلوبايت عند القيمة السالبة (~16MB)
+    "mmap_size": 64 * 1024 * 1024,
+    "busy_timeout": 5000,  # بالملي ثانية
+    "journal_size_limit": 64 * 1024 * 1024
+}
+
+# إعدادات وضع WAL ونقاط التفتيش
+WAL_SETTINGS = {
+    "enabled": True,
+    "checkpoint_interval": 300,  # بالثواني
+    "truncate_threshold": 32 * 1024 * 1024  # تصغير ملف WAL إذا تجاوز هذا الحجم
+}
+
+# إعدادات متتبع عضوية المجموعات (تجميع النشاط في الذاكرة ثم كتابته دفعة واحدة)
+CHAT_MEMBERS_SETTINGS = {
+    "flush_interval": 15,  # بالثواني
+    "max_pending": 5000  # كتابة فورية إذا تجاوز عدد الأزواج المعلقة هذا الحد
+}
+
+# إعدادات التسجيل (الكتابة للملف تتم في خيط منفصل عبر طابور)
+LOGGING_SETTINGS = {
+    "file": "bot.log",
+    "max_bytes": 10 * 1024 * 1024,  # تدوير الملف عند هذا الحجم
+    "backup_count": 5,
+    "queue_size": 10000,  # السجلات الزائدة تُسقط بدل حجب حلقة الأحداث
+    "sample_window": 60,  # بالثواني
+    "sample_burst": 20,  # أقصى عدد سجلات لكل سطر تسجيل خلال النافذة
+    # المسجلات التي تكتب مع كل رسالة وتخضع لأخذ العينات
+    "sampled_loggers": ("modules.custom_replies", "modules.media_download")
+}
+
+# إعدادات مقاييس الأداء (خادم Prometheus محلي وأمر "أداء" للأسياد)
+METRICS_SETTINGS = {
+    "enabled": True,
+    "host": "127.0.0.1",
+    "port": 9108,
+    "reservoir_size": 1000,  # آخر القياسات المحفوظة لكل أمر لحساب p50/p95/p99
+    "max_commands": 200,  # الأوامر الزائدة تُجمع تحت "other"
+    "max_queries": 500,  # أقصى عدد استعلامات مختلفة في جدول الاستعلامات البطيئة
+    # الكلمة الأولى للأوامر النصية المعروفة - غيرها يُجمع تحت message:other حتى لا تصبح مدخلات المستخدم تسميات
+    "command_words": (
+        "راتب", "رصيد", "فلوسي", "إيداع", "سحب", "بنك", "تحويل", "سرقة", "زرف", "زررف", "عقار", "شراء", "بيع",
+        "استثمار", "أسهم", "محفظة", "مزرعة", "زراعة", "حصاد", "قلعة", "إنشاء", "هجوم", "بحث", "متجر",
+        "احصائيات", "ترقية", "ترتيب", "بقشيش", "رفع", "تنزيل", "مسح", "حظر", "طرد", "كتم", "تحذير",
+        "إلغاء", "منع", "قفل", "فتح", "تفعيل", "تعطيل", "تيك", "تويتر", "ساوند", "زواج", "طلاق",
+        "حسابي", "مستواي", "رتبتي", "الأوامر", "الأسياد", "المستويات", "اضف", "اضافة", "حذف", "الردود"
+    )
+}
+
+# معالجة التحديثات بالتوازي مع ترتيب تحديثات المستخدم الواحد
+CONCURRENCY_SETTINGS = {
+    "user_locks": True,  # قفل لكل مستخدم وطرفه المقابل قبل المعالجات
+    "max_lock_keys": 4,  # أقصى عدد مفاتيح يحجزها تحديث واحد
+    "tasks_concurrency_limit": 64  # أقصى تحديثات تُعالج معاً في وضع التصويت
+}
+
+# الحد من الإغراق قبل وصول الرسائل للمعالجات وقاعدة البيانات
+THROTTLING_SETTINGS = {
+    "enabled": True,
+    "rate": 1.0,  # رموز تُضاف لكل مستخدم في الثانية
+    "burst": 15,  # أقصى رصيد (عدد الرسائل المتتالية المسموحة دفعة واحدة)
+    "max_users": 50000,  # حجم جدول الدلاء - يُخرج الأقدم استخداماً عند الامتلاء
+    "default_cost": 1,
+    "callback_cost": 1,
+    # تكلفة الأوامر الثقيلة حسب الكلمة الأولى
+    "command_costs": {
+        "هجوم": 3, "سرقة": 3, "زرف": 3, "زررف": 3, "تحويل": 2, "راتب": 2, "بقشيش": 2,
+        "استثمار": 2, "شراء": 2, "بيع": 2, "ترتيب": 3, "تيك": 5, "تويتر": 5, "ساوند": 5, "بحث": 5
+    }
+}
+
+# خط تحميل الوسائط (تيك توك، تويتر، ساوند كلاود)
+MEDIA_DOWNLOAD_SETTINGS = {
+    "cache_dir": "media_cache",
+    "max_cache_bytes": 2 * 1024 * 1024 * 1024,  # حذف الأقدم استخداماً عند تجاوز الحجم
+    "max_file_bytes": 50 * 1024 * 1024,  # حد رفع الملفات للبوتات في تيليجرام
+    "timeout": 120,  # أقصى زمن لتحميل ملف واحد بالثواني
+    "workers": 3,  # عدد التحميلات المتزامنة
+    "extract_workers": 2,  # خيوط yt-dlp لاستخراج الروابط (منفصلة عن خيوط القرص)
+    "extract_timeout": 30,  # أقصى زمن لاستخراج رابط الملف بالثواني
+    "queue_size": 20,  # طلبات تنتظر عاملاً قبل رفض الجديد
+    "chunk_size": 256 * 1024,
+    "remembered_urls": 2000,  # روابط محفوظة في الذاكرة مع ملفها في المخزن
+    "max_redirects": 5,
+    "allow_private_hosts": False  # رفض العناوين الداخلية (loopback، الشبكات الخاصة) بعد كل تحويل
+}
+
+# وضع استقبال التحديثات: "polling" أو "webhook"
+WEBHOOK_SETTINGS = {
+    "mode": os.getenv("BOT_MODE", "polling"),
+    "base_url": os.getenv("WEBHOOK_BASE_URL", ""),  # العنوان العام عبر HTTPS الذي يصل إليه تيليجرام
+    "path": "/webhook",
+    "host": "0.0.0.0",
+    "port": int(os.getenv("WEBHOOK_PORT", "8080")),
+    "secret_token": os.getenv("WEBHOOK_SECRET", ""),  # ترويسة X-Telegram-Bot-Api-Secret-Token (يُولد عشوائياً إن كان فارغاً)
+    "max_connections": 40,  # أقصى اتصالات متزامنة يفتحها تيليجرام
+    "max_in_flight": 32,  # تحديثات تُعالج في نفس الوقت
+    "max_pending": 500,  # تحديثات مقبولة تنتظر دورها قبل رفض الجديد بـ 503
+    "drain_timeout": 30,  # ثوانٍ لإنهاء التحديثات الجارية عند الإيقاف
+    "drop_pending_updates": False
+}
+
+# إعدادات النسخ الاحتياطي
+BACKUP_SETTINGS = {
+    "enabled": True,
+    "directory": "backups",
+    "compression": "zstd",  # zstd إذا كانت مكتبة zstandard مثبتة وإلا gzip
+    "pages_per_step": 256,  # عدد الصفحات المنسوخة في كل خطوة
+    "step_pause": 0.005,  # استراحة بين الخطوات بالثواني لإفساح المجال للكتابة
+    "interval_hours": 24,
+    "keep_last": 7,
+    "send_to_masters": False,  # إرسال النسخ المجدولة للأسياد كمستند
+    "max_document_size": 49 * 1024 * 1024  # حد رفع الملفات في تيليجرام
+}
+
 # إعدادات اللعبة الاقتصادية
 GAME_SETTINGS = {
     "daily_salary": {
@@ -49,6 +168,10 @@ GAME_SETTINGS = {
     "security": {
         "protection_levels": 5,
         "upgrade_costs": [0, 5000, 15000, 40000, 100000]
+    },
+    "castle_battle": {
+        "cooldown_minutes": 30,  # فترة الانتظار بين هجمات المستخدم نفسه
+        "max_loot": 100  # حد أقصى للذهب المسروق في المعركة الواحدة
     }
 }
 
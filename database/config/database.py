@@ -9,140 +9,18 @@ from typing import Optional
 from contextlib import asynccontextmanager
 import aiosqlite
 
+from config.database import connect_database
+from config.migrations import run_migrations
+
 # متغير عام لحفظ مسار قاعدة البيانات
 DB_PATH = "bot_database.db"
 
 
 async def init_database() -> None:
-    """تهيئة قاعدة البيانات وإنشاء الجداول"""
+    """تهيئة قاعدة البيانات عبر محرك الترحيلات الموحد"""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            # جدول المستخدمين
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    balance INTEGER DEFAULT 1000,
-                    bank_balance INTEGER DEFAULT 0,
-                    last_daily DATE,
-                    last_salary_time TEXT,
-                    bank_type TEXT DEFAULT 'سامبا',
-                    security_level INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # جدول العقارات
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS properties (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    property_type TEXT NOT NULL,
-                    location TEXT NOT NULL,
-                    price INTEGER NOT NULL,
-                    income_per_hour INTEGER DEFAULT 0,
-                    purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            # جدول الاستثمارات
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS investments (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    investment_type TEXT NOT NULL,
-                    amount INTEGER NOT NULL,
-                    expected_return REAL NOT NULL,
-                    maturity_date TIMESTAMP,
-                    status TEXT DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            # جدول الأسهم
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS stocks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    symbol TEXT NOT NULL,
-                    quantity INTEGER NOT NULL,
-                    purchase_price REAL NOT NULL,
-                    purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            # جدول المزرعة
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS farm (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    crop_type TEXT NOT NULL,
-                    quantity INTEGER NOT NULL,
-                    planted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    harvest_time TIMESTAMP,
-                    status TEXT DEFAULT 'growing',
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            # جدول القلعة
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS castle (
-                    user_id INTEGER PRIMARY KEY,
-                    level INTEGER DEFAULT 1,
-                    defense_points INTEGER DEFAULT 100,
-                    attack_points INTEGER DEFAULT 50,
-                    gold_production INTEGER DEFAULT 10,
-                    last_upgrade TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            # جدول السجلات (للسرقة والمعاملات)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    from_user_id INTEGER,
-                    to_user_id INTEGER,
-                    transaction_type TEXT NOT NULL,
-                    amount INTEGER NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # جدول الإحصائيات
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    action_type TEXT NOT NULL,
-                    action_data TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            # جدول المحظورين
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS banned_users (
-                    user_id INTEGER PRIMARY KEY,
-                    banned_by INTEGER NOT NULL,
-                    banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    reason TEXT,
-                    FOREIGN KEY (banned_by) REFERENCES users (user_id)
-                )
-            """)
-            
-            await db.commit()
-            logging.info("✅ تم تهيئة قاعدة البيانات بنجاح")
-            
+        version = await run_migrations(DB_PATH)
+        logging.info(f"✅ تم تهيئة قاعدة البيانات بنجاح (إصدار المخطط {version})")
     except Exception as e:
         logging.error(f"❌ خطأ في تهيئة قاعدة البيانات: {e}")
         raise
@@ -153,7 +31,7 @@ async def get_db_connection():
     """الحصول على اتصال بقاعدة البيانات مع إدارة تلقائية للموارد"""
     conn = None
     try:
-        conn = await aiosqlite.connect(DB_PATH)
+        conn = await connect_database(DB_PATH)
         def dict_factory(cursor, row):
             return dict((cursor.description[idx][0], value) for idx, value in enumerate(row))
         conn.row_factory = dict_factory  # لإرجاع النتائج كقاموس
@@ -8,13 +8,13 @@ from datetime import datetime
 from typing import Optional, Dict, Any
 import aiosqlite
 
-from config.database import DATABASE_URL
+from config.database import connect_database
 
 
 async def get_user(user_id: int) -> Optional[Dict[str, Any]]:
     """الحصول على بيانات المستخدم"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with connect_database() as db:
             db.row_factory = aiosqlite.Row
             cursor = await db.execute(
                 "SELECT * FROM users WHERE user_id = ?",
@@ -34,7 +34,7 @@ async def get_user(user_id: int) -> Optional[Dict[str, Any]]:
 async def create_user(user_id: int, username: str = "", first_name: str = "") -> bool:
     """إنشاء مستخدم جديد"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with connect_database() as db:
             await db.execute(
                 """
                 INSERT INTO users (user_id, username, first_name, balance, bank_balance, created_at, updated_at)
@@ -78,7 +78,7 @@ async def get_or_create_user(user_id: int, username: str = "", first_name: str =
 async def update_user_activity(user_id: int) -> bool:
     """تحديث آخر نشاط للمستخدم"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with connect_database() as db:
             await db.execute(
                 "UPDATE users SET updated_at = ? WHERE user_id = ?",
                 (datetime.now().isoformat(), user_id)
@@ -94,7 +94,7 @@ async def update_user_activity(user_id: int) -> bool:
 async def update_user_balance(user_id: int, new_balance: float) -> bool:
     """تحديث رصيد المستخدم"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with connect_database() as db:
             await db.execute(
                 "UPDATE users SET balance = ?, updated_at = ? WHERE user_id = ?",
                 (new_balance, datetime.now().isoformat(), user_id)
@@ -110,7 +110,7 @@ async def update_user_balance(user_id: int, new_balance: float) -> bool:
 async def update_user_bank_balance(user_id: int, new_bank_balance: float) -> bool:
     """تحديث رصيد البنك للمستخدم"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with connect_database() as db:
             await db.execute(
                 "UPDATE users SET bank_balance = ?, updated_at = ? WHERE user_id = ?",
                 (new_bank_balance, datetime.now().isoformat(), user_id)
@@ -126,7 +126,7 @@ async def update_user_bank_balance(user_id: int, new_bank_balance: float) -> boo
 async def execute_query(query: str, params: tuple = (), fetch_one: bool = False, fetch_all: bool = False):
     """تنفيذ استعلام قاعدة البيانات مع معالجة الأخطاء"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with connect_database() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(query, params) as cursor:
                 if fetch_one:
@@ -149,7 +149,7 @@ async def execute_query(query: str, params: tuple = (), fetch_one: bool = False,
 async def add_transaction(user_id: int, description: str, amount: float, transaction_type: str = "general") -> bool:
     """إضافة معاملة جديدة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with connect_database() as db:
             await db.execute(
                 "INSERT INTO transactions (user_id, description, amount, transaction_type, created_at) VALUES (?, ?, ?, ?, ?)",
                 (user_id, description, amount, transaction_type, datetime.now().isoformat())
@@ -167,7 +167,7 @@ async def add_transaction(user_id: int, transaction_type: str, amount: float,
                          to_user_id: Optional[int] = None) -> bool:
     """إضافة معاملة جديدة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with connect_database() as db:
             await db.execute(
                 """
                 INSERT INTO transactions (user_id, transaction_type, amount, description, 
@@ -185,6 +185,66 @@ async def add_transaction(user_id: int, transaction_type: str, amount: float,
         return False
 
 
+async def record_theft_success(thief_id: int, target_id: int, amount: float, description: str = "") -> bool:
+    """تسجيل سرقة ناجحة ذرياً: نقل المبلغ وتحديث العدادات والمعاملة في معاملة واحدة"""
+    try:
+        async with connect_database() as db:
+            cursor = await db.execute(
+                """
+                UPDATE users SET balance = balance - ?, times_stolen = times_stolen + 1
+                WHERE user_id = ? AND balance >= ?
+                """,
+                (amount, target_id, amount)
+            )
+            if cursor.rowcount == 0:
+                # الضحية لم تعد تملك المبلغ (سرقة متزامنة) - إلغاء المعاملة
+                await db.rollback()
+                return False
+
+            await db.execute(
+                "UPDATE users SET balance = balance + ?, successful_thefts = successful_thefts + 1 WHERE user_id = ?",
+                (amount, thief_id)
+            )
+            await db.execute(
+                """
+                INSERT INTO transactions (user_id, transaction_type, amount, description,
+                                        from_user_id, to_user_id, created_at)
+                VALUES (?, 'theft_success', ?, ?, ?, ?, ?)
+                """,
+                (thief_id, amount, description, target_id, thief_id, datetime.now().isoformat())
+            )
+            await db.commit()
+            return True
+
+    except Exception as e:
+        logging.error(f"خطأ في تسجيل السرقة الناجحة: {e}")
+        return False
+
+
+async def record_theft_failure(thief_id: int, target_id: int, penalty: float, description: str = "") -> bool:
+    """تسجيل سرقة فاشلة ذرياً: خصم الغرامة وتحديث العداد والمعاملة في معاملة واحدة"""
+    try:
+        async with connect_database() as db:
+            await db.execute(
+                "UPDATE users SET balance = balance - ?, failed_thefts = failed_thefts + 1 WHERE user_id = ?",
+                (penalty, thief_id)
+            )
+            await db.execute(
+                """
+                INSERT INTO transactions (user_id, transaction_type, amount, description,
+                                        from_user_id, to_user_id, created_at)
+                VALUES (?, 'theft_failed', ?, ?, ?, ?, ?)
+                """,
+                (thief_id, penalty, description, thief_id, target_id, datetime.now().isoformat())
+            )
+            await db.commit()
+            return True
+
+    except Exception as e:
+        logging.error(f"خطأ في تسجيل السرقة الفاشلة: {e}")
+        return False
+
+
 async def is_user_banned(user_id: int) -> bool:
     """التحقق من حظر المستخدم"""
     try:
@@ -198,7 +258,7 @@ async def is_user_banned(user_id: int) -> bool:
 async def execute_query(query: str, params: tuple = (), fetch_one: bool = False, fetch_all: bool = False):
     """تنفيذ استعلام قاعدة البيانات"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with connect_database() as db:
             if fetch_one or fetch_all:
                 db.row_factory = aiosqlite.Row
             
@@ -218,18 +278,22 @@ async def execute_query(query: str, params: tuple = (), fetch_one: bool = False,
         return None
 
 
+GROUP_MEMBERS_QUERY = """
+    SELECT cm.user_id FROM chat_members cm
+    LEFT JOIN users u ON u.user_id = cm.user_id
+    WHERE cm.chat_id = ? AND COALESCE(u.is_banned, 0) = 0
+    ORDER BY cm.last_seen DESC
+    LIMIT 500
+"""
+
+
 async def get_all_group_members(group_id: int) -> list:
     """الحصول على جميع الأعضاء المسجلين في المجموعة"""
     try:
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with connect_database() as db:
             cursor = await db.execute(
-                """
-                SELECT DISTINCT user_id FROM users 
-                WHERE user_id IS NOT NULL
-                AND user_id NOT IN (SELECT user_id FROM users WHERE is_banned = 1)
-                ORDER BY updated_at DESC
-                LIMIT 500
-                """,
+                GROUP_MEMBERS_QUERY,
+                (group_id,)
             )
             results = await cursor.fetchall()
             
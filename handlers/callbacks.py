@@ -8,19 +8,30 @@ from aiogram import Router
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 
+from modules import castle
+from modules.custom_replies import handle_scope_callback
+from utils.callback_router import callback_router
+
 router = Router()
 
 
+async def handle_noop_callback(callback: CallbackQuery, payload: str, state: FSMContext):
+    """أزرار للعرض فقط مثل رقم الصفحة الحالية"""
+    await callback.answer()
+
+
+# جدول التوجيه: البادئة -> المعالج
+callback_router.register("scope", handle_scope_callback)
+callback_router.register("castles", castle.handle_castles_page_callback)
+callback_router.register("battles", castle.handle_battles_page_callback, version=castle.BATTLES_CALLBACK_VERSION)
+callback_router.register("noop", handle_noop_callback)
+
+
 @router.callback_query()
 async def handle_callbacks(callback: CallbackQuery, state: FSMContext):
     """معالج شامل لجميع الـ callbacks"""
     try:
-        data = callback.data
-        
-        # معالجة callbacks نطاق الردود المخصصة
-        if data in ["scope_group", "scope_global", "scope_cancel"]:
-            from modules.custom_replies import handle_scope_callback
-            await handle_scope_callback(callback, state)
+        if await callback_router.dispatch(callback, state):
             return
         
         # معالجة callbacks أخرى
@@ -31,4 +42,4 @@ async def handle_callbacks(callback: CallbackQuery, state: FSMContext):
         try:
             await callback.answer("❌ حدث خطأ")
         except:
-            pass
\ No newline at end of file
+            pass
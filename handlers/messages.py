@@ -5,7 +5,7 @@ Bot Messages Handler
 
 import logging
 from aiogram import Router, F
-from aiogram.types import Message, FSInputFile
+from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
 from database.operations import get_or_create_user, update_user_activity, get_user
@@ -28,6 +28,7 @@ from modules.group_hierarchy import handle_hierarchy_commands
 from modules.utility_commands import handle_utility_commands
 from utils.states import *
 from utils.decorators import user_required, group_only
+from utils.text_normalizer import normalized_text
 from config.settings import SYSTEM_MESSAGES
 from config.hierarchy import MASTERS
 
@@ -399,7 +400,7 @@ async def handle_theft_command(message: Message):
 async def attempt_theft_on_target(message: Message, thief: dict, target: dict, target_user_id: int, target_name: str):
     """محاولة سرقة المستخدم المستهدف"""
     try:
-        from database.operations import update_user_balance, add_transaction
+        from database.operations import record_theft_success, record_theft_failure
         from utils.helpers import format_number
         import random
         
@@ -429,22 +430,16 @@ async def attempt_theft_on_target(message: Message, thief: dict, target: dict, t
             new_thief_balance = thief['balance'] + stolen_amount
             new_target_balance = target['balance'] - stolen_amount
             
-            await update_user_balance(message.from_user.id, new_thief_balance)
-            await update_user_balance(target_user_id, new_target_balance)
-            
-            # إضافة المعاملة
-            await add_transaction(
-                target_user_id,
-                f"سرقة بواسطة {message.from_user.first_name or 'لص مجهول'}",
-                -stolen_amount,
-                "theft"
-            )
-            await add_transaction(
+            # نقل المبلغ وتحديث عدادات السرقة وتسجيل المعاملة في معاملة واحدة
+            recorded = await record_theft_success(
                 message.from_user.id,
-                f"سرقة ناجحة من {target_name}",
+                target_user_id,
                 stolen_amount,
-                "theft"
+                f"سرقة ناجحة من {target_name}"
             )
+            if not recorded:
+                await message.reply(f"😅 المستخدم {target_name} لم يعد يملك هذا المبلغ!")
+                return
             
             # رسائل نجاح متنوعة
             success_messages = [
@@ -482,20 +477,18 @@ async def attempt_theft_on_target(message: Message, thief: dict, target: dict, t
             # السرقة فشلت!
             penalty = random.randint(50, 200)  # غرامة الفشل
             
-            if thief['balance'] >= penalty:
-                new_thief_balance = thief['balance'] - penalty
-                await update_user_balance(message.from_user.id, new_thief_balance)
-                
-                await add_transaction(
-                    message.from_user.id,
-                    f"غرامة فشل سرقة {target_name}",
-                    -penalty,
-                    "theft_penalty"
-                )
-                
-                penalty_msg = f"\n💸 غرامة الفشل: {format_number(penalty)}$"
-            else:
-                penalty_msg = ""
+            if thief['balance'] < penalty:
+                penalty = 0
+            
+            # خصم الغرامة وتحديث عداد الفشل وتسجيل المعاملة في معاملة واحدة
+            await record_theft_failure(
+                message.from_user.id,
+                target_user_id,
+                penalty,
+                f"غرامة فشل سرقة {target_name}"
+            )
+            
+            penalty_msg = f"\n💸 غرامة الفشل: {format_number(penalty)}$" if penalty else ""
             
             # رسائل فشل متنوعة
             fail_messages = [
@@ -523,7 +516,10 @@ async def attempt_theft_on_target(message: Message, thief: dict, target: dict, t
 
 async def handle_general_message(message: Message, state: FSMContext):
     """معالجة الرسائل العامة - الكلمات المفتاحية فقط"""
-    text = message.text.lower() if message.text else ""
+    # النص المطبّع محسوب مسبقاً في الوسيط: text للاستخراج وnorm للمطابقة
+    norm = normalized_text(message)
+    text = norm.lower
+    words = norm.words
     
     # تحديث نشاط المستخدم وإضافة XP للرسائل
     try:
@@ -534,13 +530,13 @@ async def handle_general_message(message: Message, state: FSMContext):
         logging.error(f"خطأ في تحديث النشاط أو XP: {activity_error}")
     
     # دليل المستويات الشامل
-    if text in ['المستويات', 'دليل المستويات', 'شرح المستويات', 'كيفية التقدم']:
+    if norm.equals('المستويات', 'دليل المستويات', 'شرح المستويات', 'كيفية التقدم'):
         from modules.levels_guide import show_levels_guide
         await show_levels_guide(message)
         return
     
-    # فحص أوامر المستوى أولاً
-    if any(keyword in text for keyword in ["مستواي", "مستوايا", "مستوى", "level", "xp", "تفاعلي"]):
+    # فحص أوامر المستوى أولاً - "مستوى" ككلمة مستقلة لأن تطبيعها "مستوي" جزء من "المستويات"
+    if norm.contains("مستواي", "level", "xp", "تفاعلي") or norm.has_word("مستوى", "المستوى"):
         try:
             from modules.enhanced_xp_handler import handle_level_command
             await handle_level_command(message)
@@ -600,19 +596,19 @@ async def handle_general_message(message: Message, state: FSMContext):
     if await handle_delete_command(message):
         return
         
-    if message.text and (message.text.strip() == 'الأوامر المخصصة' or message.text.strip() == 'الاوامر المخصصة'):
+    if norm.equals('الأوامر المخصصة'):
         await handle_list_commands(message)
         return
     
     # فحص الردود (خاصة أو عامة) بعد الأوامر المهمة
     if message.from_user:
-        response = get_special_response(message.from_user.id, text)
+        response = get_special_response(message.from_user.id, norm)
         if response:
             await message.reply(response)
             return
     
     # التحقق من طلب إنشاء حساب بنكي
-    if any(phrase in text for phrase in ['انشاء حساب بنكي', 'إنشاء حساب بنكي', 'انشئ حساب', 'حساب بنكي جديد']):
+    if norm.contains('إنشاء حساب بنكي', 'انشئ حساب', 'حساب بنكي جديد'):
         from modules.manual_registration import handle_bank_account_creation
         await handle_bank_account_creation(message, state)
         # إضافة XP للتسجيل
@@ -638,7 +634,7 @@ async def handle_general_message(message: Message, state: FSMContext):
         logging.error(f"خطأ في نظام الاستثمار المحسن: {inv_error}")
     
     # فحص أوامر العمليات المصرفية
-    if any(keyword in text for keyword in ["البنك", "بنك", "حسابي", "محفظتي", "المحفظة", "ايداع", "إيداع", "سحب"]):
+    if norm.contains("بنك", "حسابي", "محفظتي", "المحفظة", "إيداع", "سحب"):
         # إضافة XP للعمليات المصرفية
         try:
             from modules.enhanced_xp_handler import add_xp_for_activity
@@ -665,12 +661,12 @@ async def handle_general_message(message: Message, state: FSMContext):
         return
     
     # === أمر عرض قائمة الأوامر الشاملة ===
-    if (text == 'الأوامر' or text == 'الاوامر' or text == 'قائمة الأوامر' or 
-        text == 'قائمة الاوامر' or text == 'جميع الأوامر' or text == 'كل الأوامر'):
+    if norm.equals('الأوامر', 'قائمة الأوامر', 'جميع الأوامر', 'كل الأوامر'):
         try:
-            commands_file = FSInputFile('commands_list.txt', filename='yuki_commands.txt')
-            await message.reply_document(
-                document=commands_file,
+            # يُرفع الملف مرة واحدة ثم يُرسل بمعرفه حتى يتغير محتواه
+            from modules.file_cache import file_cache
+            await file_cache.send_path(
+                message.reply_document, 'document', 'commands_list.txt', filename='yuki_commands.txt',
                 caption="📋 **قائمة أوامر بوت يوكي الشاملة**\n\n"
                        "🔍 **هذا الملف يحتوي على:**\n"
                        "• جميع أوامر البوت مقسمة حسب الصلاحيات\n"
@@ -684,7 +680,7 @@ async def handle_general_message(message: Message, state: FSMContext):
         return
     
     # === أمر عرض قائمة الأسياد (للأسياد فقط) ===
-    if text == 'الأسياد' or text == 'الاسياد' or text == 'قائمة الأسياد' or text == 'قائمة الاسياد':
+    if norm.equals('الأسياد', 'قائمة الأسياد'):
         user_id = message.from_user.id if message.from_user else 0
         if user_id in MASTERS:
             try:
@@ -736,15 +732,13 @@ async def handle_general_message(message: Message, state: FSMContext):
         return
     
     # === أوامر إضافة الردود المخصصة ===
-    if text == 'اضف رد' or text == 'إضف رد' or text == 'اضافة رد':
+    if norm.equals('اضف رد', 'اضافة رد'):
         from modules.custom_replies import start_add_custom_reply
         await start_add_custom_reply(message, state)
         return
     
     # === أوامر عرض الردود المخصصة ===
-    if (text == 'الردود المخصصة' or text == 'عرض الردود' or 
-        text == 'قائمة الردود' or text == 'الردود المخصصه' or 
-        text == 'عرض ردود'):
+    if norm.equals('الردود المخصصة', 'عرض الردود', 'قائمة الردود', 'عرض ردود'):
         await handle_show_custom_replies(message)
         return
     
@@ -757,9 +751,7 @@ async def handle_general_message(message: Message, state: FSMContext):
     # === تم نقل فحص الردود المخصصة لأعلى لتجنب التكرار ===
     
     # البحث عن كلمات مفتاحية محددة بتطابق دقيق
-    words = text.split()
-    
-    if any(word in words for word in ['راتب', 'مرتب', 'راتبي']):
+    if norm.has_word('راتب', 'مرتب', 'راتبي'):
         await banks.collect_daily_salary(message)
     elif text.startswith('تحويل') and message.reply_to_message:
         await handle_transfer_command(message)
@@ -788,27 +780,27 @@ async def handle_general_message(message: Message, state: FSMContext):
             await message.reply(random.choice(sarcastic_responses))
         else:
             await handle_theft_command(message)
-    elif any(word in words for word in ['رصيد', 'فلوس', 'مال']):
+    elif norm.has_word('رصيد', 'فلوس', 'مال'):
         await banks.show_balance(message)
-    elif text.startswith('ايداع') and len(words) > 1:
+    elif norm.startswith('إيداع') and len(words) > 1:
         # معالجة أمر الإيداع مع المبلغ مثل "ايداع 100"
         await handle_deposit_with_amount(message, words[1])
     elif text.startswith('سحب') and len(words) > 1:
         # معالجة أمر السحب مع المبلغ مثل "سحب 100"
         await handle_withdraw_with_amount(message, words[1])
-    elif any(word in words for word in ['بنك', 'ايداع', 'سحب']):
+    elif norm.has_word('بنك', 'إيداع', 'سحب'):
         await banks.show_bank_menu(message)
-    elif any(word in words for word in ['عقار', 'بيت']) and not any(castle_word in words for castle_word in ['قلعة', 'موارد']):
+    elif norm.has_word('عقار', 'بيت') and not norm.has_word('قلعة', 'موارد'):
         await real_estate.show_property_menu(message)
-    elif text.startswith('ترقية امان تأكيد'):
+    elif norm.startswith('ترقية أمان تأكيد'):
         await theft.upgrade_security_level(message)
-    elif text.startswith('ترقية الامان') or text in ['ترقية الأمان', 'ترقية امان']:
+    elif norm.startswith('ترقية الأمان') or norm.equals('ترقية أمان'):
         await theft.show_security_upgrade(message)
-    elif text in ['احصائيات سرقة', 'إحصائيات سرقة', 'احصائياتي سرقة']:
+    elif norm.equals('إحصائيات سرقة', 'احصائياتي سرقة'):
         await theft.show_theft_stats(message)
-    elif text in ['افضل لصوص', 'أفضل لصوص', 'افضل اللصوص', 'أفضل اللصوص', 'ترتيب لصوص']:
+    elif norm.equals('أفضل لصوص', 'أفضل اللصوص', 'ترتيب لصوص'):
         await theft.show_top_thieves(message)
-    elif any(word in words for word in ['سرقة', 'سرق']) or text == 'امان':
+    elif norm.has_word('سرقة', 'سرق') or norm.equals('أمان'):
         await theft.show_security_menu(message)
     
     # === أوامر الاستثمار ===
@@ -865,7 +857,7 @@ async def handle_general_message(message: Message, state: FSMContext):
         await stocks.buy_stock_command(message)
     elif text.startswith('بيع سهم ') or text.startswith('بيع اسهم '):
         await stocks.sell_stock_command(message)
-    elif any(word in words for word in ['اسهم', 'محفظة']):
+    elif norm.has_word('أسهم', 'محفظة'):
         await stocks.show_stocks_menu(message)
     
     # === أوامر المزرعة ===
@@ -881,19 +873,19 @@ async def handle_general_message(message: Message, state: FSMContext):
         await farm.show_farm_status(message)
     elif text == 'شراء بذور':
         await farm.show_seeds_shop(message)
-    elif any(word in words for word in ['مزرعة']):
+    elif norm.has_word('مزرعة'):
         await farm.show_farm_menu(message)
-    elif any(phrase in text for phrase in ['انشاء قلعة', 'إنشاء قلعة', 'انشئ قلعة']):
+    elif norm.contains('إنشاء قلعة', 'انشئ قلعة'):
         await castle.create_castle_command(message, state)
-    elif text.strip() == 'قلعة':
+    elif norm.equals('قلعة'):
         await castle.show_castle_menu(message)
     elif any(phrase in text for phrase in ['بحث عن كنز', 'بحث كنز', 'ابحث كنز']):
         await castle.treasure_hunt_command(message)
     elif any(phrase in text for phrase in ['طور القلعة', 'تطوير القلعة', 'ترقية القلعة']):
         await castle.upgrade_castle_command(message)
-    elif any(phrase in text for phrase in ['احصائيات القلعة', 'إحصائيات القلعة', 'احصائيات قلعة']):
+    elif norm.contains('إحصائيات القلعة', 'احصائيات قلعة'):
         await castle.castle_stats_command(message)
-    elif any(phrase in text for phrase in ['متجر القلعة', 'متجر قلعة', 'شراء موارد']) or (text.strip() == 'متجر' and 'قلعة' in words):
+    elif norm.contains('متجر القلعة', 'متجر قلعة', 'شراء موارد'):
         await castle.show_castle_shop(message)
     elif text.startswith('شراء ') and any(word in text for word in ['ذهب', 'حجارة', 'حجار', 'عمال', 'موارد']):
         await castle.purchase_item_command(message)
@@ -901,15 +893,15 @@ async def handle_general_message(message: Message, state: FSMContext):
         await real_estate.show_property_menu(message)
     elif any(phrase in text for phrase in ['حذف قلعتي', 'احذف قلعتي']):
         await castle.delete_castle_command(message)
-    elif text.strip() in ['تأكيد', 'نعم']:
+    elif norm.equals('تأكيد', 'نعم'):
         await castle.confirm_delete_castle_command(message)
-    elif text.strip() == 'لا':
+    elif norm.equals('لا'):
         await castle.cancel_delete_castle_command(message)
     elif any(phrase in text for phrase in ['حسابي', 'حساب اللاعب', 'معلوماتي', 'تفاصيلي']):
         await castle.show_player_profile(message)
-    elif any(phrase in text for phrase in ['اخفاء قلعتي', 'إخفاء قلعتي', 'اخفي قلعتي']):
+    elif norm.contains('إخفاء قلعتي', 'اخفي قلعتي'):
         await castle.hide_castle_command(message)
-    elif any(phrase in text for phrase in ['اظهار قلعتي', 'إظهار قلعتي', 'اظهر قلعتي']):
+    elif norm.contains('إظهار قلعتي', 'اظهر قلعتي'):
         await castle.show_castle_command(message)
     elif any(phrase in text for phrase in ['قائمة القلاع', 'القلاع المتاحة', 'عرض القلاع']):
         await castle.list_available_castles(message)
@@ -917,7 +909,7 @@ async def handle_general_message(message: Message, state: FSMContext):
         await castle.attack_castle_command(message)
     elif any(phrase in text for phrase in ['سجل المعارك', 'معارك القلعة', 'سجل الحروب']):
         await castle.castle_battles_log_command(message)
-    elif any(word in words for word in ['ترتيب', 'متصدرين', 'رانكنغ']):
+    elif norm.has_word('ترتيب', 'متصدرين', 'رانكنغ'):
         from modules import ranking
         await ranking.show_leaderboard(message)
     
@@ -952,9 +944,9 @@ async def handle_general_message(message: Message, state: FSMContext):
         await admin_management.handle_warn_user(message)
     
     # === أوامر إلغاء الحظر والكتم ===
-    elif text == 'الغاء حظر' or text.startswith('الغاء حظر ') or text == 'إلغاء حظر' or text.startswith('إلغاء حظر '):
+    elif norm.starts_with_words('إلغاء حظر'):
         await admin_management.handle_unban_user(message)
-    elif text == 'الغاء كتم' or text.startswith('الغاء كتم ') or text == 'إلغاء كتم' or text.startswith('إلغاء كتم '):
+    elif norm.starts_with_words('إلغاء كتم'):
         await admin_management.handle_unmute_user(message)
     
     # === أوامر عرض القوائم ===
@@ -963,6 +955,12 @@ async def handle_general_message(message: Message, state: FSMContext):
     elif text == 'المكتومين' or text == 'قائمة المكتومين':
         await admin_management.show_muted_users(message)
     
+    # === أوامر الكلمات الممنوعة ===
+    elif text.startswith('الغاء منع ') and len(text.split()) > 2:
+        await group_settings.handle_forbidden_word(message, text.split(maxsplit=2)[2], 'الغاء منع')
+    elif text.startswith('منع ') and len(text.split()) > 1:
+        await group_settings.handle_forbidden_word(message, text.split(maxsplit=1)[1], 'منع')
+    
     # === أوامر القفل والفتح ===
     elif text.startswith('قفل '):
         await handle_lock_command(message, text)
@@ -999,7 +997,7 @@ async def handle_general_message(message: Message, state: FSMContext):
     elif text == 'المدراء':
         from modules.group_management import show_managers
         await show_managers(message)
-    elif text == 'الإدمنية' or text == 'الادمنيه':
+    elif norm.equals('الإدمنية'):
         from modules.group_management import show_admins
         await show_admins(message)
     elif text == 'المميزين':
@@ -1014,13 +1012,13 @@ async def handle_general_message(message: Message, state: FSMContext):
     elif text == 'معلوماتي':
         from modules.group_management import show_my_info
         await show_my_info(message)
-    elif text == 'الحمايه' or text == 'الحماية':
+    elif norm.equals('الحماية'):
         from modules.group_management import show_group_protection
         await show_group_protection(message)
     elif text == 'الاعدادات':
         from modules.group_management import show_group_settings
         await show_group_settings(message)
-    elif text == 'المجموعه' or text == 'المجموعة':
+    elif norm.equals('المجموعة'):
         from modules.group_management import show_group_info
         await show_group_info(message)
     
@@ -1101,7 +1099,7 @@ async def handle_general_message(message: Message, state: FSMContext):
     elif text == 'مسح الرابط':
         from modules.link_management import delete_group_link
         await delete_group_link(message)
-    elif text == 'انشاء رابط' or text == 'إنشاء رابط':
+    elif norm.equals('إنشاء رابط'):
         from modules.link_management import create_invite_link
         await create_invite_link(message)
     elif text == 'المجموعه':
@@ -1117,7 +1115,7 @@ async def handle_general_message(message: Message, state: FSMContext):
     elif text == 'احصائيات النشاط' or text == 'نشاط المجموعة':
         from modules import dashboard
         await dashboard.show_activity_dashboard(message)
-    elif text == 'احصائيات الاشراف' or text == 'احصائيات الإشراف':
+    elif norm.equals('إحصائيات الإشراف'):
         from modules import dashboard
         await dashboard.show_moderation_stats(message)
     elif text == 'تقرير شامل' or text == 'التقرير الشامل':
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+اختبار الحمل للموزع الحقيقي بتحديثات اصطناعية قابلة لإعادة التشغيل
+Dispatcher Load Test - replayable synthetic updates fed through feed_update or the webhook server
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import GetChatAdministrators, GetChatMember, GetMe, TelegramMethod
+from aiogram.types import Chat, ChatMemberMember, Message, Update, User
+
+import config.database
+import config.settings
+from config.settings import METRICS_SETTINGS, WEBHOOK_SETTINGS
+from utils.metrics import metrics
+
+BOT_USER = User(id=999000, is_bot=True, first_name="Yuki", username="yuki_load_test_bot")
+FAKE_TOKEN = "123456:LOAD-TEST-TOKEN"
+FAKE_SECRET = "load-test-secret"
+
+# أنواع التحديثات وأوزانها في كل ملف حمل
+PROFILES: Dict[str, Dict[str, int]] = {
+    "default": {
+        "chat": 45, "bank": 20, "theft": 8, "castle_attack": 7, "castle_list": 5, "custom_reply": 15
+    },
+    "economy": {
+        "chat": 10, "bank": 45, "theft": 25, "castle_attack": 10, "castle_list": 5, "custom_reply": 5
+    },
+    "chatty": {
+        "chat": 80, "bank": 5, "theft": 2, "castle_attack": 1, "castle_list": 2, "custom_reply": 10
+    }
+}
+
+CHAT_LINES = ("هلا والله", "شلونكم", "صباح الخير يا جماعة", "ههههههه", "وين الناس", "تمام الحمد لله")
+BANK_COMMANDS = ("رصيد", "راتب", "ايداع 100", "سحب 50", "فلوسي")
+CUSTOM_TRIGGER = "مرحبا يوكي"
+
+# المقاييس التي يُعد ارتفاعها عن خط الأساس تراجعاً
+REGRESSION_KEYS = ("p95_ms", "p99_ms", "db_queries_per_update", "api_calls_per_update")
+
+
+class RecordingSession(BaseSession):
+    """جلسة تيليجرام داخل العملية: تسجل الطلبات الصادرة وتعيد ردوداً مصطنعة"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: Counter = Counter()
+        self._message_ids = 10_000_000
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int = None):
+        self.calls[type(method).__name__] += 1
+        returning = method.__returning__
+
+        if isinstance(method, GetMe):
+            return BOT_USER
+        if isinstance(method, GetChatMember):
+            return ChatMemberMember(user=User(id=method.user_id, is_bot=False, first_name="member"))
+        if isinstance(method, GetChatAdministrators):
+            return []
+        if returning is bool:
+            return True
+        if "Message" in str(returning) and hasattr(method, "chat_id"):
+            self._message_ids += 1
+            return Message(
+                message_id=self._message_ids,
+                date=datetime.now(),
+                chat=Chat(id=int(method.chat_id), type="supergroup"),
+                from_user=BOT_USER,
+                text=getattr(method, "text", None)
+            )
+        raise TelegramBadRequest(method=method, message="Bad Request: not emulated by the load test session")
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        # لا تنزيل ملفات في اختبار الحمل
+        return
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def seed_database(path: str, users: int, chats: int) -> None:
+    """نسخة مؤقتة من قاعدة البيانات مع مستخدمين وقلاع وردود مخصصة للاختبار"""
+    if os.path.exists(config.settings.DATABASE_URL):
+        shutil.copyfile(config.settings.DATABASE_URL, path)
+    from config.migrations import apply_migrations
+    apply_migrations(path)
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO users (user_id, username, first_name, balance, bank_balance) VALUES (?, ?, ?, ?, ?)",
+            [(user_id(i), f"load{i}", f"Load {i}", 50_000, 10_000) for i in range(users)]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO user_castles (user_id, name, castle_id, level, is_hidden) VALUES (?, ?, ?, ?, 0)",
+            [(user_id(i), f"Load Castle {i}", castle_id(i), 1 + i % 5) for i in range(users)]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO user_resources (user_id, gold, stones, workers) VALUES (?, 200, 100, 10)",
+            [(user_id(i),) for i in range(users)]
+        )
+        conn.executemany(
+            "INSERT INTO custom_replies (chat_id, trigger_word, reply_text, created_by) VALUES (?, ?, ?, ?)",
+            [(chat_id(c), CUSTOM_TRIGGER, "أهلاً بك 🌸", user_id(0)) for c in range(chats)]
+        )
+    conn.close()
+
+
+def user_id(index: int) -> int:
+    return 700_000_000 + index
+
+
+def chat_id(index: int) -> int:
+    return -1_009_000_000_000 - index
+
+
+def castle_id(index: int) -> str:
+    return f"L{index:07d}"
+
+
+def build_workload(profile: Dict[str, int], updates: int, users: int, chats: int,
+                   seed: int) -> List[Tuple[str, Update]]:
+    """توليد تحديثات حتمية من ملف الحمل (نفس البذرة = نفس التحديثات)"""
+    rng = random.Random(seed)
+    kinds = list(profile)
+    weights = list(profile.values())
+    # كل مستخدم عضو في مجموعة ثابتة حتى تشبه الرسائل مجموعات حقيقية
+    members = defaultdict(list)
+    for i in range(users):
+        members[i % chats].append(i)
+
+    workload = []
+    for update_index in range(updates):
+        kind = rng.choices(kinds, weights)[0]
+        chat_index = rng.randrange(chats)
+        sender = rng.choice(members[chat_index] or [0])
+        chat = Chat(id=chat_id(chat_index), type="supergroup", title=f"Load Chat {chat_index}")
+        reply_to = None
+
+        if kind == "chat":
+            text = rng.choice(CHAT_LINES)
+        elif kind == "bank":
+            text = rng.choice(BANK_COMMANDS)
+        elif kind == "theft":
+            victim = rng.choice(members[chat_index] or [1])
+            text = "سرقة"
+            reply_to = Message(
+                message_id=update_index * 2, date=datetime.now(), chat=chat,
+                from_user=User(id=user_id(victim), is_bot=False, first_name=f"Load {victim}"),
+                text=rng.choice(CHAT_LINES)
+            )
+        elif kind == "castle_attack":
+            text = f"هجوم {castle_id(rng.randrange(users))}"
+        elif kind == "castle_list":
+            text = "قائمة القلاع"
+        else:
+            text = CUSTOM_TRIGGER
+
+        message = Message(
+            message_id=update_index * 2 + 1,
+            date=datetime.now(),
+            chat=chat,
+            from_user=User(id=user_id(sender), is_bot=False, first_name=f"Load {sender}", username=f"load{sender}"),
+            text=text,
+            reply_to_message=reply_to
+        )
+        workload.append((kind, Update(update_id=update_index + 1, message=message)))
+    return workload
+
+
+def save_workload(path: str, workload: List[Tuple[str, Update]]) -> None:
+    """حفظ التحديثات كسطور JSON لإعادة تشغيلها لاحقاً"""
+    with open(path, "w", encoding="utf-8") as f:
+        for kind, update in workload:
+            f.write(json.dumps({"kind": kind, "update": update.model_dump(mode="json", exclude_none=True)},
+                               ensure_ascii=False) + "\n")
+
+
+def load_workload(path: str) -> List[Tuple[str, Update]]:
+    with open(path, encoding="utf-8") as f:
+        return [
+            (entry["kind"], Update.model_validate(entry["update"]))
+            for entry in map(json.loads, f) if entry
+        ]
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def post_via_webhook(dp, bot: Bot, workload: List[Tuple[str, Update]], concurrency: int,
+                           latencies: Dict[str, List[float]], errors: Counter) -> dict:
+    """إرسال التحديثات كطلبات HTTP إلى خادم الـ webhook المحلي كما يفعل تيليجرام"""
+    from aiohttp import ClientSession, web
+    from utils.webhook_server import build_webhook_app
+
+    settings = dict(WEBHOOK_SETTINGS, host="127.0.0.1", port=0, secret_token=FAKE_SECRET)
+    app = build_webhook_app(dp, bot, settings)
+    handler = app["webhook_handler"]
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings["host"], settings["port"])
+    await site.start()
+    base = f"http://{settings['host']}:{site._server.sockets[0].getsockname()[1]}"
+
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": FAKE_SECRET}
+    retries = Counter()
+
+    async with ClientSession() as client:
+        # طلب بدون الرمز السري يجب أن يُرفض
+        async with client.post(base + settings["path"], json={"update_id": 0}) as response:
+            secret_rejected = response.status == 401
+
+        async def post(kind: str, update: Update):
+            body = update.model_dump(mode="json", exclude_none=True)
+            async with semaphore:
+                started = time.perf_counter()
+                while True:
+                    async with client.post(base + settings["path"], json=body, headers=headers) as response:
+                        if response.status != 503:
+                            break
+                    # تيليجرام يعيد إرسال التحديث المرفوض لاحقاً
+                    retries[kind] += 1
+                    await asyncio.sleep(0.05)
+                if response.status != 200:
+                    errors[kind] += 1
+                latencies[kind].append(time.perf_counter() - started)
+
+        await asyncio.gather(*(post(kind, update) for kind, update in workload))
+        async with client.get(base + "/health") as response:
+            health = await response.json()
+
+    # الإيقاف الهادئ ينتظر التحديثات التي قُبلت ولم تنتهِ بعد
+    await runner.cleanup()
+    return {
+        "secret_rejected": secret_rejected,
+        "backpressure_retries": sum(retries.values()),
+        "handler_failures": handler.failed,
+        "health": health
+    }
+
+
+async def run(workload: List[Tuple[str, Update]], concurrency: int, webhook: bool = False) -> dict:
+    """تغذية الموزع الحقيقي بالتحديثات وجمع النتائج"""
+    from main import build_dispatcher
+
+    session = RecordingSession()
+    bot = Bot(token=FAKE_TOKEN, session=session)
+    dp = await build_dispatcher(bot)
+    metrics.commands.clear()
+    metrics.queries.clear()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors = Counter()
+
+    async def feed(kind: str, update: Update):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                errors[kind] += 1
+            latencies[kind].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    webhook_result = None
+    if webhook:
+        # الزمن لكل نوع هنا زمن الرد على تيليجرام، والزمن الكلي يشمل إنهاء المعالجة
+        webhook_result = await post_via_webhook(dp, bot, workload, concurrency, latencies, errors)
+    else:
+        await asyncio.gather(*(feed(kind, update) for kind, update in workload))
+    elapsed = time.perf_counter() - started
+
+    overall = metrics.overall()
+    everything = sorted(latency for values in latencies.values() for latency in values)
+    count = len(everything)
+    return {
+        "updates": count,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ups": round(count / elapsed, 1),
+        "p50_ms": round(percentile(everything, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(everything, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(everything, 0.99) * 1000, 2),
+        "db_queries_per_update": round(overall.db_queries / max(overall.count, 1), 2),
+        "db_connections_per_update": round(overall.db_connections / max(overall.count, 1), 2),
+        "api_calls_per_update": round(sum(session.calls.values()) / max(count, 1), 2),
+        "errors": sum(errors.values()),
+        "by_kind": {
+            kind: {
+                "count": len(values),
+                "p50_ms": round(percentile(sorted(values), 0.5) * 1000, 2),
+                "p95_ms": round(percentile(sorted(values), 0.95) * 1000, 2)
+            }
+            for kind, values in sorted(latencies.items())
+        },
+        "api_calls": dict(session.calls.most_common()),
+        **({"webhook": webhook_result} if webhook_result else {})
+    }
+
+
+def print_report(result: dict) -> None:
+    print(f"التحديثات: {result['updates']}  التوازي: {result['concurrency']}  الزمن: {result['elapsed_s']}s")
+    print(f"الإنتاجية: {result['throughput_ups']} تحديث/ث")
+    print(f"الزمن: p50 {result['p50_ms']}ms  p95 {result['p95_ms']}ms  p99 {result['p99_ms']}ms")
+    print(f"استعلامات/تحديث: {result['db_queries_per_update']}  اتصالات/تحديث: {result['db_connections_per_update']}  "
+          f"طلبات تيليجرام/تحديث: {result['api_calls_per_update']}  أخطاء: {result['errors']}")
+    for kind, stats in result["by_kind"].items():
+        print(f"  {kind:>14}: ×{stats['count']:<6} p50 {stats['p50_ms']}ms  p95 {stats['p95_ms']}ms")
+    print("الطلبات الصادرة: " + ", ".join(f"{name}×{count}" for name, count in result["api_calls"].items()))
+    if "webhook" in result:
+        webhook = result["webhook"]
+        print(f"الـ webhook: رفض الطلب بلا رمز سري: {'نعم' if webhook['secret_rejected'] else 'لا ❌'}  "
+              f"إعادات بسبب الضغط العكسي: {webhook['backpressure_retries']}  "
+              f"فشل المعالجة: {webhook['handler_failures']}  الفحص الصحي: {webhook['health']}")
+
+
+def compare_with_baseline(result: dict, baseline: dict, tolerance: float) -> bool:
+    """مقارنة النتائج بخط الأساس وإرجاع True إذا لم يوجد تراجع"""
+    ok = True
+    print("\nالمقارنة مع خط الأساس:")
+    for key in REGRESSION_KEYS:
+        before, after = baseline.get(key), result.get(key)
+        if not before:
+            continue
+        change = (after - before) / before
+        regressed = change > tolerance
+        ok &= not regressed
+        print(f"  {key:>24}: {before} → {after} ({change * 100:+.1f}%){'  ❌ تراجع' if regressed else ''}")
+    return ok
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="اختبار حمل الموزع بتحديثات اصطناعية")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="default")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--record", help="حفظ التحديثات المولدة في ملف JSONL")
+    parser.add_argument("--replay", help="إعادة تشغيل تحديثات محفوظة بدل التوليد")
+    parser.add_argument("--save-baseline", help="حفظ النتائج كخط أساس")
+    parser.add_argument("--baseline", help="مقارنة النتائج بخط أساس محفوظ")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="نسبة التراجع المسموحة")
+    parser.add_argument("--webhook", action="store_true", help="إرسال التحديثات عبر خادم الـ webhook المحلي")
+    parser.add_argument("--verbose", action="store_true", help="عرض سجلات المعالجات (أخطاء فقط)")
+    args = parser.parse_args()
+
+    # سجلات المعالجات تغرق الطرفية تحت الحمل
+    logging.getLogger().setLevel(logging.ERROR if args.verbose else logging.CRITICAL)
+    METRICS_SETTINGS["enabled"] = True
+
+    if args.replay:
+        workload = load_workload(args.replay)
+    else:
+        workload = build_workload(PROFILES[args.profile], args.updates, args.users, args.chats, args.seed)
+    if args.record:
+        save_workload(args.record, workload)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "load_test.db")
+        seed_database(path, args.users, args.chats)
+        config.database.DATABASE_URL = path
+        config.settings.DATABASE_URL = path
+        result = await run(workload, args.concurrency, args.webhook)
+
+    result["profile"] = "replay" if args.replay else args.profile
+    print_report(result)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nتم حفظ خط الأساس في {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            if not compare_with_baseline(result, json.load(f), args.tolerance):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -48,14 +48,8 @@ async def check_restart_status(bot):
         logging.error(f"خطأ في فحص حالة إعادة التشغيل: {e}")
 
 
-async def main():
-    """دالة تشغيل البوت الرئيسية"""
-    # إعداد نظام التسجيل
-    setup_logging()
-    
-    # إنشاء كائن البوت مع الإعدادات الافتراضية
-    bot = Bot(token=BOT_TOKEN)
-    
+async def build_dispatcher(bot: Bot) -> Dispatcher:
+    """بناء موزع الأحداث بمعالجاته ووسطائه وتحميل الذاكرات المؤقتة (يُستخدم أيضاً في اختبار الحمل)"""
     # إنشاء موزع الأحداث
     dp = Dispatcher()
     
@@ -79,25 +73,118 @@ async def main():
     from modules.custom_commands import load_custom_commands
     await load_custom_commands()
     
+    # تحميل معرفات الملفات المرفوعة مسبقاً لتيليجرام
+    from modules.file_cache import file_cache
+    await file_cache.load()
+    
+    # تحميل لقطة إعدادات المجموعات إلى الذاكرة
+    from modules.group_settings_cache import group_settings_cache
+    await group_settings_cache.load()
+
+    # تحميل الكلمات الممنوعة وتفعيل فلتر الإشراف قبل المعالجات
+    from modules.moderation_filter import moderation_filter
+    from utils.middlewares import ModerationMiddleware
+    await moderation_filter.load()
+    dp.message.outer_middleware(ModerationMiddleware())
+    dp.edited_message.outer_middleware(ModerationMiddleware(edited=True))
+
+    # إسقاط الإغراق بعد فلتر الإشراف (في الذاكرة) وقبل المعالجات وقاعدة البيانات
+    from config.settings import THROTTLING_SETTINGS
+    if THROTTLING_SETTINGS["enabled"]:
+        from utils.middlewares import ThrottlingMiddleware
+        throttling = ThrottlingMiddleware(THROTTLING_SETTINGS)
+        dp.message.outer_middleware(throttling)
+        dp.callback_query.outer_middleware(throttling)
+
+    # تسجيل عضوية المرسل بعد الفلاتر حتى لا تُحتسب الرسائل المحذوفة أو المُسقطة بسبب الإغراق
+    from utils.middlewares import ChatActivityMiddleware
+    dp.message.outer_middleware(ChatActivityMiddleware())
+
+    # تطبيع النص مرة واحدة لكل رسالة تجاوزت الفلاتر وقبل كل المطابقات
+    from utils.middlewares import TextNormalizationMiddleware
+    dp.message.outer_middleware(TextNormalizationMiddleware())
+
+    # قياس زمن التحديثات واستعلامات قاعدة البيانات وطلبات تيليجرام
+    from config.settings import METRICS_SETTINGS
+    if METRICS_SETTINGS["enabled"]:
+        from config.database import set_query_tracer
+        from utils.metrics import metrics
+        from utils.middlewares import ApiCallMetricsMiddleware, MetricsMiddleware
+        set_query_tracer(metrics)
+        dp.update.outer_middleware(MetricsMiddleware())
+        bot.session.middleware(ApiCallMetricsMiddleware())
+
+    # ترتيب تحديثات المستخدم الواحد (بعد المقاييس حتى يُحسب زمن الانتظار)
+    from config.settings import CONCURRENCY_SETTINGS
+    if CONCURRENCY_SETTINGS["user_locks"]:
+        from utils.middlewares import UserLockMiddleware
+        dp.update.outer_middleware(UserLockMiddleware(max_keys=CONCURRENCY_SETTINGS["max_lock_keys"]))
+
+    # تحميل أوقات الهجمات الأخيرة لفترات انتظار معارك القلاع
+    from modules.castle_battle import battle_engine
+    await battle_engine.load()
+
     # تحميل إعدادات التحميل
     from modules.media_download import load_download_settings
     await load_download_settings()
     
+    return dp
+
+
+async def main():
+    """دالة تشغيل البوت الرئيسية"""
+    # إعداد نظام التسجيل
+    setup_logging()
+    
+    # إنشاء كائن البوت مع الإعدادات الافتراضية
+    bot = Bot(token=BOT_TOKEN)
+    dp = await build_dispatcher(bot)
+    
+    # خادم المقاييس المحلي
+    from config.settings import METRICS_SETTINGS
+    metrics_runner = None
+    if METRICS_SETTINGS["enabled"]:
+        from utils.metrics import metrics, start_metrics_server
+        metrics_runner = await start_metrics_server(metrics, METRICS_SETTINGS["host"], METRICS_SETTINGS["port"])
+    
     # فحص إعادة التشغيل وإرسال رسالة تأكيد
     await check_restart_status(bot)
     
+    # المهام الدورية - نحتفظ بمراجعها لإلغائها وانتظارها عند الإيقاف
+    background_tasks = []
+
+    # تشغيل النسخ الاحتياطي الدوري
+    from config.settings import BACKUP_SETTINGS
+    if BACKUP_SETTINGS["enabled"]:
+        from modules.backup_system import backup_scheduler
+        background_tasks.append(asyncio.create_task(backup_scheduler(bot)))
+
+    # تشغيل نقاط تفتيش WAL الدورية
+    from config.settings import WAL_SETTINGS
+    if WAL_SETTINGS["enabled"]:
+        from config.database import checkpoint_scheduler
+        background_tasks.append(asyncio.create_task(checkpoint_scheduler()))
+
+    # كتابة عضوية المجموعات المجمّعة بشكل دوري
+    from modules.chat_members import chat_members
+    background_tasks.append(asyncio.create_task(chat_members.flush_scheduler()))
+
     try:
         logging.info("🚀 بدء تشغيل البوت...")
         
-        # التأكد من إغلاق أي webhooks نشطة
-        try:
-            await bot.delete_webhook(drop_pending_updates=True)
-            logging.info("✅ تم حذف جميع الـ webhooks والتحديثات المعلقة")
-        except Exception as webhook_error:
-            logging.warning(f"⚠️ تحذير في حذف الـ webhooks: {webhook_error}")
+        from config.settings import WEBHOOK_SETTINGS
+        webhook_mode = WEBHOOK_SETTINGS["mode"] == "webhook"
         
-        # إضافة تأخير قصير للتأكد من تطبيق التغييرات
-        await asyncio.sleep(2)
+        # التأكد من إغلاق أي webhooks نشطة (وضع التصويت فقط)
+        if not webhook_mode:
+            try:
+                await bot.delete_webhook(drop_pending_updates=True)
+                logging.info("✅ تم حذف جميع الـ webhooks والتحديثات المعلقة")
+            except Exception as webhook_error:
+                logging.warning(f"⚠️ تحذير في حذف الـ webhooks: {webhook_error}")
+            
+            # إضافة تأخير قصير للتأكد من تطبيق التغييرات
+            await asyncio.sleep(2)
         
         # إرسال إشعار بدء التشغيل للقناة الفرعية
         try:
@@ -107,8 +194,14 @@ async def main():
         except Exception as startup_error:
             logging.warning(f"⚠️ تحذير: لم يتم إرسال إشعار بدء التشغيل: {startup_error}")
         
-        # بدء التصويت
-        await dp.start_polling(bot)
+        if webhook_mode:
+            # استقبال التحديثات عبر خادم aiohttp
+            from utils.webhook_server import run_webhook
+            await run_webhook(dp, bot, WEBHOOK_SETTINGS)
+        else:
+            # بدء التصويت (كل تحديث في مهمة مستقلة)
+            from config.settings import CONCURRENCY_SETTINGS
+            await dp.start_polling(bot, tasks_concurrency_limit=CONCURRENCY_SETTINGS["tasks_concurrency_limit"])
         
     except KeyboardInterrupt:
         logging.info("🛑 تم إيقاف البوت بواسطة المستخدم")
@@ -118,6 +211,15 @@ async def main():
         import traceback
         logging.error(f"تفاصيل الخطأ: {traceback.format_exc()}")
     finally:
+        # إيقاف المهام الدورية قبل الكتابة الأخيرة حتى لا تتزامن معها
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await chat_members.flush()
+        from modules.download_pipeline import media_downloader
+        await media_downloader.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         try:
             await bot.session.close()
             logging.info("✅ تم إغلاق جلسة البوت بنجاح")
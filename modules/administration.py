@@ -337,31 +337,8 @@ async def create_backup(message: Message):
             await message.reply("❌ غير مصرح لك بالوصول لهذه الميزة")
             return
         
-        await message.reply("🔄 **إنشاء نسخة احتياطية...**\n\nيرجى الانتظار...")
-        
-        # إنشاء النسخة الاحتياطية
-        backup_data = await create_database_backup()
-        
-        if backup_data:
-            backup_filename = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            
-            # حفظ البيانات في ملف
-            import json
-            with open(backup_filename, 'w', encoding='utf-8') as f:
-                json.dump(backup_data, f, ensure_ascii=False, indent=2)
-            
-            await message.reply(
-                f"✅ **تم إنشاء النسخة الاحتياطية بنجاح!**\n\n"
-                f"📁 اسم الملف: {backup_filename}\n"
-                f"📊 البيانات المحفوظة:\n"
-                f"• المستخدمين: {len(backup_data.get('users', []))}\n"
-                f"• المعاملات: {len(backup_data.get('transactions', []))}\n"
-                f"• العقارات: {len(backup_data.get('properties', []))}\n"
-                f"• الاستثمارات: {len(backup_data.get('investments', []))}\n"
-                f"📅 التاريخ: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            )
-        else:
-            await message.reply("❌ فشل في إنشاء النسخة الاحتياطية")
+        from modules.backup_system import backup_command
+        await backup_command(message)
         
     except Exception as e:
         logging.error(f"خطأ في إنشاء النسخة الاحتياطية: {e}")
@@ -486,36 +463,6 @@ async def get_top_users_by_activity():
         return []
 
 
-async def create_database_backup():
-    """إنشاء نسخة احتياطية من قاعدة البيانات"""
-    try:
-        backup_data = {}
-        
-        # نسخ احتياطية للجداول المهمة
-        tables = ['users', 'transactions', 'properties', 'investments', 'stocks', 'farm', 'castle']
-        
-        for table in tables:
-            try:
-                data = await execute_query(f"SELECT * FROM {table}", (), fetch_one=True)
-                backup_data[table] = data if data else []
-            except Exception as e:
-                logging.warning(f"تعذر نسخ جدول {table}: {e}")
-                backup_data[table] = []
-        
-        # إضافة معلومات النسخة الاحتياطية
-        backup_data['backup_info'] = {
-            'created_at': datetime.now().isoformat(),
-            'version': '1.0',
-            'creator': 'Admin Bot'
-        }
-        
-        return backup_data
-        
-    except Exception as e:
-        logging.error(f"خطأ في إنشاء النسخة الاحتياطية: {e}")
-        return None
-
-
 # معالجات الحالات
 async def process_user_id_action(message: Message, state: FSMContext):
     """معالجة إجراء معرف المستخدم"""
@@ -6,10 +6,11 @@ Real-time Analytics Tracking Module
 import logging
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import json
 
 from config.database import execute_query
+from modules.chat_members import chat_members
 
 
 class AnalyticsTracker:
@@ -113,11 +114,8 @@ class AnalyticsTracker:
     async def track_message_activity(user_id: int, chat_id: int):
         """تتبع نشاط الرسائل"""
         try:
-            # تحديث آخر نشاط للمستخدم
-            await execute_query("""
-                UPDATE users SET updated_at = CURRENT_TIMESTAMP 
-                WHERE user_id = ? AND chat_id = ?
-            """, (user_id, chat_id))
+            # تحديث آخر نشاط للعضو في المجموعة (يُكتب دفعة واحدة لاحقاً)
+            chat_members.record(chat_id, user_id)
             
             # تحديث عدد الرسائل اليومية
             await AnalyticsTracker.update_daily_stats(chat_id, "messages_count", 1)
@@ -148,7 +146,7 @@ class DashboardMetrics:
         try:
             # إجمالي الأعضاء
             total_members = await execute_query(
-                "SELECT COUNT(*) FROM users WHERE chat_id = ?",
+                "SELECT COUNT(*) FROM chat_members WHERE chat_id = ?",
                 (chat_id,), fetch_one=True
             )
             total_count = total_members[0] if total_members else 0
@@ -177,16 +175,16 @@ class DashboardMetrics:
             # المستخدمين الجدد في الفترة الحالية
             current_period_start = (datetime.now() - timedelta(days=days)).date().isoformat()
             current_new_users = await execute_query("""
-                SELECT COUNT(*) FROM users 
-                WHERE chat_id = ? AND date(created_at) >= ?
+                SELECT COUNT(*) FROM chat_members
+                WHERE chat_id = ? AND first_seen >= ?
             """, (chat_id, current_period_start), fetch_one=True)
             
             # المستخدمين الجدد في الفترة السابقة
             previous_period_start = (datetime.now() - timedelta(days=days*2)).date().isoformat()
             previous_period_end = current_period_start
             previous_new_users = await execute_query("""
-                SELECT COUNT(*) FROM users 
-                WHERE chat_id = ? AND date(created_at) >= ? AND date(created_at) < ?
+                SELECT COUNT(*) FROM chat_members
+                WHERE chat_id = ? AND first_seen >= ? AND first_seen < ?
             """, (chat_id, previous_period_start, previous_period_end), fetch_one=True)
             
             current_count = current_new_users[0] if current_new_users else 0
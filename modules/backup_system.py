@@ -0,0 +1,378 @@
+"""
+نظام النسخ الاحتياطي لقاعدة البيانات
+Database Backup System
+"""
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from aiogram import Bot
+from aiogram.types import Message, FSInputFile
+
+from config.settings import DATABASE_URL, BACKUP_SETTINGS
+from config.hierarchy import MASTERS
+from utils.helpers import get_file_size_str
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+BACKUP_PREFIX = "yuki_backup_"
+CHUNK_SIZE = 1024 * 1024
+
+# قفل لمنع تشغيل نسختين أو استعادة ونسخ في نفس الوقت
+_backup_lock = asyncio.Lock()
+
+
+def get_compression_method() -> str:
+    """تحديد طريقة الضغط المتاحة"""
+    if BACKUP_SETTINGS.get("compression") == "zstd" and zstandard is not None:
+        return "zstd"
+    return "gzip"
+
+
+def online_backup(source_path: str, target_path: str,
+                  pages: Optional[int] = None, step_pause: Optional[float] = None) -> None:
+    """نسخ قاعدة البيانات أثناء عملها عبر واجهة sqlite3 على دفعات من الصفحات"""
+    pages = pages or BACKUP_SETTINGS["pages_per_step"]
+    step_pause = BACKUP_SETTINGS["step_pause"] if step_pause is None else step_pause
+
+    def _progress(status, remaining, total):
+        # ترك القفل بين الخطوات حتى لا تتوقف عمليات الكتابة في البوت
+        if remaining and step_pause:
+            time.sleep(step_pause)
+
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages, progress=_progress)
+    finally:
+        target.close()
+        source.close()
+
+
+def verify_database_file(path: str) -> bool:
+    """التحقق من سلامة ملف قاعدة البيانات"""
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()
+            return bool(result) and result[0] == "ok"
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.error(f"خطأ في فحص سلامة النسخة {path}: {e}")
+        return False
+
+
+def _file_sha256(path: str) -> str:
+    """حساب بصمة الملف"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _open_compressed_writer(path: str, method: str):
+    """فتح ملف مضغوط للكتابة المتدفقة"""
+    if method == "zstd":
+        raw = open(path, 'wb')
+        return raw, zstandard.ZstdCompressor(level=10, threads=-1).stream_writer(raw)
+    return None, gzip.open(path, 'wb', compresslevel=6)
+
+
+def compress_file(source_path: str, target_path: str, method: str) -> None:
+    """ضغط الملف على شكل دفعات دون تحميله كاملاً في الذاكرة"""
+    raw, writer = _open_compressed_writer(target_path, method)
+    try:
+        with open(source_path, 'rb') as src:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                writer.write(chunk)
+    finally:
+        writer.close()
+        if raw is not None and not raw.closed:
+            raw.close()
+
+
+def decompress_file(source_path: str, target_path: str) -> None:
+    """فك ضغط ملف النسخة الاحتياطية"""
+    if source_path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("مكتبة zstandard غير مثبتة لفك ضغط هذه النسخة")
+        with open(source_path, 'rb') as src, open(target_path, 'wb') as dst:
+            zstandard.ZstdDecompressor().copy_stream(src, dst, read_size=CHUNK_SIZE)
+    elif source_path.endswith(".gz"):
+        with gzip.open(source_path, 'rb') as src, open(target_path, 'wb') as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                dst.write(chunk)
+    else:
+        raise ValueError(f"صيغة نسخة غير معروفة: {source_path}")
+
+
+def _build_backup(source_path: str, backup_dir: str) -> Dict[str, Any]:
+    """إنشاء نسخة مضغوطة ومتحقق منها (يعمل خارج حلقة الأحداث)"""
+    os.makedirs(backup_dir, exist_ok=True)
+    method = get_compression_method()
+    extension = ".zst" if method == "zstd" else ".gz"
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_path = os.path.join(backup_dir, f"{BACKUP_PREFIX}{timestamp}.db{extension}")
+    suffix = 1
+    while os.path.exists(backup_path):
+        backup_path = os.path.join(backup_dir, f"{BACKUP_PREFIX}{timestamp}_{suffix}.db{extension}")
+        suffix += 1
+
+    started = time.monotonic()
+    fd, snapshot_path = tempfile.mkstemp(suffix=".db", dir=backup_dir)
+    os.close(fd)
+    try:
+        online_backup(source_path, snapshot_path)
+
+        if not verify_database_file(snapshot_path):
+            raise RuntimeError("فشل فحص سلامة النسخة الاحتياطية")
+
+        checksum = _file_sha256(snapshot_path)
+        raw_size = os.path.getsize(snapshot_path)
+        compress_file(snapshot_path, backup_path, method)
+    finally:
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+
+    with open(backup_path + ".sha256", 'w', encoding='utf-8') as f:
+        f.write(f"{checksum}  {os.path.basename(backup_path)}\n")
+
+    return {
+        'path': backup_path,
+        'filename': os.path.basename(backup_path),
+        'compression': method,
+        'raw_size': raw_size,
+        'size': os.path.getsize(backup_path),
+        'sha256': checksum,
+        'duration': time.monotonic() - started,
+        'created_at': datetime.now().isoformat()
+    }
+
+
+def _restore_backup(backup_path: str, target_path: str) -> None:
+    """استعادة نسخة احتياطية إلى قاعدة البيانات الحية (يعمل خارج حلقة الأحداث)"""
+    backup_dir = os.path.dirname(backup_path) or "."
+    fd, snapshot_path = tempfile.mkstemp(suffix=".db", dir=backup_dir)
+    os.close(fd)
+    try:
+        decompress_file(backup_path, snapshot_path)
+
+        checksum_file = backup_path + ".sha256"
+        if os.path.exists(checksum_file):
+            with open(checksum_file, 'r', encoding='utf-8') as f:
+                expected = f.read().split()[0]
+            if _file_sha256(snapshot_path) != expected:
+                raise RuntimeError("بصمة النسخة لا تطابق الملف المحفوظ")
+
+        if not verify_database_file(snapshot_path):
+            raise RuntimeError("النسخة الاحتياطية تالفة")
+
+        # الاستعادة عبر نفس الواجهة حتى ترى الاتصالات المفتوحة البيانات الجديدة
+        online_backup(snapshot_path, target_path, step_pause=0)
+    finally:
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+
+
+def list_backups(backup_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """قائمة النسخ الاحتياطية من الأحدث للأقدم"""
+    backup_dir = backup_dir or BACKUP_SETTINGS["directory"]
+    if not os.path.isdir(backup_dir):
+        return []
+
+    backups = []
+    for name in os.listdir(backup_dir):
+        if name.startswith(BACKUP_PREFIX) and (name.endswith(".db.gz") or name.endswith(".db.zst")):
+            path = os.path.join(backup_dir, name)
+            backups.append({
+                'filename': name,
+                'path': path,
+                'size': os.path.getsize(path),
+                'modified': os.path.getmtime(path)
+            })
+
+    backups.sort(key=lambda item: (item['modified'], item['filename']), reverse=True)
+    return backups
+
+
+def rotate_backups(keep_last: Optional[int] = None, backup_dir: Optional[str] = None) -> int:
+    """حذف النسخ القديمة مع الإبقاء على آخر عدد محدد"""
+    keep_last = BACKUP_SETTINGS["keep_last"] if keep_last is None else keep_last
+    removed = 0
+    for backup in list_backups(backup_dir)[keep_last:]:
+        try:
+            os.remove(backup['path'])
+            if os.path.exists(backup['path'] + ".sha256"):
+                os.remove(backup['path'] + ".sha256")
+            removed += 1
+        except OSError as e:
+            logging.warning(f"تعذر حذف النسخة القديمة {backup['filename']}: {e}")
+    return removed
+
+
+async def create_backup(source_path: str = DATABASE_URL, backup_dir: Optional[str] = None) -> Dict[str, Any]:
+    """إنشاء نسخة احتياطية دون إيقاف البوت"""
+    backup_dir = backup_dir or BACKUP_SETTINGS["directory"]
+    async with _backup_lock:
+        info = await asyncio.to_thread(_build_backup, source_path, backup_dir)
+    logging.info(
+        f"✅ تم إنشاء نسخة احتياطية {info['filename']} "
+        f"({get_file_size_str(info['size'])}) خلال {info['duration']:.2f} ثانية"
+    )
+    return info
+
+
+async def restore_backup(backup_path: str, target_path: str = DATABASE_URL) -> Dict[str, Any]:
+    """استعادة نسخة احتياطية بعد أخذ نسخة أمان من الوضع الحالي"""
+    if not os.path.exists(backup_path):
+        raise FileNotFoundError(backup_path)
+
+    safety = await create_backup(target_path, os.path.dirname(backup_path) or None)
+    async with _backup_lock:
+        await asyncio.to_thread(_restore_backup, backup_path, target_path)
+    logging.warning(f"⚠️ تمت استعادة قاعدة البيانات من {os.path.basename(backup_path)}")
+    return safety
+
+
+async def send_backup_document(bot: Bot, chat_id: int, info: Dict[str, Any]) -> bool:
+    """إرسال ملف النسخة الاحتياطية كمستند"""
+    if info['size'] > BACKUP_SETTINGS["max_document_size"]:
+        await bot.send_message(
+            chat_id,
+            f"⚠️ حجم النسخة {get_file_size_str(info['size'])} أكبر من حد تيليجرام\n"
+            f"📁 الملف محفوظ على الخادم: `{info['filename']}`"
+        )
+        return False
+
+    await bot.send_document(
+        chat_id,
+        FSInputFile(info['path'], filename=info['filename']),
+        caption=(
+            f"💾 **نسخة احتياطية لقاعدة البيانات**\n\n"
+            f"📁 الملف: `{info['filename']}`\n"
+            f"📦 الحجم: {get_file_size_str(info['size'])} "
+            f"(الأصلي {get_file_size_str(info['raw_size'])})\n"
+            f"🗜 الضغط: {info['compression']}\n"
+            f"🔐 SHA-256: `{info['sha256'][:16]}…`\n"
+            f"📅 التاريخ: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        )
+    )
+    return True
+
+
+async def backup_scheduler(bot: Optional[Bot] = None):
+    """مهمة خلفية لأخذ نسخ دورية وتدويرها"""
+    interval = BACKUP_SETTINGS["interval_hours"] * 3600
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            info = await create_backup()
+            removed = rotate_backups()
+            if removed:
+                logging.info(f"🗑 تم حذف {removed} نسخة احتياطية قديمة")
+
+            if bot and BACKUP_SETTINGS.get("send_to_masters"):
+                for master_id in MASTERS:
+                    try:
+                        await send_backup_document(bot, master_id, info)
+                    except Exception as send_error:
+                        logging.warning(f"تعذر إرسال النسخة للسيد {master_id}: {send_error}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"❌ خطأ في النسخ الاحتياطي المجدول: {e}")
+
+
+async def backup_command(message: Message):
+    """إنشاء نسخة احتياطية وإرسالها للسيد في الخاص"""
+    try:
+        status_msg = await message.reply("🔄 **جاري إنشاء نسخة احتياطية...**\n\nالبوت يعمل بشكل طبيعي أثناء النسخ")
+        info = await create_backup()
+        rotate_backups()
+
+        try:
+            await send_backup_document(message.bot, message.from_user.id, info)
+            where = "📩 تم إرسال الملف إليك في الخاص"
+        except Exception as send_error:
+            logging.warning(f"تعذر إرسال النسخة للسيد {message.from_user.id}: {send_error}")
+            where = "⚠️ تعذر الإرسال في الخاص، ابدأ محادثة مع البوت أولاً"
+
+        await status_msg.edit_text(
+            f"✅ **تم إنشاء النسخة الاحتياطية بنجاح!**\n\n"
+            f"📁 الملف: `{info['filename']}`\n"
+            f"📦 الحجم: {get_file_size_str(info['size'])}\n"
+            f"⏱ المدة: {info['duration']:.2f} ثانية\n"
+            f"{where}"
+        )
+    except Exception as e:
+        logging.error(f"خطأ في أمر النسخ الاحتياطي: {e}")
+        await message.reply("❌ حدث خطأ في إنشاء النسخة الاحتياطية")
+
+
+async def list_backups_command(message: Message):
+    """عرض النسخ الاحتياطية المحفوظة"""
+    backups = list_backups()
+    if not backups:
+        await message.reply("📭 لا توجد نسخ احتياطية محفوظة")
+        return
+
+    text = "💾 **النسخ الاحتياطية المحفوظة:**\n\n"
+    for i, backup in enumerate(backups, 1):
+        text += f"{i}. `{backup['filename']}` - {get_file_size_str(backup['size'])}\n"
+    text += "\n💡 للاستعادة: `استعادة نسخة [اسم الملف]`"
+    await message.reply(text)
+
+
+async def restore_backup_command(message: Message, filename: str):
+    """استعادة قاعدة البيانات من نسخة محددة"""
+    try:
+        filename = os.path.basename(filename.strip())
+        backup = next((b for b in list_backups() if b['filename'] == filename), None)
+        if not backup:
+            await message.reply("❌ لم يتم العثور على النسخة المطلوبة\n\nاكتب 'النسخ الاحتياطية' لعرض القائمة")
+            return
+
+        await message.reply("🔄 **جاري استعادة النسخة الاحتياطية...**")
+        safety = await restore_backup(backup['path'])
+        await message.reply(
+            f"✅ **تمت استعادة قاعدة البيانات**\n\n"
+            f"📁 من: `{filename}`\n"
+            f"🛟 نسخة الأمان قبل الاستعادة: `{safety['filename']}`"
+        )
+    except Exception as e:
+        logging.error(f"خطأ في استعادة النسخة الاحتياطية: {e}")
+        await message.reply(f"❌ فشلت الاستعادة: {e}")
+
+
+async def handle_backup_commands(message: Message) -> bool:
+    """معالج أوامر النسخ الاحتياطي للأسياد"""
+    if not message.text or not message.from_user or message.from_user.id not in MASTERS:
+        return False
+
+    text = message.text.strip()
+
+    if text in ['نسخة احتياطية', 'نسخه احتياطيه', 'انشاء نسخة احتياطية']:
+        await backup_command(message)
+        return True
+    elif text in ['النسخ الاحتياطية', 'قائمة النسخ']:
+        await list_backups_command(message)
+        return True
+    elif text.startswith('استعادة نسخة '):
+        await restore_backup_command(message, text.replace('استعادة نسخة ', '', 1))
+        return True
+
+    return False
@@ -6,10 +6,13 @@ Updated Castle Module with Comprehensive Castle System and Treasure Hunt
 import logging
 import random
 from datetime import datetime, timedelta
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 
 from database.operations import get_user, update_user_balance, execute_query, add_transaction
+from modules.loot_tables import TreasureLootTable
+from modules.resource_ledger import apply_resources, get_resources, invalidate_resources
+from utils.callback_router import pack_callback
 from utils.states import CastleStates
 from utils.helpers import format_number
 
@@ -100,6 +103,9 @@ RESOURCE_INFO = {
     "workers": {"min": 15, "max": 70, "emoji": "👷", "name": "العمال"}
 }
 
+# جدول الغنائم مترجم مرة واحدة عند الاستيراد
+TREASURE_LOOT_TABLE = TreasureLootTable(TREASURE_HUNT_TYPES, RESOURCE_INFO)
+
 
 # ===== دوال قاعدة البيانات المساعدة =====
 
@@ -144,11 +150,14 @@ async def is_master_user(user_id: int) -> bool:
     return user_id in MASTER_USERS
 
 
+USER_CASTLE_QUERY = "SELECT * FROM user_castles WHERE user_id = ?"
+
+
 async def get_user_castle(user_id: int):
     """الحصول على قلعة المستخدم"""
     try:
         return await execute_query(
-            "SELECT * FROM user_castles WHERE user_id = ?",
+            USER_CASTLE_QUERY,
             (user_id,),
             fetch_one=True
         )
@@ -170,8 +179,8 @@ async def create_user_castle(user_id: int, castle_name: str) -> bool:
         castle_id = generate_castle_id()
         await execute_query(
             """
-            INSERT INTO user_castles (user_id, name, castle_id, created_at)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO user_castles (user_id, name, castle_id, is_hidden, created_at)
+            VALUES (?, ?, ?, 0, ?)
             """,
             (user_id, castle_name, castle_id, datetime.now().isoformat())
         )
@@ -184,28 +193,7 @@ async def create_user_castle(user_id: int, castle_name: str) -> bool:
 async def get_user_resources(user_id: int) -> dict:
     """الحصول على موارد المستخدم"""
     try:
-        result = await execute_query(
-            "SELECT * FROM user_resources WHERE user_id = ?",
-            (user_id,),
-            fetch_one=True
-        )
-        if result:
-            return {
-                'money': result['money'] if result['money'] else 0,
-                'gold': result['gold'] if result['gold'] else 0,
-                'stones': result['stones'] if result['stones'] else 0,
-                'workers': result['workers'] if result['workers'] else 0
-            }
-        else:
-            # إنشاء موارد جديدة إذا لم تكن موجودة
-            await execute_query(
-                """
-                INSERT INTO user_resources (user_id, money, gold, stones, workers)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (user_id, 0, 0, 0, 0)
-            )
-            return {'money': 0, 'gold': 0, 'stones': 0, 'workers': 0}
+        return await get_resources(user_id)
     except Exception as e:
         logging.error(f"خطأ في الحصول على موارد المستخدم {user_id}: {e}")
         return {'money': 0, 'gold': 0, 'stones': 0, 'workers': 0}
@@ -213,45 +201,14 @@ async def get_user_resources(user_id: int) -> dict:
 
 async def add_resource_to_user(user_id: int, resource_type: str, amount: int) -> bool:
     """إضافة مورد للمستخدم"""
-    try:
-        # الحصول على الموارد الحالية
-        current_resources = await get_user_resources(user_id)
-        
-        if resource_type == 'money':
-            # إضافة المال للرصيد العادي
-            user = await get_user(user_id)
-            if user:
-                new_balance = user['balance'] + amount
-                return await update_user_balance(user_id, new_balance)
-        else:
-            # إضافة الموارد الأخرى
-            new_amount = current_resources.get(resource_type, 0) + amount
-            await execute_query(
-                f"UPDATE user_resources SET {resource_type} = ? WHERE user_id = ?",
-                (new_amount, user_id)
-            )
-        return True
-    except Exception as e:
-        logging.error(f"خطأ في إضافة مورد {resource_type} للمستخدم {user_id}: {e}")
-        return False
+    return await apply_resources(user_id, {resource_type: amount})
 
 
 async def subtract_resources_from_user(user_id: int, resources: dict) -> bool:
-    """خصم موارد من المستخدم"""
-    try:
-        current_resources = await get_user_resources(user_id)
-        
-        for resource_type, amount in resources.items():
-            if resource_type in current_resources:
-                new_amount = max(0, current_resources[resource_type] - amount)
-                await execute_query(
-                    f"UPDATE user_resources SET {resource_type} = ? WHERE user_id = ?",
-                    (new_amount, user_id)
-                )
-        return True
-    except Exception as e:
-        logging.error(f"خطأ في خصم الموارد من المستخدم {user_id}: {e}")
-        return False
+    """خصم موارد من المستخدم (لا يُخصم شيء إذا نقص أي مورد)"""
+    return await apply_resources(user_id, {
+        resource_type: -amount for resource_type, amount in resources.items()
+    })
 
 
 async def get_last_treasure_hunt(user_id: int) -> str:
@@ -283,53 +240,7 @@ async def update_last_treasure_hunt(user_id: int) -> bool:
 async def perform_treasure_hunt(user_id: int) -> dict:
     """تنفيذ البحث عن الكنز المحسن"""
     try:
-        # حساب إجمالي الاحتمالات
-        total_chance = sum(hunt_type['chance'] for hunt_type in TREASURE_HUNT_TYPES.values())
-        random_num = random.randint(1, total_chance)
-        
-        cumulative_chance = 0
-        for hunt_type, hunt_info in TREASURE_HUNT_TYPES.items():
-            cumulative_chance += hunt_info['chance']
-            if random_num <= cumulative_chance:
-                if hunt_type == 'nothing':
-                    return {"found": False, "resources": {}, "hunt_type": "nothing"}
-                elif hunt_type == 'single_resource':
-                    # اختيار مورد واحد
-                    resource_chance = sum(res['chance'] for res in hunt_info['resources'].values())
-                    resource_random = random.randint(1, resource_chance)
-                    
-                    resource_cumulative = 0
-                    for resource_type, resource_info in hunt_info['resources'].items():
-                        resource_cumulative += resource_info['chance']
-                        if resource_random <= resource_cumulative:
-                            amount = random.randint(resource_info['min'], resource_info['max'])
-                            return {
-                                "found": True, 
-                                "resources": {resource_type: amount}, 
-                                "hunt_type": "single"
-                            }
-                else:
-                    # اختيار تركيبة عشوائية للموارد المتعددة
-                    combinations = hunt_info['combinations']
-                    selected_combo = random.choice(combinations)
-                    resources_found = {}
-                    
-                    for resource_type in selected_combo['resources']:
-                        base_info = RESOURCE_INFO[resource_type]
-                        multiplier = selected_combo['multiplier']
-                        
-                        min_amount = int(base_info['min'] * multiplier)
-                        max_amount = int(base_info['max'] * multiplier)
-                        amount = random.randint(min_amount, max_amount)
-                        resources_found[resource_type] = amount
-                    
-                    return {
-                        "found": True,
-                        "resources": resources_found,
-                        "hunt_type": hunt_type.replace('_resource', '')
-                    }
-        
-        return {"found": False, "resources": {}, "hunt_type": "nothing"}
+        return TREASURE_LOOT_TABLE.roll()
     except Exception as e:
         logging.error(f"خطأ في البحث عن الكنز للمستخدم {user_id}: {e}")
         return {"found": False, "resources": {}, "hunt_type": "error"}
@@ -495,7 +406,17 @@ async def show_castle_menu(message: Message):
 • احصائيات القلعة - لعرض تفاصيل القلعة
         """
         
-        await message.reply(castle_text)
+        # قائمة القلاع وسجل المعارك تُفتح من الأزرار دون أوامر نصية جديدة
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text="📋 قائمة القلاع", callback_data=pack_callback("castles", "next", 1, "")),
+            InlineKeyboardButton(
+                text="⚔️ سجل المعارك",
+                callback_data=pack_callback(
+                    "battles", message.from_user.id, "next", 1, "", version=BATTLES_CALLBACK_VERSION
+                )
+            )
+        ]])
+        await message.reply(castle_text, reply_markup=keyboard)
         
     except Exception as e:
         logging.error(f"خطأ في قائمة القلعة: {e}")
@@ -542,11 +463,13 @@ async def treasure_hunt_command(message: Message):
             hunt_type = treasure_result["hunt_type"]
             
             # إضافة الموارد للمستخدم
+            if not await apply_resources(message.from_user.id, resources_found):
+                await message.reply("❌ حدث خطأ في حفظ الكنز، حاول مرة أخرى")
+                return
             total_value = 0
             resource_text = ""
             
             for resource_type, amount in resources_found.items():
-                await add_resource_to_user(message.from_user.id, resource_type, amount)
                 emoji = RESOURCE_INFO[resource_type]["emoji"]
                 name = REQUIRED_RESOURCES.get(resource_type, RESOURCE_INFO[resource_type]["name"])
                 resource_text += f"{emoji} **{name}**: {format_number(amount)}\n"
@@ -654,15 +577,19 @@ async def upgrade_castle_command(message: Message):
             )
             return
         
-        # تنفيذ التطوير
-        await upgrade_castle_level(message.from_user.id, next_level)
-        new_balance = user_money - required_cost
-        await update_user_balance(message.from_user.id, new_balance)
-        await subtract_resources_from_user(message.from_user.id, {
-            'gold': required_gold,
-            'stones': required_stones,
-            'workers': required_workers
-        })
+        # تنفيذ التطوير: خصم المال والموارد ورفع المستوى في معاملة واحدة
+        upgraded = await apply_resources(
+            message.from_user.id,
+            {'gold': -required_gold, 'stones': -required_stones, 'workers': -required_workers},
+            cash=-required_cost,
+            guarded=[(
+                "UPDATE user_castles SET level = ? WHERE user_id = ? AND level = ?",
+                (next_level, message.from_user.id, current_level)
+            )]
+        )
+        if not upgraded:
+            await message.reply("❌ تغيرت مواردك أو مستوى قلعتك أثناء التطوير، حاول مرة أخرى")
+            return
         
         await message.reply(
             f"🎉 **تم تطوير القلعة بنجاح!**\n\n"
@@ -805,11 +732,14 @@ async def handle_castle_name_input(message: Message, state: FSMContext):
 
 # ===== نظام الحروب والهجمات =====
 
+CASTLE_BY_ID_QUERY = "SELECT * FROM user_castles WHERE castle_id = ?"
+
+
 async def get_castle_by_id(castle_id: str):
     """الحصول على قلعة بالمعرف"""
     try:
         return await execute_query(
-            "SELECT * FROM user_castles WHERE castle_id = ?",
+            CASTLE_BY_ID_QUERY,
             (castle_id,),
             fetch_one=True
         )
@@ -1155,16 +1085,17 @@ async def purchase_item_command(message: Message):
             )
             return
         
-        # تنفيذ الشراء
-        new_balance = user['balance'] - total_cost
-        await update_user_balance(message.from_user.id, new_balance)
-        await add_resource_to_user(message.from_user.id, item_key, quantity)
-        
-        # تسجيل المعاملة
-        await add_transaction(
-            message.from_user.id, "castle_shop_purchase", total_cost,
-            f"شراء {quantity} {item_info['name']} من متجر القلعة"
+        # تنفيذ الشراء وتسجيل المعاملة في معاملة واحدة
+        purchased = await apply_resources(
+            message.from_user.id, {item_key: quantity}, cash=-total_cost,
+            transaction=(
+                "castle_shop_purchase", total_cost,
+                f"شراء {quantity} {item_info['name']} من متجر القلعة"
+            )
         )
+        if not purchased:
+            await message.reply("❌ الرصيد غير كافي لإتمام الشراء")
+            return
         
         await message.reply(
             f"✅ **تم الشراء بنجاح!**\\n\\n"
@@ -1333,6 +1264,8 @@ async def confirm_delete_castle_command(message: Message):
             "DELETE FROM user_resources WHERE user_id = ?",
             (message.from_user.id,)
         )
+        # لا تُعرض الموارد المحذوفة من الذاكرة المؤقتة لقلعة جديدة
+        invalidate_resources(message.from_user.id)
         
         await message.reply(
             f"✅ **تم حذف القلعة بنجاح!**\\n\\n"
@@ -1428,6 +1361,78 @@ async def show_castle_command(message: Message):
         logging.error(f"خطأ في إظهار القلعة: {e}")
         await message.reply("❌ حدث خطأ في إظهار القلعة")
 
+CASTLES_PAGE_SIZE = 10
+
+
+def _keyset_page(rows: list, page_size: int, direction: str, has_cursor: bool):
+    """قص صفحة مفتاحية وإرجاع (الصفوف، يوجد سابق، يوجد تالي)"""
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == "prev":
+        rows.reverse()
+        return rows, has_more, True
+    return rows, has_cursor, has_more
+
+
+def castles_page_query(direction: str, has_cursor: bool) -> str:
+    """استعلام صفحة القلاع الظاهرة لاتجاه الترقيم (بعد المؤشر أو قبله)"""
+    if direction == "prev":
+        keyset, order = "AND (uc.level, uc.wins, uc.id) > (?, ?, ?)", "uc.level, uc.wins, uc.id"
+    else:
+        keyset, order = "AND (uc.level, uc.wins, uc.id) < (?, ?, ?)", "uc.level DESC, uc.wins DESC, uc.id DESC"
+
+    return f"""
+        SELECT uc.*, u.first_name, u.username 
+        FROM user_castles uc 
+        JOIN users u ON uc.user_id = u.user_id 
+        WHERE uc.is_hidden = 0 AND uc.user_id != ? {keyset if has_cursor else ''}
+        ORDER BY {order}
+        LIMIT ?
+        """
+
+
+async def build_castles_page(viewer_id: int, page: int = 1, cursor: tuple = None, direction: str = "next"):
+    """بناء صفحة من القلاع الظاهرة بترقيم مفتاحي (المستوى، الانتصارات، المعرف)"""
+    from utils.keyboards import get_pagination_keyboard
+
+    # الحصول على القلاع الظاهرة (غير المخفية) باستثناء قلعة المستخدم
+    castles = await execute_query(
+        castles_page_query(direction, cursor is not None),
+        (viewer_id, *(cursor or ()), CASTLES_PAGE_SIZE + 1),
+        fetch_all=True
+    )
+    castles, has_prev, has_next = _keyset_page(castles or [], CASTLES_PAGE_SIZE, direction, cursor is not None)
+    if not castles:
+        return None, None
+    
+    castles_text = "🏰 **القلاع المتاحة للهجوم:**\n\n"
+    
+    for castle in castles:
+        owner_name = castle['first_name'] or castle['username'] or 'مجهول'
+        castle_status = "🔒 محمية" if castle['level'] >= 5 else "🆓 متاحة"
+        
+        castles_text += f"⚔️ **{castle['name']}**\n"
+        castles_text += f"👤 المالك: {owner_name}\n"
+        castles_text += f"🆔 المعرف: `{castle['castle_id']}`\n"
+        castles_text += f"👑 المستوى: {castle['level']}/10\n"
+        castles_text += f"🏆 انتصارات: {castle.get('wins', 0)}\n"
+        castles_text += f"💔 هزائم: {castle.get('losses', 0)}\n"
+        castles_text += f"📊 الحالة: {castle_status}\n\n"
+    
+    castles_text += f"💡 **للهجوم:** اكتب **هجوم [معرف القلعة]**\n"
+    castles_text += f"📋 مثال: هجوم ABC12345"
+
+    first, last = castles[0], castles[-1]
+    keyboard = None
+    if has_prev or has_next:
+        keyboard = get_pagination_keyboard(
+            page, None, "castles",
+            prev_cursor=f"{first['level']}_{first['wins']}_{first['id']}" if has_prev else None,
+            next_cursor=f"{last['level']}_{last['wins']}_{last['id']}" if has_next else None
+        )
+    return castles_text, keyboard
+
+
 async def list_available_castles(message: Message):
     """عرض قائمة القلاع المتاحة للهجوم"""
     try:
@@ -1442,21 +1447,8 @@ async def list_available_castles(message: Message):
             await message.reply("❌ تحتاج إلى قلعة لرؤية القلاع الأخرى! اكتب: **انشاء قلعة**")
             return
         
-        # الحصول على القلاع الظاهرة (غير المخفية) باستثناء قلعة المستخدم
-        castles = await execute_query(
-            """
-            SELECT uc.*, u.first_name, u.username 
-            FROM user_castles uc 
-            JOIN users u ON uc.user_id = u.user_id 
-            WHERE uc.user_id != ? AND (uc.is_hidden IS NULL OR uc.is_hidden = 0)
-            ORDER BY uc.level DESC, uc.wins DESC
-            LIMIT 20
-            """,
-            (message.from_user.id,),
-            fetch_all=True
-        )
-        
-        if not castles:
+        castles_text, keyboard = await build_castles_page(message.from_user.id)
+        if not castles_text:
             await message.reply(
                 "🏰 **لا توجد قلاع متاحة للهجوم!**\n\n"
                 "📋 جميع القلاع إما مخفية أو لا توجد قلاع أخرى\n"
@@ -1464,24 +1456,7 @@ async def list_available_castles(message: Message):
             )
             return
         
-        castles_text = "🏰 **القلاع المتاحة للهجوم:**\n\n"
-        
-        for castle in castles:
-            owner_name = castle['first_name'] or castle['username'] or 'مجهول'
-            castle_status = "🔒 محمية" if castle['level'] >= 5 else "🆓 متاحة"
-            
-            castles_text += f"⚔️ **{castle['name']}**\n"
-            castles_text += f"👤 المالك: {owner_name}\n"
-            castles_text += f"🆔 المعرف: `{castle['castle_id']}`\n"
-            castles_text += f"👑 المستوى: {castle['level']}/10\n"
-            castles_text += f"🏆 انتصارات: {castle.get('wins', 0)}\n"
-            castles_text += f"💔 هزائم: {castle.get('losses', 0)}\n"
-            castles_text += f"📊 الحالة: {castle_status}\n\n"
-        
-        castles_text += f"💡 **للهجوم:** اكتب **هجوم [معرف القلعة]**\n"
-        castles_text += f"📋 مثال: هجوم ABC12345"
-        
-        await message.reply(castles_text)
+        await message.reply(castles_text, reply_markup=keyboard)
         
     except Exception as e:
         logging.error(f"خطأ في عرض قائمة القلاع: {e}")
@@ -1492,17 +1467,13 @@ async def list_available_castles(message: Message):
 async def attack_castle_command(message: Message):
     """أمر مهاجمة القلعة مع تحسينات"""
     try:
+        from modules.castle_battle import battle_engine, resolve_battle
+
         user = await get_user(message.from_user.id)
         if not user:
             await message.reply("❌ يرجى التسجيل أولاً باستخدام 'انشاء حساب بنكي'")
             return
         
-        # التحقق من وجود قلعة للمستخدم
-        attacker_castle = await get_user_castle(message.from_user.id)
-        if not attacker_castle:
-            await message.reply("❌ تحتاج إلى قلعة لمهاجمة الآخرين! اكتب: **انشاء قلعة**")
-            return
-        
         # استخراج معرف القلعة المستهدفة
         text = message.text.strip()
         parts = text.split()
@@ -1518,188 +1489,202 @@ async def attack_castle_command(message: Message):
         
         target_castle_id = parts[1].upper()
         
-        # البحث عن القلعة المستهدفة
-        target_castle = await execute_query(
-            "SELECT * FROM user_castles WHERE castle_id = ? AND user_id != ?",
-            (target_castle_id, message.from_user.id),
-            fetch_one=True
-        )
-        
-        if not target_castle:
-            await message.reply(
-                f"❌ **قلعة غير موجودة!**\n\n"
-                f"🔍 معرف القلعة `{target_castle_id}` غير صحيح أو غير متاح\n"
-                f"📋 لرؤية القلاع المتاحة اكتب: **قائمة القلاع**"
-            )
-            return
-        
-        # التحقق من أن القلعة غير مخفية
-        if target_castle.get('is_hidden', 0) == 1:
+        # فحص فترة الانتظار وحجزها قبل أول انتظار حتى لا يمر هجومان متزامنان للمستخدم نفسه
+        remaining = battle_engine.try_reserve(message.from_user.id)
+        if remaining:
+            remaining_time = int(remaining.total_seconds() // 60) + 1
             await message.reply(
-                f"🔒 **القلعة محمية!**\n\n"
-                f"🏰 هذه القلعة مخفية ولا يمكن مهاجمتها\n"
-                f"🔍 جرب قلعة أخرى من **قائمة القلاع**"
+                f"⏰ **فترة انتظار!**\n\n"
+                f"🛡️ يجب انتظار {remaining_time} دقيقة قبل الهجوم مرة أخرى\n"
+                f"💡 استخدم هذا الوقت في **بحث عن كنز** أو **طور القلعة**"
             )
             return
         
-        # التحقق من وقت آخر هجوم (منع الهجوم المتكرر)
-        last_attack = await execute_query(
-            """
-            SELECT created_at FROM castle_battles 
-            WHERE attacker_user_id = ? 
-            ORDER BY created_at DESC LIMIT 1
-            """,
-            (message.from_user.id,),
-            fetch_one=True
-        )
-        
-        if last_attack:
-            from datetime import datetime, timedelta
-            last_attack_time = datetime.fromisoformat(last_attack['created_at'])
-            now = datetime.now()
-            cooldown_minutes = 30  # فترة انتظار 30 دقيقة
+        outcome = None
+        try:
+            # تحميل القلعتين وموارد الطرفين في استعلام واحد
+            sides = await battle_engine.load_sides(message.from_user.id, target_castle_id)
+            if not sides:
+                await message.reply("❌ تحتاج إلى قلعة لمهاجمة الآخرين! اكتب: **انشاء قلعة**")
+                return
             
-            if now - last_attack_time < timedelta(minutes=cooldown_minutes):
-                remaining_time = cooldown_minutes - int((now - last_attack_time).total_seconds() / 60)
+            if sides['d_user_id'] is None:
                 await message.reply(
-                    f"⏰ **فترة انتظار!**\n\n"
-                    f"🛡️ يجب انتظار {remaining_time} دقيقة قبل الهجوم مرة أخرى\n"
-                    f"💡 استخدم هذا الوقت في **بحث عن كنز** أو **طور القلعة**"
+                    f"❌ **قلعة غير موجودة!**\n\n"
+                    f"🔍 معرف القلعة `{target_castle_id}` غير صحيح أو غير متاح\n"
+                    f"📋 لرؤية القلاع المتاحة اكتب: **قائمة القلاع**"
                 )
                 return
-        
-        # حساب قوة الهجوم والدفاع
-        attacker_resources = await get_user_resources(message.from_user.id)
-        defender_resources = await get_user_resources(target_castle['user_id'])
-        
-        # قوة المهاجم (مستوى القلعة + الموارد + العشوائية)
-        attacker_power = (
-            attacker_castle['level'] * 100 +
-            attacker_resources.get('gold', 0) * 10 +
-            attacker_resources.get('workers', 0) * 5 +
-            random.randint(50, 150)
-        )
-        
-        # قوة المدافع (مستوى القلعة + الموارد + مكافأة الدفاع + العشوائية)
-        defender_power = (
-            target_castle['level'] * 120 +  # مكافأة دفاع إضافية
-            defender_resources.get('gold', 0) * 10 +
-            defender_resources.get('workers', 0) * 5 +
-            random.randint(75, 175)
-        )
-        
-        # تحديد النتيجة
-        attacker_wins = attacker_power > defender_power
-        
-        # حساب الغنائم
-        if attacker_wins:
-            # المهاجم ينتصر ويسرق جزء من الذهب
-            defender_gold = defender_resources.get('gold', 0)
-            max_steal = min(defender_gold // 2, 100)  # حد أقصى 100 ذهب أو نصف الذهب
-            gold_stolen = random.randint(max_steal // 2, max_steal) if max_steal > 0 else 0
             
-            if gold_stolen > 0:
-                # خصم الذهب من المدافع
-                await execute_query(
-                    "UPDATE user_resources SET gold = CASE WHEN gold >= ? THEN gold - ? ELSE 0 END WHERE user_id = ?",
-                    (gold_stolen, gold_stolen, target_castle['user_id'])
+            # التحقق من أن القلعة غير مخفية
+            if sides['d_is_hidden'] == 1:
+                await message.reply(
+                    f"🔒 **القلعة محمية!**\n\n"
+                    f"🏰 هذه القلعة مخفية ولا يمكن مهاجمتها\n"
+                    f"🔍 جرب قلعة أخرى من **قائمة القلاع**"
                 )
-                
-                # إضافة الذهب للمهاجم
-                await add_resource_to_user(message.from_user.id, 'gold', gold_stolen)
+                return
             
-            # تحديث إحصائيات الانتصارات والهزائم
-            await execute_query(
-                "UPDATE user_castles SET wins = wins + 1, total_battles = total_battles + 1 WHERE user_id = ?",
-                (message.from_user.id,)
+            # حساب النتيجة ثم تطبيقها ذرياً
+            outcome = resolve_battle(
+                {'level': sides['a_level'], 'gold': sides['a_gold'], 'workers': sides['a_workers']},
+                {'level': sides['d_level'], 'gold': sides['d_gold'], 'workers': sides['d_workers']}
             )
-            await execute_query(
-                "UPDATE user_castles SET losses = losses + 1, total_battles = total_battles + 1 WHERE user_id = ?",
-                (target_castle['user_id'],)
+            outcome = await battle_engine.apply(
+                message.from_user.id, sides['d_user_id'],
+                sides['a_castle_id'], sides['d_castle_id'], outcome
             )
-            
+        finally:
+            # هجوم لم يُسجل (رفض أو خطأ) لا يستهلك فترة الانتظار
+            if outcome is None:
+                battle_engine.release(message.from_user.id)
+        
+        if outcome is None:
+            await message.reply("❌ حدث خطأ أثناء الهجوم")
+            return
+        
+        attacker_wins = outcome.attacker_wins
+        gold_stolen = outcome.gold_stolen
+        if attacker_wins:
             result_emoji = "🏆"
             result_text = "انتصار ساحق!"
         else:
-            # المدافع ينتصر
-            gold_stolen = 0
-            await execute_query(
-                "UPDATE user_castles SET losses = losses + 1, total_battles = total_battles + 1 WHERE user_id = ?",
-                (message.from_user.id,)
-            )
-            await execute_query(
-                "UPDATE user_castles SET wins = wins + 1, total_battles = total_battles + 1 WHERE user_id = ?",
-                (target_castle['user_id'],)
-            )
-            
             result_emoji = "💔"
             result_text = "هزيمة مؤلمة!"
         
-        # تسجيل المعركة
-        from datetime import datetime
-        await execute_query(
-            """
-            INSERT INTO castle_battles 
-            (attacker_user_id, defender_user_id, attacker_castle_id, defender_castle_id, 
-             winner, attacker_power, defender_power, gold_stolen, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                message.from_user.id, target_castle['user_id'],
-                attacker_castle['castle_id'], target_castle['castle_id'],
-                'attacker' if attacker_wins else 'defender',
-                attacker_power, defender_power, gold_stolen,
-                datetime.now().isoformat()
-            )
-        )
-        
-        # الحصول على اسم المدافع
-        defender = await get_user(target_castle['user_id'])
-        defender_name = defender['first_name'] or defender['username'] or 'مجهول'
+        defender_name = sides['d_first_name'] or sides['d_username'] or 'مجهول'
         
         # تقرير المعركة
         battle_report = f"""⚔️ **تقرير المعركة** ⚔️
 
 {result_emoji} **النتيجة: {result_text}**
 
-🏰 **المهاجم:** {attacker_castle['name']} (أنت)
-🛡️ **المدافع:** {target_castle['name']} ({defender_name})
+🏰 **المهاجم:** {sides['a_name']} (أنت)
+🛡️ **المدافع:** {sides['d_name']} ({defender_name})
 
 📊 **قوة القتال:**
-• قوتك: {format_number(attacker_power)}
-• قوة العدو: {format_number(defender_power)}
+• قوتك: {format_number(outcome.attacker_power)}
+• قوة العدو: {format_number(outcome.defender_power)}
 
 💰 **الغنائم:** {format_number(gold_stolen)} ذهب
 
 📈 **إحصائيات محدثة:**
-• انتصاراتك: {attacker_castle.get('wins', 0) + (1 if attacker_wins else 0)}
-• هزائمك: {attacker_castle.get('losses', 0) + (0 if attacker_wins else 1)}
+• انتصاراتك: {(sides['a_wins'] or 0) + (1 if attacker_wins else 0)}
+• هزائمك: {(sides['a_losses'] or 0) + (0 if attacker_wins else 1)}
 
 💡 **نصيحة:** {'جمع المزيد من الموارد يزيد قوتك!' if not attacker_wins else 'استمر في التطوير!'}
         """
         
         await message.reply(battle_report)
         
-        # إشعار المدافع (اختياري)
-        try:
-            if attacker_wins and gold_stolen > 0:
-                defender_notification = f"""🚨 **تم مهاجمة قلعتك!** 🚨
-
-⚔️ المهاجم: {user['first_name'] or user['username'] or 'مجهول'}
-🏰 قلعة: {attacker_castle['name']}
-💔 النتيجة: هزيمة لقلعتك
-💰 تم سرقة: {format_number(gold_stolen)} ذهب
-
-🛡️ طور قلعتك وادافع عنها بشكل أفضل!
-                """
-                # إرسال إشعار للمدافع (يحتاج معالج خاص)
-        except:
-            pass
-        
     except Exception as e:
         logging.error(f"خطأ في هجوم القلعة: {e}")
         await message.reply("❌ حدث خطأ أثناء الهجوم")
 
+BATTLES_PAGE_SIZE = 10
+# الإصدار 2: معرف صاحب السجل في بداية الحمولة
+BATTLES_CALLBACK_VERSION = 2
+
+
+def battles_page_query(direction: str, has_cursor: bool) -> str:
+    """استعلام صفحة سجل المعارك لاتجاه الترقيم: كل طرف يقرأ نطاقاً من فهرسه ثم يُدمج الطرفان"""
+    if direction == "prev":
+        keyset, order = "AND (created_at, id) > (?, ?)", "created_at, id"
+        page_order = "cb.created_at, cb.id"
+    else:
+        keyset, order = "AND (created_at, id) < (?, ?)", "created_at DESC, id DESC"
+        page_order = "cb.created_at DESC, cb.id DESC"
+    keyset = keyset if has_cursor else ""
+
+    return f"""
+        SELECT cb.*, 
+               uc1.name as attacker_castle_name,
+               uc2.name as defender_castle_name,
+               u1.first_name as attacker_name,
+               u2.first_name as defender_name
+        FROM (
+            SELECT * FROM (
+                SELECT id FROM castle_battles WHERE attacker_user_id = ? {keyset}
+                ORDER BY {order} LIMIT ?
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT id FROM castle_battles WHERE defender_user_id = ? {keyset}
+                ORDER BY {order} LIMIT ?
+            )
+        ) page
+        JOIN castle_battles cb ON cb.id = page.id
+        LEFT JOIN user_castles uc1 ON cb.attacker_castle_id = uc1.castle_id
+        LEFT JOIN user_castles uc2 ON cb.defender_castle_id = uc2.castle_id
+        LEFT JOIN users u1 ON cb.attacker_user_id = u1.user_id
+        LEFT JOIN users u2 ON cb.defender_user_id = u2.user_id
+        ORDER BY {page_order}
+        LIMIT ?
+        """
+
+
+async def build_battles_page(user_id: int, castle: dict, page: int = 1, cursor: tuple = None,
+                             direction: str = "next"):
+    """بناء صفحة من سجل المعارك بترقيم مفتاحي (التاريخ، المعرف) عبر فهرسي المهاجم والمدافع"""
+    from utils.keyboards import get_pagination_keyboard
+
+    side_params = (user_id, *(cursor or ()), BATTLES_PAGE_SIZE + 1)
+
+    # كل طرف يقرأ نطاقاً من فهرسه ثم يُدمج الطرفان (لا يمكن مهاجمة قلعتك)
+    battles = await execute_query(
+        battles_page_query(direction, cursor is not None),
+        (*side_params, *side_params, BATTLES_PAGE_SIZE + 1),
+        fetch_all=True
+    )
+    battles, has_prev, has_next = _keyset_page(battles or [], BATTLES_PAGE_SIZE, direction, cursor is not None)
+    if not battles:
+        return None, None
+    
+    battles_text = f"⚔️ **سجل معارك قلعة {castle['name']}**\n\n"
+    
+    for battle in battles:
+        # تحديد دور المستخدم في المعركة
+        is_attacker = battle['attacker_user_id'] == user_id
+        won = (is_attacker and battle['winner'] == 'attacker') or (not is_attacker and battle['winner'] == 'defender')
+        
+        # تحديد الأيقونات والألوان
+        result_icon = "🏆" if won else "💔"
+        role = "مهاجم" if is_attacker else "مدافع"
+        
+        # اسم الخصم
+        opponent_name = battle['defender_name'] if is_attacker else battle['attacker_name']
+        opponent_castle = battle['defender_castle_name'] if is_attacker else battle['attacker_castle_name']
+        
+        # تاريخ المعركة
+        battle_date = battle['created_at'][:16].replace('T', ' ')
+        
+        battles_text += f"{result_icon} **{role}** ضد {opponent_name or 'مجهول'}\n"
+        battles_text += f"🏰 القلعة: {opponent_castle or 'غير معروفة'}\n"
+        battles_text += f"💰 الذهب المسروق: {format_number(battle['gold_stolen'])}\n"
+        battles_text += f"📅 التاريخ: {battle_date}\n\n"
+    
+    # إحصائيات إجمالية من عدادات القلعة (وليس من الصفحة المعروضة فقط)
+    wins = castle.get('wins') or 0
+    losses = castle.get('losses') or 0
+    total = wins + losses
+    
+    battles_text += f"📊 **الإحصائيات:**\n"
+    battles_text += f"🏆 انتصارات: {wins}\n"
+    battles_text += f"💔 هزائم: {losses}\n"
+    battles_text += f"📈 معدل الفوز: {(wins / total * 100) if total else 0:.1f}%"
+
+    first, last = battles[0], battles[-1]
+    keyboard = None
+    if has_prev or has_next:
+        keyboard = get_pagination_keyboard(
+            page, None, "battles",
+            prev_cursor=f"{first['created_at']}_{first['id']}" if has_prev else None,
+            next_cursor=f"{last['created_at']}_{last['id']}" if has_next else None,
+            owner_id=user_id, version=BATTLES_CALLBACK_VERSION
+        )
+    return battles_text, keyboard
+
+
 async def castle_battles_log_command(message: Message):
     """عرض سجل معارك القلعة"""
     try:
@@ -1713,28 +1698,8 @@ async def castle_battles_log_command(message: Message):
             await message.reply("❌ لا تملك قلعة لعرض سجل معاركها!")
             return
         
-        # الحصول على آخر 10 معارك للمستخدم
-        battles = await execute_query(
-            """
-            SELECT cb.*, 
-                   uc1.name as attacker_castle_name,
-                   uc2.name as defender_castle_name,
-                   u1.first_name as attacker_name,
-                   u2.first_name as defender_name
-            FROM castle_battles cb
-            LEFT JOIN user_castles uc1 ON cb.attacker_castle_id = uc1.castle_id
-            LEFT JOIN user_castles uc2 ON cb.defender_castle_id = uc2.castle_id
-            LEFT JOIN users u1 ON cb.attacker_user_id = u1.user_id
-            LEFT JOIN users u2 ON cb.defender_user_id = u2.user_id
-            WHERE cb.attacker_user_id = ? OR cb.defender_user_id = ?
-            ORDER BY cb.created_at DESC
-            LIMIT 10
-            """,
-            (message.from_user.id, message.from_user.id),
-            fetch_all=True
-        )
-        
-        if not battles:
+        battles_text, keyboard = await build_battles_page(message.from_user.id, castle)
+        if not battles_text:
             await message.reply(
                 f"⚔️ **سجل معارك قلعة {castle['name']}**\n\n"
                 f"📋 لا توجد معارك بعد!\n"
@@ -1742,42 +1707,50 @@ async def castle_battles_log_command(message: Message):
             )
             return
         
-        battles_text = f"⚔️ **سجل معارك قلعة {castle['name']}**\n\n"
-        
-        for battle in battles:
-            # تحديد دور المستخدم في المعركة
-            is_attacker = battle['attacker_user_id'] == message.from_user.id
-            won = (is_attacker and battle['winner'] == 'attacker') or (not is_attacker and battle['winner'] == 'defender')
-            
-            # تحديد الأيقونات والألوان
-            result_icon = "🏆" if won else "💔"
-            role = "مهاجم" if is_attacker else "مدافع"
-            
-            # اسم الخصم
-            opponent_name = battle['defender_name'] if is_attacker else battle['attacker_name']
-            opponent_castle = battle['defender_castle_name'] if is_attacker else battle['attacker_castle_name']
-            
-            # تاريخ المعركة
-            battle_date = battle['created_at'][:16].replace('T', ' ')
-            
-            battles_text += f"{result_icon} **{role}** ضد {opponent_name or 'مجهول'}\n"
-            battles_text += f"🏰 القلعة: {opponent_castle or 'غير معروفة'}\n"
-            battles_text += f"💰 الذهب المسروق: {format_number(battle['gold_stolen'])}\n"
-            battles_text += f"📅 التاريخ: {battle_date}\n\n"
-        
-        # إحصائيات إجمالية
-        wins = sum(1 for battle in battles if 
-                  (battle['attacker_user_id'] == message.from_user.id and battle['winner'] == 'attacker') or
-                  (battle['defender_user_id'] == message.from_user.id and battle['winner'] == 'defender'))
-        losses = len(battles) - wins
-        
-        battles_text += f"📊 **الإحصائيات:**\n"
-        battles_text += f"🏆 انتصارات: {wins}\n"
-        battles_text += f"💔 هزائم: {losses}\n"
-        battles_text += f"📈 معدل الفوز: {(wins/len(battles)*100):.1f}%"
-        
-        await message.reply(battles_text)
+        await message.reply(battles_text, reply_markup=keyboard)
         
     except Exception as e:
         logging.error(f"خطأ في عرض سجل المعارك: {e}")
         await message.reply("❌ حدث خطأ في عرض سجل المعارك")
+
+
+async def handle_castles_page_callback(callback: CallbackQuery, payload: str, state: FSMContext = None):
+    """التنقل بين صفحات قائمة القلاع"""
+    # {next|prev}:{page}:{level}_{wins}_{id} (مؤشر فارغ = الصفحة الأولى)
+    direction, page, cursor = payload.split(":", 2)
+    text, keyboard = await build_castles_page(
+        callback.from_user.id, int(page),
+        tuple(int(part) for part in cursor.split("_")) if cursor else None, direction
+    )
+    await _edit_castle_page(callback, text, keyboard)
+
+
+async def handle_battles_page_callback(callback: CallbackQuery, payload: str, state: FSMContext = None):
+    """التنقل بين صفحات سجل المعارك (لصاحب السجل فقط)"""
+    # {owner_id}:{next|prev}:{page}:{created_at}_{id} (مؤشر فارغ = الصفحة الأولى)
+    owner_id, direction, page, cursor = payload.split(":", 3)
+    if int(owner_id) != callback.from_user.id:
+        await callback.answer("❌ هذا السجل ليس لك! اكتب: سجل المعارك لعرض سجلك", show_alert=True)
+        return
+
+    castle = await get_user_castle(callback.from_user.id)
+    if not castle:
+        await callback.answer("❌ لا تملك قلعة لعرض سجل معاركها!", show_alert=True)
+        return
+
+    if cursor:
+        created_at, battle_id = cursor.rsplit("_", 1)
+        cursor = (created_at, int(battle_id))
+    text, keyboard = await build_battles_page(
+        callback.from_user.id, castle, int(page), cursor or None, direction
+    )
+    await _edit_castle_page(callback, text, keyboard)
+
+
+async def _edit_castle_page(callback: CallbackQuery, text: str, keyboard) -> None:
+    """استبدال الرسالة بالصفحة الجديدة بدل إرسال رسالة أخرى"""
+    if not text:
+        await callback.answer("📋 لا توجد نتائج أخرى")
+        return
+    await callback.message.edit_text(text, reply_markup=keyboard)
+    await callback.answer()
@@ -0,0 +1,208 @@
+"""
+محرك معارك القلاع - تحميل الطرفين باستعلام واحد وتطبيق النتيجة في معاملة واحدة
+Castle Battle Engine - single-query load, single-transaction resolution
+"""
+
+import logging
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from config.database import connect_database
+from config.settings import GAME_SETTINGS
+from database.operations import execute_query
+from modules.resource_ledger import invalidate_resources
+
+BATTLE_SETTINGS = GAME_SETTINGS["castle_battle"]
+ATTACK_COOLDOWN = timedelta(minutes=BATTLE_SETTINGS["cooldown_minutes"])
+
+# آخر هجوم لكل مهاجم خلال فترة الانتظار الحالية
+LAST_ATTACKS_QUERY = """
+    SELECT attacker_user_id, MAX(created_at) AS last_attack FROM castle_battles
+    WHERE created_at >= ?
+    GROUP BY attacker_user_id
+"""
+
+# قلعة المهاجم والقلعة المستهدفة وموارد الطرفين في صف واحد
+BATTLE_SIDES_QUERY = """
+    SELECT a.castle_id AS a_castle_id, a.name AS a_name, a.level AS a_level,
+           a.wins AS a_wins, a.losses AS a_losses,
+           ra.gold AS a_gold, ra.workers AS a_workers,
+           d.user_id AS d_user_id, d.castle_id AS d_castle_id, d.name AS d_name,
+           d.level AS d_level, d.is_hidden AS d_is_hidden,
+           rd.gold AS d_gold, rd.workers AS d_workers,
+           u.first_name AS d_first_name, u.username AS d_username
+    FROM user_castles a
+    LEFT JOIN user_resources ra ON ra.user_id = a.user_id
+    LEFT JOIN user_castles d ON d.castle_id = ? AND d.user_id != a.user_id
+    LEFT JOIN user_resources rd ON rd.user_id = d.user_id
+    LEFT JOIN users u ON u.user_id = d.user_id
+    WHERE a.user_id = ?
+    LIMIT 1
+"""
+
+
+@dataclass
+class BattleOutcome:
+    """نتيجة معركة محسوبة قبل تطبيقها"""
+    attacker_power: int
+    defender_power: int
+    attacker_wins: bool
+    gold_stolen: int
+
+
+def resolve_battle(attacker: Dict, defender: Dict, rng: random.Random = random) -> BattleOutcome:
+    """حساب نتيجة المعركة من لقطة الطرفين (دون أي وصول لقاعدة البيانات)"""
+    # قوة المهاجم (مستوى القلعة + الموارد + العشوائية)
+    attacker_power = int(
+        (attacker['level'] or 1) * 100 +
+        (attacker['gold'] or 0) * 10 +
+        (attacker['workers'] or 0) * 5 +
+        rng.randint(50, 150)
+    )
+
+    # قوة المدافع (مستوى القلعة + الموارد + مكافأة الدفاع + العشوائية)
+    defender_power = int(
+        (defender['level'] or 1) * 120 +
+        (defender['gold'] or 0) * 10 +
+        (defender['workers'] or 0) * 5 +
+        rng.randint(75, 175)
+    )
+
+    attacker_wins = attacker_power > defender_power
+    gold_stolen = 0
+    if attacker_wins:
+        # حد أقصى للغنيمة أو نصف ذهب المدافع
+        max_steal = min(int(defender['gold'] or 0) // 2, BATTLE_SETTINGS["max_loot"])
+        if max_steal > 0:
+            gold_stolen = rng.randint(max_steal // 2, max_steal)
+
+    return BattleOutcome(attacker_power, defender_power, attacker_wins, gold_stolen)
+
+
+class BattleEngine:
+    """محرك المعارك مع خريطة آخر هجوم في الذاكرة"""
+
+    def __init__(self):
+        self._last_attack: Dict[int, datetime] = {}
+        # وقت آخر هجوم قبل الحجز الجاري لكل مستخدم، لإعادته إذا لم تُسجل المعركة
+        self._reserved: Dict[int, Optional[datetime]] = {}
+
+    async def load(self) -> int:
+        """تحميل هجمات فترة الانتظار الحالية فقط عند بدء التشغيل"""
+        since = (datetime.now() - ATTACK_COOLDOWN).isoformat()
+        rows = await execute_query(
+            LAST_ATTACKS_QUERY,
+            (since,),
+            fetch_all=True
+        )
+        if rows is None:
+            logging.error("خطأ في تحميل أوقات الهجمات الأخيرة")
+            return 0
+
+        for row in rows:
+            self._last_attack[row['attacker_user_id']] = datetime.fromisoformat(row['last_attack'])
+        return len(rows)
+
+    def cooldown_remaining(self, user_id: int) -> Optional[timedelta]:
+        """الوقت المتبقي قبل أن يستطيع المستخدم الهجوم مجدداً (None إذا كان متاحاً)"""
+        last_attack = self._last_attack.get(user_id)
+        if last_attack is None:
+            return None
+        remaining = last_attack + ATTACK_COOLDOWN - datetime.now()
+        return remaining if remaining > timedelta(0) else None
+
+    def try_reserve(self, user_id: int) -> Optional[timedelta]:
+        """فحص فترة الانتظار وحجزها في خطوة واحدة دون أي انتظار (الوقت المتبقي إذا لم يُحجز)"""
+        remaining = self.cooldown_remaining(user_id)
+        if remaining is not None:
+            return remaining
+        self._reserved[user_id] = self._last_attack.get(user_id)
+        self._last_attack[user_id] = datetime.now()
+        return None
+
+    def release(self, user_id: int) -> None:
+        """إلغاء حجز فترة الانتظار لهجوم لم يُسجل"""
+        if user_id not in self._reserved:
+            return
+        previous = self._reserved.pop(user_id)
+        if previous is None:
+            self._last_attack.pop(user_id, None)
+        else:
+            self._last_attack[user_id] = previous
+
+    async def load_sides(self, attacker_id: int, target_castle_id: str) -> Optional[Dict]:
+        """تحميل قلعة المهاجم والقلعة المستهدفة وموارد الطرفين في استعلام واحد"""
+        return await execute_query(
+            BATTLE_SIDES_QUERY,
+            (target_castle_id, attacker_id),
+            fetch_one=True
+        )
+
+    async def apply(self, attacker_id: int, defender_id: int, attacker_castle_id: str,
+                    defender_castle_id: str, outcome: BattleOutcome) -> Optional[BattleOutcome]:
+        """تطبيق الغنيمة والانتصارات/الهزائم وسجل المعركة في معاملة واحدة (بعد try_reserve)"""
+        attacked_at = self._last_attack.get(attacker_id) or datetime.now()
+        try:
+            async with connect_database() as db:
+                gold_stolen = outcome.gold_stolen
+                if gold_stolen > 0:
+                    cursor = await db.execute(
+                        "UPDATE user_resources SET gold = gold - ? WHERE user_id = ? AND gold >= ?",
+                        (gold_stolen, defender_id, gold_stolen)
+                    )
+                    if cursor.rowcount == 0:
+                        # هجوم متزامن استنزف ذهب المدافع - انتصار بلا غنيمة
+                        gold_stolen = 0
+                    else:
+                        cursor = await db.execute(
+                            "UPDATE user_resources SET gold = gold + ? WHERE user_id = ?",
+                            (gold_stolen, attacker_id)
+                        )
+                        if cursor.rowcount == 0:
+                            await db.execute(
+                                "INSERT INTO user_resources (user_id, money, gold, stones, workers) VALUES (?, 0, ?, 0, 0)",
+                                (attacker_id, gold_stolen)
+                            )
+
+                winner_id = attacker_id if outcome.attacker_wins else defender_id
+                await db.execute(
+                    """
+                    UPDATE user_castles SET
+                        wins = wins + (user_id = ?),
+                        losses = losses + (user_id != ?),
+                        total_battles = total_battles + 1
+                    WHERE user_id IN (?, ?)
+                    """,
+                    (winner_id, winner_id, attacker_id, defender_id)
+                )
+                await db.execute(
+                    """
+                    INSERT INTO castle_battles
+                    (attacker_user_id, defender_user_id, attacker_castle_id, defender_castle_id,
+                     winner, attacker_power, defender_power, gold_stolen, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        attacker_id, defender_id, attacker_castle_id, defender_castle_id,
+                        'attacker' if outcome.attacker_wins else 'defender',
+                        outcome.attacker_power, outcome.defender_power, gold_stolen,
+                        attacked_at.isoformat()
+                    )
+                )
+                await db.commit()
+
+            # المعركة سُجلت فيبقى وقتها هو آخر هجوم
+            self._reserved.pop(attacker_id, None)
+            if gold_stolen:
+                invalidate_resources(attacker_id, defender_id)
+            outcome.gold_stolen = gold_stolen
+            return outcome
+
+        except Exception as e:
+            logging.error(f"خطأ في تطبيق نتيجة المعركة: {e}")
+            return None
+
+
+battle_engine = BattleEngine()
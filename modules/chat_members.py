@@ -0,0 +1,82 @@
+"""
+متتبع عضوية المجموعات - تجميع النشاط في الذاكرة وكتابته دفعة واحدة
+Per-Chat Membership Tracker with Batched Writes
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from config.database import connect_database
+from config.settings import CHAT_MEMBERS_SETTINGS
+
+
+class ChatMembershipTracker:
+    """تسجيل (مجموعة، مستخدم) لكل رسالة في الذاكرة ثم دمجها في chat_members بـ UPSERT واحد"""
+
+    def __init__(self):
+        # (chat_id, user_id) -> [first_seen, last_seen, msg_count]
+        self._pending: Dict[Tuple[int, int], List] = {}
+        self._flush_lock = asyncio.Lock()
+
+    def record(self, chat_id: int, user_id: int) -> None:
+        """تسجيل رسالة دون أي وصول لقاعدة البيانات"""
+        now = datetime.now().isoformat(timespec="seconds")
+        entry = self._pending.get((chat_id, user_id))
+        if entry is None:
+            self._pending[(chat_id, user_id)] = [now, now, 1]
+            if len(self._pending) >= CHAT_MEMBERS_SETTINGS["max_pending"]:
+                asyncio.create_task(self.flush())
+        else:
+            entry[1] = now
+            entry[2] += 1
+
+    async def flush(self) -> int:
+        """كتابة جميع الأزواج المعلقة في معاملة واحدة وإرجاع عددها"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            rows = [
+                (chat_id, user_id, first_seen, last_seen, count)
+                for (chat_id, user_id), (first_seen, last_seen, count) in pending.items()
+            ]
+            try:
+                async with connect_database() as db:
+                    await db.executemany("""
+                        INSERT INTO chat_members (chat_id, user_id, first_seen, last_seen, msg_count)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT(chat_id, user_id) DO UPDATE SET
+                            last_seen = MAX(last_seen, excluded.last_seen),
+                            msg_count = msg_count + excluded.msg_count
+                    """, rows)
+                    await db.commit()
+                return len(rows)
+            except Exception as e:
+                logging.error(f"خطأ في حفظ عضوية المجموعات: {e}")
+                # إعادة الأزواج غير المحفوظة لتُدمج في الدفعة التالية
+                for key, (first_seen, last_seen, count) in pending.items():
+                    entry = self._pending.get(key)
+                    if entry is None:
+                        self._pending[key] = [first_seen, last_seen, count]
+                    else:
+                        entry[0] = first_seen
+                        entry[2] += count
+                return 0
+
+    async def flush_scheduler(self):
+        """مهمة خلفية لكتابة النشاط المجمّع بشكل دوري"""
+        interval = CHAT_MEMBERS_SETTINGS["flush_interval"]
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"خطأ في مهمة حفظ عضوية المجموعات: {e}")
+
+
+chat_members = ChatMembershipTracker()
+
@@ -5,7 +5,9 @@ Clear and Cleanup Commands Module
 
 import logging
 from aiogram.types import Message
-from config.database import get_database_connection
+from config.database import connect_database
+from modules.group_settings_cache import group_settings_cache
+from modules.moderation_filter import moderation_filter
 from utils.decorators import admin_required
 
 
@@ -13,7 +15,7 @@ from utils.decorators import admin_required
 async def clear_banned(message: Message):
     """مسح قائمة المحظورين"""
     try:
-        async with get_database_connection() as db:
+        async with connect_database() as db:
             # مسح المحظورين من المجموعة
             result = await db.execute("""
                 DELETE FROM banned_users WHERE chat_id = ?
@@ -33,7 +35,7 @@ async def clear_banned(message: Message):
 async def clear_muted(message: Message):
     """مسح قائمة المكتومين"""
     try:
-        async with get_database_connection() as db:
+        async with connect_database() as db:
             # مسح المكتومين من المجموعة
             result = await db.execute("""
                 DELETE FROM muted_users WHERE chat_id = ?
@@ -53,14 +55,20 @@ async def clear_muted(message: Message):
 async def clear_ban_words(message: Message):
     """مسح قائمة الكلمات المحظورة"""
     try:
-        async with get_database_connection() as db:
+        async with connect_database() as db:
             # مسح الكلمات المحظورة من المجموعة
             result = await db.execute("""
                 DELETE FROM banned_words WHERE chat_id = ?
             """, (message.chat.id,))
-            
             count = result.rowcount
+            
+            result = await db.execute("""
+                DELETE FROM forbidden_words WHERE chat_id = ?
+            """, (message.chat.id,))
+            count += result.rowcount
+            
             await db.commit()
+            moderation_filter.clear_words(message.chat.id)
             
         await message.reply(f"✅ تم مسح {count} كلمة من قائمة المنع")
         
@@ -73,7 +81,7 @@ async def clear_ban_words(message: Message):
 async def clear_replies(message: Message):
     """مسح الردود المخصصة"""
     try:
-        async with get_database_connection() as db:
+        async with connect_database() as db:
             # مسح الردود المخصصة من المجموعة
             result = await db.execute("""
                 DELETE FROM custom_replies WHERE chat_id = ?
@@ -93,7 +101,7 @@ async def clear_replies(message: Message):
 async def clear_custom_commands(message: Message):
     """مسح الأوامر المضافة"""
     try:
-        async with get_database_connection() as db:
+        async with connect_database() as db:
             # مسح الأوامر المخصصة من المجموعة
             result = await db.execute("""
                 DELETE FROM custom_commands WHERE chat_id = ?
@@ -113,7 +121,7 @@ async def clear_custom_commands(message: Message):
 async def clear_id_template(message: Message):
     """مسح قالب الايدي"""
     try:
-        async with get_database_connection() as db:
+        async with connect_database() as db:
             # مسح قالب الايدي المخصص
             await db.execute("""
                 DELETE FROM group_settings 
@@ -121,6 +129,7 @@ async def clear_id_template(message: Message):
             """, (message.chat.id,))
             
             await db.commit()
+            group_settings_cache.invalidate(message.chat.id, "id_template")
             
         await message.reply("✅ تم مسح قالب الايدي، سيتم استخدام القالب الافتراضي")
         
@@ -133,7 +142,7 @@ async def clear_id_template(message: Message):
 async def clear_welcome(message: Message):
     """مسح رسالة الترحيب"""
     try:
-        async with get_database_connection() as db:
+        async with connect_database() as db:
             # مسح رسالة الترحيب المخصصة
             await db.execute("""
                 DELETE FROM group_settings 
@@ -141,6 +150,7 @@ async def clear_welcome(message: Message):
             """, (message.chat.id,))
             
             await db.commit()
+            group_settings_cache.invalidate(message.chat.id, "welcome_message")
             
         await message.reply("✅ تم مسح رسالة الترحيب المخصصة")
         
@@ -153,7 +163,7 @@ async def clear_welcome(message: Message):
 async def clear_link(message: Message):
     """مسح رابط المجموعة المحفوظ"""
     try:
-        async with get_database_connection() as db:
+        async with connect_database() as db:
             # مسح رابط المجموعة المحفوظ
             await db.execute("""
                 DELETE FROM group_settings 
@@ -161,6 +171,7 @@ async def clear_link(message: Message):
             """, (message.chat.id,))
             
             await db.commit()
+            group_settings_cache.invalidate(message.chat.id, "group_link")
             
         await message.reply("✅ تم مسح رابط المجموعة المحفوظ")
         
@@ -173,12 +184,13 @@ async def clear_link(message: Message):
 async def clear_all_data(message: Message):
     """مسح جميع بيانات المجموعة"""
     try:
-        async with get_database_connection() as db:
+        async with connect_database() as db:
             # مسح جميع البيانات المتعلقة بالمجموعة
             tables_to_clear = [
                 'banned_users',
                 'muted_users', 
                 'banned_words',
+                'forbidden_words',
                 'custom_replies',
                 'custom_commands',
                 'group_settings',
@@ -195,6 +207,8 @@ async def clear_all_data(message: Message):
                 total_cleared += result.rowcount
             
             await db.commit()
+            group_settings_cache.invalidate(message.chat.id)
+            moderation_filter.clear_words(message.chat.id)
             
         await message.reply(f"""
 🗑️ **تم مسح جميع البيانات!**
@@ -5,7 +5,7 @@ Custom Commands System
 
 import logging
 import random
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Union
 from aiogram import Bot
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
@@ -13,11 +13,27 @@ from aiogram.fsm.context import FSMContext
 from config.hierarchy import has_permission, AdminLevel
 from database.operations import execute_query
 from utils.states import CustomCommandsStates
+from utils.text_matcher import KeywordMatcher
+from utils.text_normalizer import NormalizedText, as_normalized, normalize_arabic, normalized_text
 
 
 # قاموس الأوامر المخصصة المحملة في الذاكرة
 CUSTOM_COMMANDS: Dict[int, Dict[str, List[str]]] = {}  # {group_id: {keyword: [responses]}}
 
+# فهرس مُجمّع لكلمات كل مجموعة - يُعاد بناؤه فقط عند تغير أوامر المجموعة
+_MATCHERS: Dict[int, KeywordMatcher] = {}
+
+
+def rebuild_matcher(chat_id: int) -> None:
+    """إعادة بناء فهرس مطابقة الكلمات لمجموعة واحدة"""
+    # الأوامر بلا ردود لا تُطابق حتى يُجرب الأمر التالي كما في البحث القديم
+    keywords = [keyword for keyword, responses in CUSTOM_COMMANDS.get(chat_id, {}).items() if responses]
+    if keywords:
+        # الكلمات تُطبّع مثل نص الرسائل حتى تتطابق "إنشاء" و"انشاء"
+        _MATCHERS[chat_id] = KeywordMatcher(keywords, normalize_arabic)
+    else:
+        _MATCHERS.pop(chat_id, None)
+
 
 async def load_custom_commands():
     """تحميل الأوامر المخصصة من قاعدة البيانات"""
@@ -42,6 +58,10 @@ async def load_custom_commands():
                 response_list = responses.split('|||') if responses else []
                 CUSTOM_COMMANDS[chat_id][keyword] = response_list
         
+        _MATCHERS.clear()
+        for chat_id in CUSTOM_COMMANDS:
+            rebuild_matcher(chat_id)
+        
         logging.info("تم تحميل الأوامر المخصصة من قاعدة البيانات بنجاح")
         
     except Exception as e:
@@ -64,6 +84,7 @@ async def save_custom_command(chat_id: int, keyword: str, responses: List[str],
             CUSTOM_COMMANDS[chat_id] = {}
         
         CUSTOM_COMMANDS[chat_id][keyword] = responses
+        rebuild_matcher(chat_id)
         
         logging.info(f"تم حفظ أمر مخصص: {keyword} في المجموعة {chat_id}")
         return True
@@ -84,6 +105,7 @@ async def delete_custom_command(chat_id: int, keyword: str) -> bool:
         # تحديث الذاكرة
         if chat_id in CUSTOM_COMMANDS and keyword in CUSTOM_COMMANDS[chat_id]:
             del CUSTOM_COMMANDS[chat_id][keyword]
+            rebuild_matcher(chat_id)
         
         logging.info(f"تم حذف أمر مخصص: {keyword} من المجموعة {chat_id}")
         return True
@@ -93,25 +115,21 @@ async def delete_custom_command(chat_id: int, keyword: str) -> bool:
         return False
 
 
-async def get_custom_response(chat_id: int, message_text: str) -> Optional[str]:
+async def get_custom_response(chat_id: int, message_text: Union[str, NormalizedText]) -> Optional[str]:
     """البحث عن رد مخصص للرسالة"""
     try:
-        if chat_id not in CUSTOM_COMMANDS:
+        matcher = _MATCHERS.get(chat_id)
+        if matcher is None:
             return None
         
-        message_lower = message_text.lower().strip()
-        
-        # البحث عن كلمة مفتاحية مطابقة
-        for keyword, responses in CUSTOM_COMMANDS[chat_id].items():
-            # فحص التطابق الدقيق أو الاحتواء
-            if (message_lower == keyword.lower() or 
-                keyword.lower() in message_lower or
-                any(word.strip() == keyword.lower() for word in message_lower.split())):
-                
-                if responses:
-                    return random.choice(responses)
+        # أول أمر مضاف موجود في النص (كالحلقة القديمة) في مرور واحد على النص
+        text = as_normalized(message_text)
+        keyword = matcher.match_normalized(text.normalized)
+        if keyword is None:
+            return None
         
-        return None
+        responses = CUSTOM_COMMANDS[chat_id].get(keyword)
+        return random.choice(responses) if responses else None
         
     except Exception as e:
         logging.error(f"خطأ في البحث عن رد مخصص: {e}")
@@ -125,10 +143,10 @@ async def handle_add_command(message: Message, state: FSMContext):
         if not message.from_user or message.chat.type == 'private':
             return False
         
-        text = message.text
+        text = normalized_text(message)
         
         # التحقق أولاً من أن الرسالة تحتوي على أمر الإضافة
-        if text.startswith('اضافة امر ') or text.startswith('إضافة أمر ') or text.strip() == 'اضافة امر' or text.strip() == 'إضافة أمر':
+        if text.starts_with_words('إضافة أمر'):
             # الآن نتحقق من الصلاحيات
             user_id = message.from_user.id
             chat_id = message.chat.id
@@ -146,10 +164,10 @@ async def handle_add_command(message: Message, state: FSMContext):
                 await message.reply(random.choice(sarcastic_responses))
                 return True  # تم التعامل مع الرسالة ولكن بخطأ صلاحيات
         
-        if text.startswith('اضافة امر ') or text.startswith('إضافة أمر '):
-            # استخراج الكلمة المفتاحية
-            parts = text.split(' ', 2)
-            if len(parts) < 3:
+        if text.starts_with_words('إضافة أمر') and not text.equals('إضافة أمر'):
+            # استخراج الكلمة المفتاحية من النص الأصلي بعد "اضافة امر"
+            parts = text.strip_prefix('إضافة أمر').split()
+            if not parts:
                 await message.reply(
                     "❌ **طريقة الاستخدام:**\n\n"
                     "`اضافة امر [الكلمة المفتاحية] [الرد]`\n\n"
@@ -158,8 +176,8 @@ async def handle_add_command(message: Message, state: FSMContext):
                 )
                 return True
             
-            keyword = parts[2].split()[0]  # أول كلمة بعد "اضافة امر"
-            response = ' '.join(parts[2].split()[1:])  # باقي النص
+            keyword = parts[0]  # أول كلمة بعد "اضافة امر"
+            response = ' '.join(parts[1:])  # باقي النص
             
             if not keyword or not response:
                 await message.reply(
@@ -182,7 +200,7 @@ async def handle_add_command(message: Message, state: FSMContext):
             
             return True
         
-        elif text.strip() == 'اضافة امر' or text.strip() == 'إضافة أمر':
+        elif text.equals('إضافة أمر'):
             # وضع المستخدم في حالة انتظار الكلمة المفتاحية
             await state.set_state(CustomCommandsStates.waiting_keyword)
             await message.reply(
@@ -207,10 +225,10 @@ async def handle_delete_command(message: Message):
         if not message.from_user or message.chat.type == 'private':
             return False
         
-        text = message.text
+        text = normalized_text(message)
         
         # التحقق من أن الرسالة تحتوي على أمر الحذف
-        if text.startswith('حذف امر ') or text.startswith('حذف أمر '):
+        if text.starts_with_words('حذف أمر'):
             # التحقق من الصلاحيات
             user_id = message.from_user.id
             chat_id = message.chat.id
@@ -221,8 +239,8 @@ async def handle_delete_command(message: Message):
                 return True  # تم التعامل مع الرسالة ولكن بخطأ صلاحيات
             
             # استخراج الكلمة المفتاحية
-            parts = text.split(' ', 2)
-            if len(parts) < 3:
+            keyword = text.strip_prefix('حذف أمر')
+            if not keyword:
                 await message.reply(
                     "❌ **طريقة الاستخدام:**\n\n"
                     "`حذف امر [الكلمة المفتاحية]`\n\n"
@@ -231,8 +249,6 @@ async def handle_delete_command(message: Message):
                 )
                 return True
             
-            keyword = parts[2].strip()
-            
             # التحقق من وجود الأمر
             if chat_id not in CUSTOM_COMMANDS or keyword not in CUSTOM_COMMANDS[chat_id]:
                 await message.reply(f"❌ لا يوجد أمر بالكلمة المفتاحية: `{keyword}`")
@@ -352,18 +368,18 @@ async def handle_custom_commands_message(message: Message) -> bool:
         if message.chat.type == 'private':
             return False
         
-        text = message.text
-        if not text:
+        if not message.text:
             return False
+        text = normalized_text(message)
         
         # فحص أوامر الإدارة أولاً
-        if text.startswith('اضافة امر') or text.startswith('إضافة أمر'):
+        if text.startswith('إضافة أمر'):
             return False  # سيتم معالجتها في handle_add_command
         
-        if text.startswith('حذف امر') or text.startswith('حذف أمر'):
+        if text.startswith('حذف أمر'):
             return False  # سيتم معالجتها في handle_delete_command
         
-        if text.strip() == 'الأوامر المخصصة' or text.strip() == 'الاوامر المخصصة':
+        if text.equals('الأوامر المخصصة'):
             return False  # سيتم معالجتها في handle_list_commands
         
         # البحث عن رد مخصص
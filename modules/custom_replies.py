@@ -8,9 +8,14 @@ from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 
 from database.operations import execute_query
+from utils.callback_router import pack_callback
 from utils.states import CustomReplyStates
+from utils.text_normalizer import normalized_text
 from config.hierarchy import MASTERS, is_group_owner, is_moderator
 
+# مسجل الوحدة يخضع لأخذ العينات لأنه يكتب مع كل رسالة
+logger = logging.getLogger(__name__)
+
 
 async def start_add_custom_reply(message: Message, state: FSMContext):
     """بدء عملية إضافة رد مخصص"""
@@ -97,9 +102,9 @@ async def handle_response_input(message: Message, state: FSMContext):
             await state.set_state(CustomReplyStates.waiting_for_scope)
             
             keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🏠 هذه المجموعة فقط", callback_data="scope_group")],
-                [InlineKeyboardButton(text="🌐 كامل البوت", callback_data="scope_global")],
-                [InlineKeyboardButton(text="❌ إلغاء", callback_data="scope_cancel")]
+                [InlineKeyboardButton(text="🏠 هذه المجموعة فقط", callback_data=pack_callback("scope", "group"))],
+                [InlineKeyboardButton(text="🌐 كامل البوت", callback_data=pack_callback("scope", "global"))],
+                [InlineKeyboardButton(text="❌ إلغاء", callback_data=pack_callback("scope", "cancel"))]
             ])
             
             await message.reply(
@@ -119,7 +124,7 @@ async def handle_response_input(message: Message, state: FSMContext):
         await message.reply("❌ حدث خطأ في معالجة الرد")
 
 
-async def handle_scope_callback(callback_query, state: FSMContext):
+async def handle_scope_callback(callback_query, payload: str, state: FSMContext):
     """معالجة اختيار نطاق التطبيق"""
     try:
         data = await state.get_data()
@@ -128,16 +133,16 @@ async def handle_scope_callback(callback_query, state: FSMContext):
         user_id = data.get('user_id')
         group_id = data.get('group_id')
         
-        if callback_query.data == "scope_cancel":
+        if payload == "cancel":
             await state.clear()
             await callback_query.message.edit_text("❌ تم إلغاء إضافة الرد المخصص")
             return
         
         # تحديد نطاق التطبيق
-        if callback_query.data == "scope_global":
+        if payload == "global":
             scope_group_id = None  # كامل البوت
             scope_text = "🌐 كامل البوت"
-        else:  # scope_group
+        else:  # group
             scope_group_id = group_id  # المجموعة الحالية فقط
             scope_text = "🏠 هذه المجموعة فقط"
         
@@ -207,17 +212,19 @@ async def check_for_custom_replies(message: Message):
         if not message.text or not message.chat:
             return False
         
-        text = message.text.lower().strip()
+        # الكلمات محفوظة كما كتبها المشرف فالبحث بالنص بأحرف صغيرة لا بالنص المطبّع
+        text = normalized_text(message).lower
         group_id = message.chat.id
         
-        logging.info(f"فحص رد مخصص للنص: '{text}' في المجموعة: {group_id}")
+        logger.debug("فحص رد مخصص للنص: '%s' في المجموعة: %s", text, group_id)
         
         # استيراد مباشر لتجنب مشاكل الاستيراد
         import aiosqlite
+        from config.database import connect_database
         
         # البحث في ردود المجموعة الحالية مباشرة
         try:
-            async with aiosqlite.connect("bot_database.db") as db:
+            async with connect_database() as db:
                 db.row_factory = aiosqlite.Row
                 
                 # البحث في ردود المجموعة الحالية
@@ -227,11 +234,11 @@ async def check_for_custom_replies(message: Message):
                 ) as cursor:
                     group_result = await cursor.fetchone()
                     
-                logging.info(f"نتيجة البحث في المجموعة: {group_result}")
+                logger.debug("نتيجة البحث في المجموعة: %s", group_result)
                 
                 if group_result:
                     await message.reply(group_result[0])
-                    logging.info(f"تم العثور على رد مخصص في المجموعة: {group_result[0]}")
+                    logger.info("تم العثور على رد مخصص في المجموعة %s: %s", group_id, text)
                     return True
                 
                 # البحث في الردود العامة (كامل البوت)
@@ -241,14 +248,14 @@ async def check_for_custom_replies(message: Message):
                 ) as cursor:
                     global_result = await cursor.fetchone()
                     
-                logging.info(f"نتيجة البحث العامة: {global_result}")
+                logger.debug("نتيجة البحث العامة: %s", global_result)
                 
                 if global_result:
                     await message.reply(global_result[0])
-                    logging.info(f"تم العثور على رد مخصص عام: {global_result[0]}")
+                    logger.info("تم العثور على رد مخصص عام: %s", text)
                     return True
                 
-                logging.info("لم يتم العثور على رد مخصص")
+                logger.debug("لم يتم العثور على رد مخصص")
                 return False
                 
         except Exception as db_error:
@@ -277,8 +284,8 @@ async def handle_show_custom_replies(message: Message):
             await message.reply("❌ هذا الأمر متاح للمشرفين ومالكي المجموعات والسادة فقط")
             return
 
-        import aiosqlite
-        async with aiosqlite.connect("bot_database.db") as db:
+        from config.database import connect_database
+        async with connect_database() as db:
             if user_id in MASTERS:
                 # السيد يرى جميع الردود
                 async with db.execute(
@@ -386,8 +393,8 @@ async def handle_delete_custom_reply(message: Message):
             return False
 
         # البحث عن الرد وحذفه
-        import aiosqlite
-        async with aiosqlite.connect("bot_database.db") as db:
+        from config.database import connect_database
+        async with connect_database() as db:
             if user_id in MASTERS:
                 # السيد يستطيع حذف أي رد
                 async with db.execute(
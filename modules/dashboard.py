@@ -5,6 +5,8 @@ Group Management Dashboard with Visual Analytics Module
 
 import logging
 import asyncio
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
@@ -16,6 +18,40 @@ from utils.decorators import admin_required, group_only
 from utils.helpers import format_number, format_user_mention
 from config.settings import ADMINS
 
+# تخزين مؤقت لاتجاهات النشاط لكل (مجموعة، عدد أيام)
+TRENDS_CACHE_TTL = 60  # بالثواني
+TRENDS_CACHE_MAX_ENTRIES = 1024
+# استعلامات الإحصائيات الساخنة (يفحص check_query_plans.py خططها)
+ACTIVE_MEMBERS_QUERY = "SELECT COUNT(*) FROM chat_members WHERE chat_id = ? AND last_seen > ?"
+NEW_MEMBERS_QUERY = "SELECT COUNT(*) FROM chat_members WHERE chat_id = ? AND first_seen > ?"
+MEMBERS_BALANCE_QUERY = "SELECT SUM(u.balance) FROM chat_members cm JOIN users u ON u.user_id = cm.user_id WHERE cm.chat_id = ?"
+# المستخدمون النشطون يومياً في هذه المجموعة (فهرس activity_logs(chat_id, date_only))
+DAILY_ACTIVE_USERS_QUERY = """
+    SELECT date_only, COUNT(DISTINCT user_id) FROM activity_logs
+    WHERE chat_id = ? AND date_only >= ?
+    GROUP BY date_only
+"""
+# المعاملات اليومية (نطاق على created_at بدلاً من date(created_at) ليستخدم الفهرس)
+DAILY_TRANSACTIONS_QUERY = """
+    SELECT substr(created_at, 1, 10) AS day, COUNT(*) FROM transactions
+    WHERE created_at >= ?
+    GROUP BY day
+"""
+
+_TRENDS_CACHE: "OrderedDict[Tuple[int, int], Tuple[float, Dict]]" = OrderedDict()
+
+
+def _store_expiring(cache: "OrderedDict", key, value, ttl: float, max_entries: int) -> None:
+    """تخزين قيمة بوقتها مع إسقاط المنتهية والأقدم - الترتيب هو ترتيب التخزين فالمنتهية دائماً في البداية"""
+    now = time.monotonic()
+    cache[key] = (now, value)
+    cache.move_to_end(key)
+    while cache:
+        oldest_key, (stored_at, _) = next(iter(cache.items()))
+        if now - stored_at < ttl and len(cache) <= max_entries:
+            break
+        del cache[oldest_key]
+
 
 class GroupAnalytics:
     """فئة تحليلات المجموعة"""
@@ -26,7 +62,7 @@ class GroupAnalytics:
         try:
             # إجمالي الأعضاء المسجلين
             total_members = await execute_query(
-                "SELECT COUNT(*) FROM users WHERE chat_id = ?",
+                "SELECT COUNT(*) FROM chat_members WHERE chat_id = ?",
                 (chat_id,),
                 fetch_one=True
             )
@@ -34,7 +70,7 @@ class GroupAnalytics:
             # الأعضاء النشطين (آخر 7 أيام)
             week_ago = (datetime.now() - timedelta(days=7)).isoformat()
             active_members = await execute_query(
-                "SELECT COUNT(*) FROM users WHERE chat_id = ? AND updated_at > ?",
+                ACTIVE_MEMBERS_QUERY,
                 (chat_id, week_ago),
                 fetch_one=True
             )
@@ -42,14 +78,17 @@ class GroupAnalytics:
             # الأعضاء الجدد (آخر 30 يوم)
             month_ago = (datetime.now() - timedelta(days=30)).isoformat()
             new_members = await execute_query(
-                "SELECT COUNT(*) FROM users WHERE chat_id = ? AND created_at > ?",
+                NEW_MEMBERS_QUERY,
                 (chat_id, month_ago),
                 fetch_one=True
             )
             
             # توزيع البنوك
             bank_distribution = await execute_query(
-                "SELECT bank, COUNT(*) as count FROM users WHERE chat_id = ? AND bank IS NOT NULL GROUP BY bank",
+                """SELECT u.bank_type, COUNT(*) as count
+                   FROM chat_members cm JOIN users u ON u.user_id = cm.user_id
+                   WHERE cm.chat_id = ? AND u.bank_type IS NOT NULL
+                   GROUP BY u.bank_type""",
                 (chat_id,),
                 fetch_all=True
             )
@@ -71,21 +110,21 @@ class GroupAnalytics:
         try:
             # إجمالي الأموال في النظام
             total_money = await execute_query(
-                "SELECT SUM(balance) FROM users WHERE chat_id = ?",
+                MEMBERS_BALANCE_QUERY,
                 (chat_id,),
                 fetch_one=True
             )
             
             # متوسط الرصيد
             avg_balance = await execute_query(
-                "SELECT AVG(balance) FROM users WHERE chat_id = ? AND balance > 0",
+                "SELECT AVG(u.balance) FROM chat_members cm JOIN users u ON u.user_id = cm.user_id WHERE cm.chat_id = ? AND u.balance > 0",
                 (chat_id,),
                 fetch_one=True
             )
             
             # أكبر رصيد
             max_balance = await execute_query(
-                "SELECT MAX(balance), username FROM users WHERE chat_id = ?",
+                "SELECT MAX(u.balance), u.username FROM chat_members cm JOIN users u ON u.user_id = cm.user_id WHERE cm.chat_id = ?",
                 (chat_id,),
                 fetch_one=True
             )
@@ -100,9 +139,10 @@ class GroupAnalytics:
             
             # أكثر البنوك استخداماً
             popular_banks = await execute_query(
-                """SELECT bank, COUNT(*) as users, SUM(balance) as total_balance 
-                   FROM users WHERE chat_id = ? AND bank IS NOT NULL 
-                   GROUP BY bank ORDER BY users DESC""",
+                """SELECT u.bank_type, COUNT(*) as users, SUM(u.balance) as total_balance
+                   FROM chat_members cm JOIN users u ON u.user_id = cm.user_id
+                   WHERE cm.chat_id = ? AND u.bank_type IS NOT NULL
+                   GROUP BY u.bank_type ORDER BY users DESC""",
                 (chat_id,),
                 fetch_all=True
             )
@@ -184,32 +224,41 @@ class GroupAnalytics:
 
     @staticmethod
     async def get_activity_trends(chat_id: int, days: int = 7) -> Dict:
-        """اتجاهات النشاط"""
+        """اتجاهات النشاط - استعلام GROUP BY واحد لكل مقياس مع تخزين مؤقت قصير"""
+        cache_key = (chat_id, days)
+        cached = _TRENDS_CACHE.get(cache_key)
+        if cached and time.monotonic() - cached[0] < TRENDS_CACHE_TTL:
+            return cached[1]
+
         try:
-            trends = {}
-            
-            for i in range(days):
-                date = (datetime.now() - timedelta(days=i)).date().isoformat()
-                
-                # نشاط يومي
-                daily_activity = await execute_query(
-                    "SELECT COUNT(*) FROM users WHERE chat_id = ? AND date(updated_at) = ?",
-                    (chat_id, date),
-                    fetch_one=True
-                )
-                
-                # معاملات يومية
-                daily_transactions = await execute_query(
-                    "SELECT COUNT(*) FROM transactions WHERE date(created_at) = ?",
-                    (date,),
-                    fetch_one=True
-                )
-                
-                trends[date] = {
-                    'active_users': daily_activity[0] if daily_activity else 0,
-                    'transactions': daily_transactions[0] if daily_transactions else 0
+            today = datetime.now().date()
+            dates = [(today - timedelta(days=i)).isoformat() for i in range(days)]
+            since = dates[-1]
+
+            daily_activity = await execute_query(
+                DAILY_ACTIVE_USERS_QUERY,
+                (chat_id, since),
+                fetch_all=True
+            )
+
+            daily_transactions = await execute_query(
+                DAILY_TRANSACTIONS_QUERY,
+                (since,),
+                fetch_all=True
+            )
+
+            active_by_day = {row[0]: row[1] for row in daily_activity or []}
+            transactions_by_day = {row[0]: row[1] for row in daily_transactions or []}
+
+            trends = {
+                date: {
+                    'active_users': active_by_day.get(date, 0),
+                    'transactions': transactions_by_day.get(date, 0)
                 }
-            
+                for date in dates
+            }
+
+            _store_expiring(_TRENDS_CACHE, cache_key, trends, TRENDS_CACHE_TTL, TRENDS_CACHE_MAX_ENTRIES)
             return trends
             
         except Exception as e:
@@ -217,6 +266,97 @@ class GroupAnalytics:
             return {}
 
 
+class DashboardReportBuilder:
+    """تجميع أقسام التقارير بالتوازي مع تخزين مؤقت قصير لكل (مجموعة، قسم)"""
+
+    SECTIONS = {
+        "members": GroupAnalytics.get_member_statistics,
+        "financial": GroupAnalytics.get_financial_statistics,
+        "moderation": GroupAnalytics.get_moderation_statistics,
+        "trends": GroupAnalytics.get_activity_trends,
+    }
+    CACHE_TTL = 30  # بالثواني
+    SLOW_SECTION_MS = 500
+    MAX_CACHE_ENTRIES = 1024  # (مجموعة، قسم)
+    MAX_TIMED_CHATS = 1024
+
+    def __init__(self):
+        self._cache: "OrderedDict[Tuple[int, str], Tuple[float, Dict]]" = OrderedDict()
+        self._inflight: Dict[Tuple[int, str], asyncio.Task] = {}
+        # المجموعة -> القسم -> (زمن آخر بناء بالملي ثانية، هل قُدم من الذاكرة المؤقتة)
+        self.timings: "OrderedDict[int, Dict[str, Tuple[float, bool]]]" = OrderedDict()
+
+    def _record_timing(self, chat_id: int, section: str, elapsed_ms: float, cached: bool) -> None:
+        """تسجيل زمن القسم للمجموعة مع الاحتفاظ بآخر المجموعات استخداماً فقط"""
+        chat_timings = self.timings.setdefault(chat_id, {})
+        chat_timings[section] = (elapsed_ms, cached)
+        self.timings.move_to_end(chat_id)
+        while len(self.timings) > self.MAX_TIMED_CHATS:
+            self.timings.popitem(last=False)
+
+    async def _build_section(self, chat_id: int, section: str) -> Dict:
+        """بناء قسم واحد وتسجيل زمن بنائه"""
+        started = time.perf_counter()
+        try:
+            return await self.SECTIONS[section](chat_id)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._record_timing(chat_id, section, elapsed_ms, cached=False)
+            if elapsed_ms >= self.SLOW_SECTION_MS:
+                logging.warning(f"قسم التقرير {section} للمجموعة {chat_id} استغرق {elapsed_ms:.0f}ms")
+
+    async def _get_section(self, chat_id: int, section: str) -> Dict:
+        """قسم من الذاكرة المؤقتة أو مشاركة بناء جارٍ أو بناء جديد"""
+        key = (chat_id, section)
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.CACHE_TTL:
+            previous = self.timings.get(chat_id, {}).get(section, (0.0, True))
+            self._record_timing(chat_id, section, previous[0], cached=True)
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._build_section(chat_id, section))
+            self._inflight[key] = task
+            try:
+                result = await task
+            finally:
+                self._inflight.pop(key, None)
+            # الأقسام الفارغة تعني خطأ في الاستعلام فلا تُخزن
+            if result:
+                _store_expiring(self._cache, key, result, self.CACHE_TTL, self.MAX_CACHE_ENTRIES)
+            return result
+        return await asyncio.shield(task)
+
+    async def build(self, chat_id: int, *sections: str) -> Dict[str, Dict]:
+        """جلب الأقسام المطلوبة معاً وإرجاعها كقاموس {القسم: البيانات}"""
+        sections = sections or tuple(self.SECTIONS)
+        results = await asyncio.gather(
+            *(self._get_section(chat_id, section) for section in sections),
+            return_exceptions=True
+        )
+
+        report = {}
+        for section, result in zip(sections, results):
+            if isinstance(result, Exception):
+                logging.error(f"خطأ في بناء قسم التقرير {section}: {result}")
+                result = {}
+            report[section] = result
+        return report
+
+    def section_timings(self, chat_id: int) -> Dict[str, Tuple[float, bool]]:
+        """آخر أزمنة بناء أقسام المجموعة بالملي ثانية وهل قُدم كل قسم من الذاكرة المؤقتة"""
+        return dict(self.timings.get(chat_id, {}))
+
+    def invalidate(self, chat_id: int) -> None:
+        """إسقاط الأقسام المخزنة للمجموعة"""
+        for key in [key for key in self._cache if key[0] == chat_id]:
+            del self._cache[key]
+
+
+report_builder = DashboardReportBuilder()
+
+
 class DashboardGenerator:
     """مولد لوحة التحكم"""
     
@@ -255,12 +395,11 @@ class DashboardGenerator:
     async def generate_overview_dashboard(chat_id: int) -> str:
         """توليد لوحة التحكم العامة"""
         try:
-            analytics = GroupAnalytics()
-            
-            # جمع الإحصائيات
-            member_stats = await analytics.get_member_statistics(chat_id)
-            financial_stats = await analytics.get_financial_statistics(chat_id)
-            moderation_stats = await analytics.get_moderation_statistics(chat_id)
+            # جمع الإحصائيات بالتوازي
+            sections = await report_builder.build(chat_id, "members", "financial", "moderation")
+            member_stats = sections["members"]
+            financial_stats = sections["financial"]
+            moderation_stats = sections["moderation"]
             
             dashboard = "🏛️ **لوحة تحكم إدارة المجموعة**\n"
             dashboard += "═" * 35 + "\n\n"
@@ -313,8 +452,7 @@ class DashboardGenerator:
     async def generate_financial_dashboard(chat_id: int) -> str:
         """توليد لوحة التحكم المالية"""
         try:
-            analytics = GroupAnalytics()
-            financial_stats = await analytics.get_financial_statistics(chat_id)
+            financial_stats = (await report_builder.build(chat_id, "financial"))["financial"]
             
             dashboard = "💰 **لوحة التحكم المالية**\n"
             dashboard += "═" * 30 + "\n\n"
@@ -360,48 +498,27 @@ class DashboardGenerator:
     async def generate_activity_dashboard(chat_id: int) -> str:
         """توليد لوحة نشاط المجموعة"""
         try:
-            analytics = GroupAnalytics()
-            activity_trends = await analytics.get_activity_trends(chat_id, 7)
+            activity_trends = (await report_builder.build(chat_id, "trends"))["trends"]
             
             dashboard = "📈 **لوحة نشاط المجموعة**\n"
             dashboard += "═" * 25 + "\n\n"
             
             if activity_trends:
+                from modules.visual_charts import TextChartGenerator
+
                 dashboard += "📅 **النشاط الأسبوعي:**\n"
-                dates = sorted(activity_trends.keys(), reverse=True)
-                
-                # إنشاء مخطط النشاط
-                max_activity = max(activity_trends[date]['active_users'] for date in dates)
-                
-                for date in dates:
-                    data = activity_trends[date]
-                    active_users = data['active_users']
-                    transactions = data['transactions']
-                    
-                    # تحويل التاريخ لصيغة أجمل
-                    date_obj = datetime.strptime(date, '%Y-%m-%d')
-                    day_name = date_obj.strftime('%A')
-                    formatted_date = date_obj.strftime('%m-%d')
-                    
-                    # شريط النشاط
-                    if max_activity > 0:
-                        bar_length = int((active_users / max_activity) * 15)
-                        bar = "█" * bar_length + "░" * (15 - bar_length)
-                    else:
-                        bar = "░" * 15
-                    
-                    dashboard += f"{formatted_date}: {bar} {active_users} مستخدم, {transactions} معاملة\n"
-                
+                dashboard += TextChartGenerator.create_activity_trends_chart(activity_trends)
                 dashboard += "\n"
                 
                 # إحصائيات الاتجاه
-                total_week_activity = sum(activity_trends[date]['active_users'] for date in dates)
-                total_week_transactions = sum(activity_trends[date]['transactions'] for date in dates)
+                total_week_activity = sum(day['active_users'] for day in activity_trends.values())
+                total_week_transactions = sum(day['transactions'] for day in activity_trends.values())
                 
                 dashboard += "📊 **ملخص الأسبوع:**\n"
                 dashboard += f"👥 إجمالي النشطين: {format_number(total_week_activity)}\n"
                 dashboard += f"💸 إجمالي المعاملات: {format_number(total_week_transactions)}\n"
-                dashboard += f"📈 معدل النشاط اليومي: {total_week_activity/7:.1f}\n"
+                dashboard += f"📈 معدل النشاط اليومي: {total_week_activity / len(activity_trends):.1f}\n"
+                dashboard += TextChartGenerator.create_trend_sparklines(activity_trends) + "\n"
             
             dashboard += f"\n🕒 آخر تحديث: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
             
@@ -471,8 +588,7 @@ async def show_moderation_stats(message: Message):
             await message.reply("❌ هذا الأمر للمشرفين فقط")
             return
         
-        analytics = GroupAnalytics()
-        moderation_stats = await analytics.get_moderation_statistics(message.chat.id)
+        moderation_stats = (await report_builder.build(message.chat.id, "moderation"))["moderation"]
         
         stats_text = "🛡️ **إحصائيات الإشراف**\n"
         stats_text += "═" * 20 + "\n\n"
@@ -513,11 +629,11 @@ async def show_comprehensive_report(message: Message):
         report = "📊 **التقرير الشامل للمجموعة**\n"
         report += "═" * 40 + "\n\n"
         
-        # الحصول على الإحصائيات
-        analytics = GroupAnalytics()
-        member_stats = await analytics.get_member_statistics(chat_id)
-        financial_stats = await analytics.get_financial_statistics(chat_id)
-        moderation_stats = await analytics.get_moderation_statistics(chat_id)
+        # الحصول على الإحصائيات بالتوازي
+        sections = await report_builder.build(chat_id, "members", "financial", "moderation")
+        member_stats = sections["members"]
+        financial_stats = sections["financial"]
+        moderation_stats = sections["moderation"]
         
         # 1. ملخص عام
         report += "📋 **الملخص العام:**\n"
@@ -567,6 +683,12 @@ async def show_comprehensive_report(message: Message):
                 report += f"{i}. {bank_name}: {users_count} مستخدم - {format_number(bank_total)}$\n"
             report += "\n"
         
+        timings = report_builder.section_timings(chat_id)
+        if timings:
+            report += "⏱️ زمن البناء: " + " | ".join(
+                f"{section} {ms:.0f}ms" + (" (مخزن)" if cached else "")
+                for section, (ms, cached) in timings.items()
+            ) + "\n"
         report += f"🕒 تم إنشاء التقرير: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n"
         report += "═" * 40
         
@@ -593,10 +715,10 @@ async def show_health_dashboard(message: Message):
         dashboard += "═" * 30 + "\n\n"
         
         # حساب عوامل الصحة
-        analytics = GroupAnalytics()
-        member_stats = await analytics.get_member_statistics(chat_id)
-        financial_stats = await analytics.get_financial_statistics(chat_id)
-        moderation_stats = await analytics.get_moderation_statistics(chat_id)
+        sections = await report_builder.build(chat_id, "members", "financial", "moderation")
+        member_stats = sections["members"]
+        financial_stats = sections["financial"]
+        moderation_stats = sections["moderation"]
         
         # حساب نقاط الصحة
         health_scores = {}
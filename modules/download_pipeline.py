@@ -0,0 +1,400 @@
+"""
+خط تحميل الوسائط - عمال محدودون، طلب واحد لكل رابط، ومخزن على القرص حسب بصمة المحتوى
+Media Download Pipeline - bounded workers, per-URL single flight, content-addressed LRU disk cache
+"""
+
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import mimetypes
+import os
+import socket
+import tempfile
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp.abc import AbstractResolver, ResolveResult
+from yarl import URL
+
+from config.settings import MEDIA_DOWNLOAD_SETTINGS
+
+try:
+    import yt_dlp
+except ImportError:
+    yt_dlp = None
+
+logger = logging.getLogger(__name__)
+
+# أنواع المحتوى المقبولة كملف وسائط مباشر
+MEDIA_TYPE_PREFIXES = ("video/", "audio/", "image/")
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class DownloadError(Exception):
+    """فشل متوقع في التحميل - الرسالة تُعرض للمستخدم كما هي"""
+
+
+def is_public_address(address: str) -> bool:
+    """عنوان IP عام على الإنترنت (ليس loopback ولا شبكة خاصة ولا link-local ولا محجوزاً)"""
+    try:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+    except ValueError:
+        return False
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class PublicOnlyResolver(AbstractResolver):
+    """محلل أسماء يرفض النتائج الداخلية عند الاتصال نفسه (يمنع تغيير DNS بعد الفحص)"""
+
+    def __init__(self):
+        self._resolver = aiohttp.DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0,
+                      family: socket.AddressFamily = socket.AF_INET) -> List[ResolveResult]:
+        results = await self._resolver.resolve(host, port, family)
+        if any(not is_public_address(result["host"]) for result in results):
+            raise OSError(f"{host} يشير إلى عنوان داخلي")
+        return results
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+
+@dataclass
+class MediaFile:
+    path: str
+    content_type: str
+    size: int
+
+    @property
+    def field(self) -> str:
+        """حقل الإرسال في تيليجرام المناسب لنوع المحتوى"""
+        if self.content_type == "image/gif":
+            return "animation"
+        for prefix, field in (("video/", "video"), ("audio/", "audio"), ("image/", "photo")):
+            if self.content_type.startswith(prefix):
+                return field
+        return "document"
+
+
+class MediaDownloader:
+    """طابور تحميل بعدد ثابت من العمال يكتب الملفات في مخزن مسمى ببصمة sha256"""
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.cache_dir = settings["cache_dir"]
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._session: Optional[aiohttp.ClientSession] = None
+        # خيوط لكتابة القرص حتى لا تحجب حلقة الأحداث
+        self._io_pool = ThreadPoolExecutor(max_workers=settings["workers"], thread_name_prefix="media-io")
+        # yt-dlp في خيوطه الخاصة: استخراج عالق لا يمكن إلغاؤه فلا يجب أن يحجز خيوط القرص
+        self._extract_pool = ThreadPoolExecutor(
+            max_workers=settings["extract_workers"], thread_name_prefix="media-extract"
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # الرابط -> (مسار الملف، نوع المحتوى)
+        self._urls: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        # مسار الملف -> الحجم بترتيب آخر استخدام
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        # ملفات قيد الإرسال لا تُحذف من المخزن حتى ينتهي رفعها
+        self._pins: Counter = Counter()
+        self._total_bytes = 0
+        self._scanned = False
+        self._start_lock = asyncio.Lock()
+        self.downloads = 0
+        self.cache_hits = 0
+
+    async def _run_io(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io_pool, func, *args)
+
+    def _scan_cache(self) -> None:
+        """بناء فهرس المخزن من القرص بترتيب آخر استخدام (وقت التعديل)"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        found = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith(".part"):
+                    # بقايا تحميل لم يكتمل
+                    os.unlink(path)
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._files[path] = size
+            self._total_bytes += size
+
+    async def _start(self) -> None:
+        """تشغيل العمال عند أول طلب (مرة واحدة حتى مع الطلبات المتزامنة)"""
+        if self._queue is not None:
+            return
+        async with self._start_lock:
+            if self._queue is not None:
+                return
+            if not self._scanned:
+                await self._run_io(self._scan_cache)
+                self._scanned = True
+            connector = None
+            if not self.settings["allow_private_hosts"]:
+                connector = aiohttp.TCPConnector(resolver=PublicOnlyResolver(), use_dns_cache=False)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.settings["timeout"])
+            )
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.settings["workers"])]
+            self._queue = asyncio.Queue()
+
+    async def close(self) -> None:
+        """إيقاف العمال وإغلاق جلسة HTTP"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def cached(self, url: str) -> Optional[MediaFile]:
+        """ملف الرابط من المخزن إذا كان ما زال موجوداً"""
+        entry = self._urls.get(url)
+        if entry is None or entry[0] not in self._files:
+            return None
+        path, content_type = entry
+        self._urls.move_to_end(url)
+        self._files.move_to_end(path)
+        return MediaFile(path, content_type, self._files[path])
+
+    async def fetch(self, url: str) -> MediaFile:
+        """ملف الرابط من المخزن أو من تحميل جارٍ أو من تحميل جديد في الطابور"""
+        await self._start()
+        media = self.cached(url)
+        if media is not None:
+            self.cache_hits += 1
+            # تحديث وقت الاستخدام على القرص حتى يبقى الترتيب صحيحاً بعد إعادة التشغيل
+            await self._run_io(os.utime, media.path, None)
+            return media
+
+        # طلب واحد لكل رابط: الطلبات المتزامنة لنفس الرابط تنتظر نفس النتيجة
+        future = self._inflight.get(url)
+        if future is None:
+            # الحد يشمل التحميلات الجارية والمنتظرة معاً
+            if len(self._inflight) >= self.settings["workers"] + self.settings["queue_size"]:
+                raise DownloadError("⏳ التحميلات مزدحمة حالياً، حاول بعد قليل")
+            future = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait((url, future))
+            self._inflight[url] = future
+            future.add_done_callback(lambda _: self._inflight.pop(url, None))
+        return await asyncio.shield(future)
+
+    @asynccontextmanager
+    async def acquire(self, url: str) -> AsyncIterator[MediaFile]:
+        """ملف الرابط محمياً من الإخراج حتى نهاية الكتلة (طوال رفعه لتيليجرام)"""
+        for _ in range(3):
+            media = await self.fetch(url)
+            # قد يُخرج تحميل آخر الملف بين اكتمال الطلب واستئناف هذه المهمة
+            if media.path in self._files:
+                break
+        else:
+            raise DownloadError("⏳ المخزن ممتلئ بملفات قيد الإرسال، حاول بعد قليل")
+
+        self._pins[media.path] += 1
+        try:
+            yield media
+        finally:
+            self._pins[media.path] -= 1
+            if self._pins[media.path] <= 0:
+                del self._pins[media.path]
+                self._evict()
+
+    async def _worker(self) -> None:
+        while True:
+            url, future = await self._queue.get()
+            try:
+                media = await self._download(url)
+                if not future.done():
+                    future.set_result(media)
+            except Exception as e:
+                if not isinstance(e, DownloadError):
+                    logger.error("خطأ في تحميل %s: %s", url, e)
+                    e = DownloadError("❌ تعذر تحميل الملف من الرابط")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def _extract_media_url(self, url: str) -> str:
+        """استخراج رابط الملف المباشر من صفحة المنصة عبر yt-dlp (في خيط منفصل)"""
+        options = {
+            "quiet": True, "no_warnings": True, "format": "best[ext=mp4]/best", "noplaylist": True,
+            # wait_for لا يوقف الخيط، فمهلة المقبس هي ما يُنهي الاستخراج العالق فعلاً
+            "socket_timeout": self.settings["extract_timeout"]
+        }
+        with yt_dlp.YoutubeDL(options) as ydl:
+            info = ydl.extract_info(url, download=False)
+        return info.get("url") or url
+
+    async def _download(self, url: str) -> MediaFile:
+        media_url = url
+        if yt_dlp is not None:
+            try:
+                media_url = await asyncio.wait_for(
+                    asyncio.get_running_loop().run_in_executor(self._extract_pool, self._extract_media_url, url),
+                    self.settings["extract_timeout"]
+                )
+            except Exception as e:
+                # قد يكون الرابط نفسه ملفاً مباشراً
+                logger.debug("لم يستخرج yt-dlp رابطاً من %s: %s", url, e)
+
+        max_bytes = self.settings["max_file_bytes"]
+        try:
+            response = await self._open(media_url)
+            async with response:
+                if response.status != 200:
+                    raise DownloadError(f"❌ رفض الخادم التحميل ({response.status})")
+
+                content_type = response.content_type or ""
+                if not content_type.startswith(MEDIA_TYPE_PREFIXES):
+                    raise DownloadError("❌ الرابط لا يحتوي على ملف وسائط يمكن تحميله")
+                if response.content_length and response.content_length > max_bytes:
+                    raise DownloadError(f"❌ الملف أكبر من الحد المسموح ({max_bytes // (1024 * 1024)}MB)")
+
+                part_path = await self._run_io(self._open_part)
+                try:
+                    digest, size = await self._stream(response, part_path, max_bytes)
+                    path = await self._run_io(self._commit, part_path, digest, content_type)
+                except BaseException:
+                    await self._run_io(_unlink_quietly, part_path)
+                    raise
+        except asyncio.TimeoutError:
+            raise DownloadError(f"⏰ استغرق التحميل أكثر من {self.settings['timeout']} ثانية")
+        except aiohttp.ClientError as e:
+            logger.warning("فشل الاتصال أثناء تحميل %s: %s", url, e)
+            raise DownloadError("❌ تعذر الاتصال بمصدر الملف")
+
+        self.downloads += 1
+        self._remember(url, path, content_type, size)
+        return MediaFile(path, content_type, size)
+
+    async def _ensure_public_host(self, url: str) -> None:
+        """رفض الروابط التي يحل مضيفها إلى عنوان داخلي (بما فيها عناوين IP المكتوبة مباشرة)"""
+        try:
+            parts = urlsplit(url)
+            host, port = parts.hostname, parts.port
+        except ValueError:
+            raise DownloadError("❌ رابط الملف غير صالح")
+        if parts.scheme not in ("http", "https") or not host:
+            raise DownloadError("❌ رابط الملف غير صالح")
+        if self.settings["allow_private_hosts"]:
+            return
+
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                host, port or (443 if parts.scheme == "https" else 80), type=socket.SOCK_STREAM
+            )
+        except socket.gaierror:
+            raise DownloadError("❌ تعذر الاتصال بمصدر الملف")
+        if not infos or any(not is_public_address(info[4][0]) for info in infos):
+            logger.warning("رفض تحميل من عنوان داخلي: %s", host)
+            raise DownloadError("❌ رابط الملف يشير إلى عنوان غير مسموح")
+
+    async def _open(self, url: str) -> aiohttp.ClientResponse:
+        """طلب GET يتبع التحويلات يدوياً ويفحص مضيف كل تحويل قبل الاتصال به"""
+        for _ in range(self.settings["max_redirects"] + 1):
+            await self._ensure_public_host(url)
+            response = await self._session.get(url, allow_redirects=False)
+            location = response.headers.get("Location")
+            if response.status not in REDIRECT_STATUSES or not location:
+                return response
+            response.release()
+            url = str(response.url.join(URL(location)))
+        raise DownloadError("❌ تحويلات كثيرة من مصدر الملف")
+
+    def _open_part(self) -> str:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, part_path = tempfile.mkstemp(suffix=".part", dir=self.cache_dir)
+        os.close(fd)
+        return part_path
+
+    async def _stream(self, response: aiohttp.ClientResponse, part_path: str, max_bytes: int) -> Tuple[str, int]:
+        """كتابة الاستجابة على دفعات مع حساب البصمة وإيقاف التحميل عند تجاوز الحد"""
+        digest = hashlib.sha256()
+        size = 0
+        handle = await self._run_io(open, part_path, "wb")
+        try:
+            async for chunk in response.content.iter_chunked(self.settings["chunk_size"]):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise DownloadError(f"❌ الملف أكبر من الحد المسموح ({max_bytes // (1024 * 1024)}MB)")
+                digest.update(chunk)
+                await self._run_io(handle.write, chunk)
+        finally:
+            await self._run_io(handle.close)
+        return digest.hexdigest(), size
+
+    def _commit(self, part_path: str, digest: str, content_type: str) -> str:
+        """نقل الملف لمساره النهائي حسب البصمة (المحتوى المكرر يُحفظ مرة واحدة)"""
+        extension = mimetypes.guess_extension(content_type) or ""
+        directory = os.path.join(self.cache_dir, digest[:2])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, digest + extension)
+        if os.path.exists(path):
+            os.unlink(part_path)
+            os.utime(path, None)
+        else:
+            os.replace(part_path, path)
+        return path
+
+    def _remember(self, url: str, path: str, content_type: str, size: int) -> None:
+        self._urls[url] = (path, content_type)
+        self._urls.move_to_end(url)
+        while len(self._urls) > self.settings["remembered_urls"]:
+            self._urls.popitem(last=False)
+
+        if path not in self._files:
+            self._total_bytes += size
+        self._files[path] = size
+        self._files.move_to_end(path)
+        self._evict()
+
+    def _evict(self) -> None:
+        """حذف الملفات الأقدم استخداماً حتى يعود المخزن تحت الحد (عدا أحدث ملف والملفات قيد الإرسال)"""
+        if self._total_bytes <= self.settings["max_cache_bytes"]:
+            return
+        for path in list(self._files)[:-1]:
+            if self._total_bytes <= self.settings["max_cache_bytes"]:
+                break
+            if self._pins.get(path):
+                continue
+            self._total_bytes -= self._files.pop(path)
+            self._io_pool.submit(_unlink_quietly, path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self._files),
+            "bytes": self._total_bytes,
+            "downloads": self.downloads,
+            "cache_hits": self.cache_hits,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": len(self._inflight),
+            "pinned": len(self._pins)
+        }
+
+
+def _unlink_quietly(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+media_downloader = MediaDownloader(MEDIA_DOWNLOAD_SETTINGS)
@@ -616,15 +616,9 @@ async def clear_entertainment_ranks(message: Message):
 async def is_entertainment_enabled(chat_id: int) -> bool:
     """التحقق من تفعيل التسلية"""
     try:
-        setting = await execute_query(
-            "SELECT setting_value FROM group_settings WHERE chat_id = ? AND setting_key = 'enable_entertainment'",
-            (chat_id,),
-            fetch_one=True
-        )
-        
-        if setting:
-            return setting[0] == "True" if isinstance(setting, tuple) else setting['setting_value'] == "True"
-        return True  # افتراضياً مفعل
+        from modules.group_settings_cache import group_settings_cache
+        # افتراضياً مفعل
+        return group_settings_cache.is_enabled(chat_id, "enable_entertainment", default=True)
         
     except Exception as e:
         logging.error(f"خطأ في التحقق من تفعيل التسلية: {e}")
@@ -674,6 +674,10 @@ async def auto_update_crop_status():
         return 0
 
 
+HARVEST_INCOME_QUERY = "SELECT SUM(amount) as total FROM transactions WHERE to_user_id = ? AND transaction_type = 'crop_harvest'"
+PLANTING_COSTS_QUERY = "SELECT SUM(amount) as total FROM transactions WHERE from_user_id = ? AND transaction_type = 'crop_purchase'"
+
+
 async def get_farm_statistics(user_id: int):
     """الحصول على إحصائيات المزرعة للمستخدم"""
     try:
@@ -691,7 +695,7 @@ async def get_farm_statistics(user_id: int):
         
         # إجمالي الأرباح من الزراعة
         harvest_profits = await execute_query(
-            "SELECT SUM(amount) as total FROM transactions WHERE to_user_id = ? AND transaction_type = 'crop_harvest'",
+            HARVEST_INCOME_QUERY,
             (user_id,),
             fetch_one=True
         )
@@ -700,7 +704,7 @@ async def get_farm_statistics(user_id: int):
         
         # إجمالي الاستثمار في الزراعة
         planting_costs = await execute_query(
-            "SELECT SUM(amount) as total FROM transactions WHERE from_user_id = ? AND transaction_type = 'crop_purchase'",
+            PLANTING_COSTS_QUERY,
             (user_id,),
             fetch_one=True
         )
@@ -0,0 +1,147 @@
+"""
+ذاكرة معرفات ملفات تيليجرام - رفع الملف مرة واحدة ثم إعادة استخدام file_id
+Telegram file_id Cache - upload once, resend by file_id until the source changes
+"""
+
+import hashlib
+import logging
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import aiohttp
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, FSInputFile, InputFile, Message
+
+from database.operations import execute_query
+
+SendMethod = Callable[..., Awaitable[Message]]
+FileFactory = Callable[[], Awaitable[Optional[InputFile]]]
+
+
+def _sent_file_id(sent: Message, field: str) -> Optional[str]:
+    """استخراج file_id من الرسالة المرسلة (الصور: أكبر مقاس)"""
+    media = getattr(sent, field, None)
+    if isinstance(media, list):
+        media = media[-1] if media else None
+    return getattr(media, "file_id", None)
+
+
+class TelegramFileCache:
+    """مفتاح المصدر -> (بصمة المحتوى، file_id، نوع الوسائط) في الذاكرة ومنسوخ في جدول telegram_file_cache"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[str, str, str]] = {}
+        # المسار -> (الحجم، وقت التعديل، sha256) حتى لا يُعاد حساب البصمة لملف لم يتغير
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        self.hits = 0
+        self.uploads = 0
+
+    async def load(self) -> int:
+        """تحميل المعرفات المحفوظة عند بدء التشغيل"""
+        rows = await execute_query(
+            "SELECT cache_key, fingerprint, file_id, kind FROM telegram_file_cache",
+            fetch_all=True
+        )
+        if rows is None:
+            logging.error("خطأ في تحميل ذاكرة معرفات الملفات")
+            return 0
+
+        self._entries = {row['cache_key']: (row['fingerprint'], row['file_id'], row['kind']) for row in rows}
+        return len(rows)
+
+    def get(self, key: str, fingerprint: str = "") -> Optional[str]:
+        """file_id المحفوظ إذا كانت بصمة المصدر لم تتغير"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != fingerprint:
+            return None
+        return entry[1]
+
+    def kind(self, key: str) -> Optional[str]:
+        """حقل الإرسال الذي حُفظ به المعرف (document، audio، video...)"""
+        entry = self._entries.get(key)
+        return entry[2] if entry else None
+
+    async def store(self, key: str, fingerprint: str, file_id: str, kind: str) -> None:
+        self._entries[key] = (fingerprint, file_id, kind)
+        await execute_query(
+            """
+            INSERT INTO telegram_file_cache (cache_key, fingerprint, file_id, kind, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+                fingerprint = excluded.fingerprint,
+                file_id = excluded.file_id,
+                kind = excluded.kind,
+                updated_at = excluded.updated_at
+            """,
+            (key, fingerprint, file_id, kind, datetime.now().isoformat())
+        )
+
+    async def forget(self, key: str) -> None:
+        self._entries.pop(key, None)
+        await execute_query("DELETE FROM telegram_file_cache WHERE cache_key = ?", (key,))
+
+    def file_digest(self, path: str) -> str:
+        """بصمة محتوى الملف (تُحسب فقط إذا تغير الحجم أو وقت التعديل)"""
+        stat = os.stat(path)
+        cached = self._digests.get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        self._digests[path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+        return digest.hexdigest()
+
+    async def send(self, send: SendMethod, field: str, key: str, fingerprint: str,
+                   make_file: FileFactory, **kwargs) -> Optional[Message]:
+        """الإرسال بالمعرف المحفوظ، أو رفع الملف وحفظ المعرف (None إذا تعذر تجهيز الملف)"""
+        file_id = self.get(key, fingerprint)
+        if file_id is not None:
+            try:
+                sent = await send(**{field: file_id}, **kwargs)
+                self.hits += 1
+                return sent
+            except TelegramBadRequest as e:
+                # معرف لم يعد صالحاً (بوت آخر أو ملف حُذف من خوادم تيليجرام)
+                logging.warning(f"معرف ملف محفوظ مرفوض ({key}): {e}")
+                await self.forget(key)
+
+        input_file = await make_file()
+        if input_file is None:
+            return None
+
+        sent = await send(**{field: input_file}, **kwargs)
+        self.uploads += 1
+        new_file_id = _sent_file_id(sent, field)
+        if new_file_id:
+            await self.store(key, fingerprint, new_file_id, field)
+        return sent
+
+    async def send_path(self, send: SendMethod, field: str, path: str,
+                        filename: Optional[str] = None, **kwargs) -> Optional[Message]:
+        """إرسال ملف محلي - يُرفع من جديد فقط عند تغير محتواه"""
+        async def make_file() -> InputFile:
+            return FSInputFile(path, filename=filename)
+
+        return await self.send(send, field, f"file:{os.path.abspath(path)}", self.file_digest(path),
+                               make_file, **kwargs)
+
+    async def send_url(self, send: SendMethod, field: str, url: str,
+                       filename: Optional[str] = None, **kwargs) -> Optional[Message]:
+        """إرسال ملف من رابط - يُحمّل ويُرفع مرة واحدة فقط لكل رابط"""
+        async def make_file() -> Optional[InputFile]:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        logging.warning(f"فشل تحميل الملف ({response.status}): {url}")
+                        return None
+                    data = await response.read()
+            return BufferedInputFile(data, filename=filename or os.path.basename(url.split('?')[0]) or "file")
+
+        return await self.send(send, field, f"url:{url}", "", make_file, **kwargs)
+
+
+file_cache = TelegramFileCache()
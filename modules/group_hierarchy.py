@@ -189,7 +189,8 @@ async def handle_hierarchy_commands(message: Message) -> bool:
     
     # فحص أوامر مالكي المجموعات مع ردود مهينة
     from modules.permission_responses import is_owner_command, get_permission_denial_response
-    if is_owner_command(message.text) and user_level.value < AdminLevel.GROUP_OWNER.value:
+    from utils.text_normalizer import normalized_text
+    if is_owner_command(normalized_text(message)) and user_level.value < AdminLevel.GROUP_OWNER.value:
         insulting_response = get_permission_denial_response(user_id, group_id, AdminLevel.GROUP_OWNER)
         if insulting_response:
             await message.reply(insulting_response)
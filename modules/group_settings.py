@@ -9,6 +9,7 @@ from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
 from database.operations import execute_query
+from modules.group_settings_cache import group_settings_cache
 from utils.decorators import admin_required, group_only
 from config.settings import SYSTEM_MESSAGES
 from config.hierarchy import has_permission, AdminLevel
@@ -83,9 +84,8 @@ async def handle_lock_command(message: Message, setting: str, action: str):
         # تطبيق الإعداد
         is_locked = action == "قفل"
         
-        await execute_query(
-            "INSERT OR REPLACE INTO group_settings (chat_id, setting_key, setting_value, updated_at) VALUES (?, ?, ?, ?)",
-            (message.chat.id, f"lock_{setting_key}", str(is_locked), datetime.now().isoformat())
+        await group_settings_cache.set(
+            message.chat.id, f"lock_{setting_key}", str(is_locked), message.from_user.id
         )
 
         action_text = "قفل" if is_locked else "فتح"
@@ -124,9 +124,8 @@ async def handle_toggle_command(message: Message, setting: str, action: str):
         # تطبيق الإعداد العام
         is_enabled = action == "تفعيل"
         
-        await execute_query(
-            "INSERT OR REPLACE INTO group_settings (chat_id, setting_key, setting_value, updated_at) VALUES (?, ?, ?, ?)",
-            (message.chat.id, f"enable_{setting_key}", str(is_enabled), datetime.now().isoformat())
+        await group_settings_cache.set(
+            message.chat.id, f"enable_{setting_key}", str(is_enabled), message.from_user.id
         )
 
         action_text = "تفعيل" if is_enabled else "تعطيل"
@@ -147,11 +146,7 @@ async def handle_toggle_command(message: Message, setting: str, action: str):
 async def show_group_settings(message: Message):
     """عرض إعدادات المجموعة"""
     try:
-        settings = await execute_query(
-            "SELECT setting_key, setting_value FROM group_settings WHERE chat_id = ?",
-            (message.chat.id,),
-            fetch_all=True
-        )
+        settings = group_settings_cache.chat(message.chat.id)
 
         if not settings:
             await message.reply("📋 لا توجد إعدادات مخصصة للمجموعة")
@@ -163,10 +158,7 @@ async def show_group_settings(message: Message):
         lock_settings = []
         enable_settings = []
         
-        for setting in settings:
-            key = setting['setting_key'] if isinstance(setting, dict) else setting[0]
-            value = setting['setting_value'] if isinstance(setting, dict) else setting[1]
-            
+        for key, value in settings.items():
             if key.startswith('lock_'):
                 setting_name = key.replace('lock_', '')
                 status = "🔒 مقفل" if value == "True" else "🔓 مفتوح"
@@ -242,9 +234,8 @@ async def set_group_welcome(message: Message, welcome_text: str):
             await message.reply("❌ هذا الأمر للإدارة فقط")
             return
 
-        await execute_query(
-            "INSERT OR REPLACE INTO group_settings (chat_id, setting_key, setting_value, updated_at) VALUES (?, ?, ?, ?)",
-            (message.chat.id, "welcome_message", welcome_text, datetime.now().isoformat())
+        await group_settings_cache.set(
+            message.chat.id, "welcome_message", welcome_text, message.from_user.id
         )
 
         await message.reply("✅ تم تعيين رسالة الترحيب بنجاح")
@@ -261,9 +252,8 @@ async def set_group_rules(message: Message, rules_text: str):
             await message.reply("❌ هذا الأمر للإدارة فقط")
             return
 
-        await execute_query(
-            "INSERT OR REPLACE INTO group_settings (chat_id, setting_key, setting_value, updated_at) VALUES (?, ?, ?, ?)",
-            (message.chat.id, "group_rules", rules_text, datetime.now().isoformat())
+        await group_settings_cache.set(
+            message.chat.id, "group_rules", rules_text, message.from_user.id
         )
 
         await message.reply("✅ تم تعيين قوانين المجموعة بنجاح")
@@ -276,17 +266,12 @@ async def set_group_rules(message: Message, rules_text: str):
 async def show_group_rules(message: Message):
     """عرض قوانين المجموعة"""
     try:
-        rules = await execute_query(
-            "SELECT setting_value FROM group_settings WHERE chat_id = ? AND setting_key = 'group_rules'",
-            (message.chat.id,),
-            fetch_one=True
-        )
+        rules_text = group_settings_cache.get(message.chat.id, "group_rules")
 
-        if not rules:
+        if not rules_text:
             await message.reply("📜 لم يتم تعيين قوانين للمجموعة بعد")
             return
 
-        rules_text = rules[0] if isinstance(rules, tuple) else rules['setting_value']
         await message.reply(f"📜 **قوانين المجموعة:**\n\n{rules_text}")
 
     except Exception as e:
@@ -297,6 +282,8 @@ async def show_group_rules(message: Message):
 async def handle_forbidden_word(message: Message, word: str, action: str):
     """معالج إضافة/إزالة الكلمات المحظورة"""
     try:
+        from modules.moderation_filter import moderation_filter
+
         if not await has_admin_permission(message.from_user.id, message.chat.id):
             await message.reply("❌ هذا الأمر للإدارة فقط")
             return
@@ -304,9 +291,10 @@ async def handle_forbidden_word(message: Message, word: str, action: str):
         if action == "منع":
             # إضافة كلمة محظورة
             await execute_query(
-                "INSERT INTO forbidden_words (chat_id, word, added_by, added_at) VALUES (?, ?, ?, ?)",
+                "INSERT OR IGNORE INTO forbidden_words (chat_id, word, added_by, added_at) VALUES (?, ?, ?, ?)",
                 (message.chat.id, word.lower(), message.from_user.id, datetime.now().isoformat())
             )
+            moderation_filter.add_word(message.chat.id, word)
             await message.reply(f"✅ تم منع كلمة '{word}' في المجموعة")
         
         elif action == "الغاء منع":
@@ -315,6 +303,7 @@ async def handle_forbidden_word(message: Message, word: str, action: str):
                 "DELETE FROM forbidden_words WHERE chat_id = ? AND word = ?",
                 (message.chat.id, word.lower())
             )
+            moderation_filter.remove_word(message.chat.id, word)
             await message.reply(f"✅ تم إلغاء منع كلمة '{word}' في المجموعة")
 
     except Exception as e:
@@ -385,17 +374,9 @@ async def has_admin_permission(user_id: int, chat_id: int) -> bool:
 
 
 async def get_setting_value(chat_id: int, setting_key: str, default_value: str = "False") -> str:
-    """الحصول على قيمة إعداد معين"""
+    """الحصول على قيمة إعداد معين (من اللقطة في الذاكرة)"""
     try:
-        setting = await execute_query(
-            "SELECT setting_value FROM group_settings WHERE chat_id = ? AND setting_key = ?",
-            (chat_id, setting_key),
-            fetch_one=True
-        )
-        
-        if setting:
-            return setting[0] if isinstance(setting, tuple) else setting['setting_value']
-        return default_value
+        return group_settings_cache.get(chat_id, setting_key, default_value)
         
     except Exception as e:
         logging.error(f"خطأ في الحصول على الإعداد: {e}")
@@ -0,0 +1,91 @@
+"""
+ذاكرة إعدادات المجموعات المؤقتة
+Group Settings In-Memory Snapshot
+"""
+
+import logging
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+
+from database.operations import execute_query
+
+_EMPTY: Mapping[str, str] = MappingProxyType({})
+
+
+class GroupSettingsCache:
+    """لقطة ثابتة لإعدادات كل مجموعة تُستبدل بالكامل عند كل كتابة"""
+
+    def __init__(self):
+        self._chats: Dict[int, Mapping[str, str]] = {}
+        self.loaded = False
+
+    async def load(self) -> int:
+        """تحميل جميع إعدادات المجموعات من قاعدة البيانات عند بدء التشغيل"""
+        rows = await execute_query(
+            "SELECT chat_id, setting_key, setting_value FROM group_settings",
+            fetch_all=True
+        )
+        if rows is None:
+            logging.error("خطأ في تحميل إعدادات المجموعات إلى الذاكرة")
+            return 0
+
+        chats: Dict[int, Dict[str, str]] = {}
+        for row in rows:
+            chats.setdefault(row['chat_id'], {})[row['setting_key']] = row['setting_value']
+
+        self._chats = {chat_id: MappingProxyType(settings) for chat_id, settings in chats.items()}
+        self.loaded = True
+        logging.info(f"تم تحميل إعدادات {len(self._chats)} مجموعة إلى الذاكرة")
+        return len(rows)
+
+    def chat(self, chat_id: int) -> Mapping[str, str]:
+        """الحصول على لقطة إعدادات مجموعة (للقراءة فقط)"""
+        return self._chats.get(chat_id, _EMPTY)
+
+    def get(self, chat_id: int, setting_key: str, default: Optional[str] = None) -> Optional[str]:
+        """قراءة إعداد دون الرجوع لقاعدة البيانات"""
+        return self._chats.get(chat_id, _EMPTY).get(setting_key, default)
+
+    def is_enabled(self, chat_id: int, setting_key: str, default: bool = False) -> bool:
+        """التحقق من إعداد منطقي مخزن كنص True/False"""
+        value = self.get(chat_id, setting_key)
+        if value is None:
+            return default
+        return value.lower() == "true"
+
+    def _swap(self, chat_id: int, settings: Dict[str, str]) -> None:
+        """استبدال لقطة المجموعة بنسخة جديدة"""
+        if settings:
+            self._chats[chat_id] = MappingProxyType(settings)
+        else:
+            self._chats.pop(chat_id, None)
+
+    async def set(self, chat_id: int, setting_key: str, setting_value: str,
+                  updated_by: Optional[int] = None) -> bool:
+        """كتابة إعداد في قاعدة البيانات ثم تحديث اللقطة"""
+        result = await execute_query(
+            "INSERT OR REPLACE INTO group_settings (chat_id, setting_key, setting_value, updated_by, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (chat_id, setting_key, setting_value, updated_by, datetime.now().isoformat())
+        )
+        if result is None:
+            return False
+
+        settings = dict(self.chat(chat_id))
+        settings[setting_key] = setting_value
+        self._swap(chat_id, settings)
+        return True
+
+    def invalidate(self, chat_id: int, *setting_keys: str) -> None:
+        """إزالة إعدادات حُذفت من قاعدة البيانات (كل إعدادات المجموعة إذا لم تحدد مفاتيح)"""
+        if not setting_keys:
+            self._swap(chat_id, {})
+            return
+
+        settings = dict(self.chat(chat_id))
+        for setting_key in setting_keys:
+            settings.pop(setting_key, None)
+        self._swap(chat_id, settings)
+
+
+group_settings_cache = GroupSettingsCache()
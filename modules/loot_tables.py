@@ -0,0 +1,103 @@
+"""
+جداول الغنائم المترجمة مسبقاً بأوزان تراكمية
+Precompiled Cumulative-Weight Loot Tables
+"""
+
+import random
+from bisect import bisect
+from collections import Counter
+from itertools import accumulate
+from typing import Dict, List, Tuple
+
+# (نوع المورد، الحد الأدنى، الحد الأقصى)
+ResourceRange = Tuple[str, int, int]
+
+
+class TreasureLootTable:
+    """جدول البحث عن الكنز مترجم مرة واحدة: أوزان تراكمية ونطاقات كميات محسوبة مسبقاً"""
+
+    def __init__(self, hunt_types: Dict, resource_info: Dict):
+        self.hunt_types: List[str] = list(hunt_types)
+        self.hunt_weights: List[int] = list(accumulate(info['chance'] for info in hunt_types.values()))
+
+        # مورد واحد: اختيار موزون بين الموارد
+        single = hunt_types['single_resource']['resources']
+        self.single_ranges: List[ResourceRange] = [
+            (resource_type, info['min'], info['max']) for resource_type, info in single.items()
+        ]
+        self.single_weights: List[int] = list(accumulate(info['chance'] for info in single.values()))
+
+        # موارد متعددة: تركيبات متساوية الاحتمال بنطاقات مضروبة في المعامل مسبقاً
+        self.combinations: Dict[str, List[Tuple[ResourceRange, ...]]] = {}
+        for hunt_type, info in hunt_types.items():
+            if 'combinations' not in info:
+                continue
+            self.combinations[hunt_type] = [
+                tuple(
+                    (resource_type,
+                     int(resource_info[resource_type]['min'] * combo['multiplier']),
+                     int(resource_info[resource_type]['max'] * combo['multiplier']))
+                    for resource_type in combo['resources']
+                )
+                for combo in info['combinations']
+            ]
+
+    @staticmethod
+    def _pick(items: List, cum_weights: List[int], rng: random.Random):
+        """اختيار موزون واحد ببحث ثنائي في الأوزان التراكمية"""
+        return items[bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+    @staticmethod
+    def _amount(low: int, high: int, rng: random.Random) -> int:
+        """كمية عشوائية منتظمة في [low, high]"""
+        return low + int(rng.random() * (high - low + 1))
+
+    @staticmethod
+    def _label(hunt_type: str) -> str:
+        """اسم نوع البحث كما يعرضه أمر الكنز"""
+        return "single" if hunt_type == 'single_resource' else hunt_type.replace('_resource', '')
+
+    def _roll_ranges(self, hunt_type: str, rng: random.Random) -> Tuple[ResourceRange, ...]:
+        """اختيار نطاقات الموارد لنوع بحث محدد"""
+        if hunt_type == 'single_resource':
+            return (self._pick(self.single_ranges, self.single_weights, rng),)
+        return rng.choice(self.combinations[hunt_type])
+
+    def roll(self, rng: random.Random = random) -> dict:
+        """تنفيذ بحث واحد وإرجاع النتيجة بصيغة perform_treasure_hunt"""
+        hunt_type = self._pick(self.hunt_types, self.hunt_weights, rng)
+        if hunt_type == 'nothing':
+            return {"found": False, "resources": {}, "hunt_type": "nothing"}
+
+        resources = {
+            resource_type: self._amount(low, high, rng)
+            for resource_type, low, high in self._roll_ranges(hunt_type, rng)
+        }
+        return {"found": True, "resources": resources, "hunt_type": self._label(hunt_type)}
+
+    def simulate(self, hunts: int, rng: random.Random = random) -> dict:
+        """محاكاة عدد كبير من عمليات البحث دفعة واحدة لموازنة الاقتصاد"""
+        type_counts = Counter(rng.choices(self.hunt_types, cum_weights=self.hunt_weights, k=hunts))
+        totals: Dict[str, int] = {resource_type: 0 for resource_type, _, _ in self.single_ranges}
+
+        for hunt_type, count in type_counts.items():
+            if hunt_type == 'nothing':
+                continue
+            if hunt_type == 'single_resource':
+                picks = rng.choices(self.single_ranges, cum_weights=self.single_weights, k=count)
+                for resource_type, low, high in picks:
+                    totals[resource_type] += self._amount(low, high, rng)
+            else:
+                for combo in rng.choices(self.combinations[hunt_type], k=count):
+                    for resource_type, low, high in combo:
+                        totals[resource_type] += self._amount(low, high, rng)
+
+        return {
+            "hunts": hunts,
+            "by_type": {self._label(hunt_type): count for hunt_type, count in type_counts.items()},
+            "found_rate": 1 - type_counts.get('nothing', 0) / hunts if hunts else 0.0,
+            "totals": totals,
+            "average_per_hunt": {
+                resource_type: total / hunts if hunts else 0.0 for resource_type, total in totals.items()
+            }
+        }
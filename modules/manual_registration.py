@@ -100,13 +100,12 @@ async def handle_bank_selection(message: Message, state: FSMContext):
 async def create_user_with_bank(user_id: int, username: str, first_name: str, bank_key: str) -> bool:
     """إنشاء مستخدم مع بنك محدد"""
     try:
-        import aiosqlite
-        from config.database import DATABASE_URL
+        from config.database import connect_database
         from datetime import datetime
         
         bank_info = BANK_TYPES[bank_key]
         
-        async with aiosqlite.connect(DATABASE_URL) as db:
+        async with connect_database() as db:
             await db.execute(
                 """
                 INSERT INTO users (
@@ -691,7 +691,8 @@ async def handle_master_commands(message: Message) -> bool:
     
     # فحص إذا كان النص يحتوي على أمر من أوامر الأسياد
     from modules.permission_responses import is_master_command, get_permission_denial_response
-    if is_master_command(message.text):
+    from utils.text_normalizer import normalized_text
+    if is_master_command(normalized_text(message)):
         # التحقق من كون المستخدم سيد
         if user_id not in MASTERS:
             # إرسال رد مهين
@@ -754,9 +755,62 @@ async def handle_master_commands(message: Message) -> bool:
         await add_money_command(message)
         return True
     
+    elif text in ['أداء', 'الأداء', 'اداء']:
+        await show_performance_command(message)
+        return True
+    
+    # أوامر النسخ الاحتياطي
+    from modules.backup_system import handle_backup_commands
+    if await handle_backup_commands(message):
+        return True
+    
     return False
 
 
+@master_only
+async def show_performance_command(message: Message):
+    """عرض زمن الاستجابة واستهلاك قاعدة البيانات لكل أمر وأبطأ الاستعلامات"""
+    try:
+        from utils.metrics import metrics
+        
+        overall = metrics.overall()
+        if not overall.count:
+            await message.reply("📈 لا توجد قياسات بعد")
+            return
+        
+        p50, p95, p99 = overall.percentiles(0.5, 0.95, 0.99)
+        text = (
+            "📈 **أداء البوت**\n\n"
+            f"📨 التحديثات: {overall.count:,} (أخطاء: {overall.errors:,})\n"
+            f"⏱️ p50: {p50 * 1000:.0f}ms | p95: {p95 * 1000:.0f}ms | p99: {p99 * 1000:.0f}ms\n"
+            f"🗄️ استعلامات لكل تحديث: {overall.db_queries / overall.count:.1f} "
+            f"({overall.db_time / overall.count * 1000:.1f}ms)\n"
+            f"🔌 اتصالات لكل تحديث: {overall.db_connections / overall.count:.1f}\n"
+            f"📡 طلبات تيليجرام لكل تحديث: {overall.api_calls / overall.count:.1f}\n\n"
+            "🔝 **الأوامر الأكثر استخداماً:**\n"
+        )
+        
+        top_commands = sorted(metrics.commands.items(), key=lambda item: item[1].count, reverse=True)[:8]
+        for label, stats in top_commands:
+            c50, c95, c99 = stats.percentiles(0.5, 0.95, 0.99)
+            text += (
+                f"• `{label}` ×{stats.count:,}: {c50 * 1000:.0f}/{c95 * 1000:.0f}/{c99 * 1000:.0f}ms، "
+                f"{stats.db_queries / stats.count:.1f} استعلام\n"
+            )
+        
+        slow_queries = metrics.slow_queries(5)
+        if slow_queries:
+            text += "\n🐢 **أبطأ الاستعلامات (الزمن الكلي):**\n"
+            for sql, count, total, worst in slow_queries:
+                text += f"• {total * 1000:.0f}ms ×{count:,} (أقصى {worst * 1000:.0f}ms)\n  `{sql[:80]}`\n"
+        
+        await message.reply(text)
+        
+    except Exception as e:
+        logging.error(f"خطأ في عرض الأداء: {e}")
+        await message.reply("❌ حدث خطأ في عرض الأداء")
+
+
 async def add_money_command(message: Message):
     """أمر إضافة الأموال للمستخدمين (خاص بالأسياد)"""
     try:
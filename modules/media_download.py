@@ -5,12 +5,16 @@ Media Download Module
 
 import logging
 import re
-from aiogram.types import Message
+from contextlib import AsyncExitStack
+from urllib.parse import urlsplit
+from aiogram.types import FSInputFile, Message
 from aiogram.fsm.context import FSMContext
 
 from utils.decorators import group_only
 from utils.helpers import format_user_mention
 
+# مسجل الوحدة يخضع لأخذ العينات لأنه يكتب مع كل طلب
+logger = logging.getLogger(__name__)
 
 # حالة التحميل (مفعل/معطل) لكل مجموعة
 download_settings = {}
@@ -50,22 +54,18 @@ async def toggle_download(message: Message, enable: bool = True):
         #     await message.reply("❌ هذا الأمر للأعضاء المسجلين وما فوق فقط")
         #     return
         
-        logging.info(f"محاولة {'تفعيل' if enable else 'تعطيل'} التحميل للمستخدم {message.from_user.id} في المجموعة {message.chat.id}")
+        logger.info("محاولة %s التحميل للمستخدم %s في المجموعة %s", 'تفعيل' if enable else 'تعطيل', message.from_user.id, message.chat.id)
         
         chat_id = message.chat.id
         download_settings[chat_id] = enable
         
-        # حفظ في قاعدة البيانات
-        from database.operations import execute_query
-        from datetime import datetime
+        # حفظ في قاعدة البيانات وتحديث لقطة الإعدادات
+        from modules.group_settings_cache import group_settings_cache
         
-        await execute_query(
-            "INSERT OR REPLACE INTO group_settings (chat_id, setting_key, setting_value, updated_at) VALUES (?, ?, ?, ?)",
-            (chat_id, "enable_download", str(enable), datetime.now().isoformat())
-        )
+        await group_settings_cache.set(chat_id, "enable_download", str(enable), message.from_user.id)
         
         # إضافة تسجيل للتصحيح
-        logging.info(f"تم {'تفعيل' if enable else 'تعطيل'} التحميل للمجموعة {chat_id}. الإعدادات الحالية: {download_settings}")
+        logger.info("تم %s التحميل للمجموعة %s", 'تفعيل' if enable else 'تعطيل', chat_id)
         
         status = "مفعل ✅" if enable else "معطل ❌"
         action = "تم تفعيل" if enable else "تم تعطيل"
@@ -111,8 +111,7 @@ async def download_tiktok(message: Message, url: str = None):
         # إرسال رسالة تحميل
         loading_msg = await message.reply("⏳ جاري تحميل الفيديو من تيك توك...")
         
-        # محاكاة التحميل (يحتاج لمكتبة خارجية مثل yt-dlp)
-        await simulate_download(loading_msg, "تيك توك", url)
+        await deliver_media(message, loading_msg, "تيك توك", url)
         
     except Exception as e:
         logging.error(f"خطأ في تحميل تيك توك: {e}")
@@ -149,8 +148,7 @@ async def download_twitter(message: Message, url: str = None):
         # إرسال رسالة تحميل
         loading_msg = await message.reply("⏳ جاري تحميل المحتوى من تويتر...")
         
-        # محاكاة التحميل
-        await simulate_download(loading_msg, "تويتر", url)
+        await deliver_media(message, loading_msg, "تويتر", url)
         
     except Exception as e:
         logging.error(f"خطأ في تحميل تويتر: {e}")
@@ -187,8 +185,7 @@ async def download_soundcloud(message: Message, url: str = None):
         # إرسال رسالة تحميل
         loading_msg = await message.reply("⏳ جاري تحميل المقطع الصوتي من ساوند كلاود...")
         
-        # محاكاة التحميل
-        await simulate_download(loading_msg, "ساوند كلاود", url)
+        await deliver_media(message, loading_msg, "ساوند كلاود", url)
         
     except Exception as e:
         logging.error(f"خطأ في تحميل ساوند كلاود: {e}")
@@ -203,7 +200,7 @@ async def search_youtube(message: Message, query: str = None):
         
         # إضافة تسجيل للتصحيح
         current_setting = download_settings.get(chat_id, False)
-        logging.info(f"فحص إعدادات التحميل للمجموعة {chat_id}: {current_setting}. جميع الإعدادات: {download_settings}")
+        logger.debug("فحص إعدادات التحميل للمجموعة %s: %s", chat_id, current_setting)
         
         # التحقق من تفعيل التحميل
         if not current_setting:
@@ -234,39 +231,72 @@ async def search_youtube(message: Message, query: str = None):
         await message.reply("❌ حدث خطأ في البحث في يوتيوب")
 
 
+def is_platform_url(url: str, domains) -> bool:
+    """رابط https يكون مضيفه أحد نطاقات المنصة أو نطاقاً فرعياً منها (لا مجرد نص يحتوي اسمها)"""
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").rstrip(".")
+    except ValueError:
+        return False
+    if parts.scheme != "https" or not host:
+        return False
+    return any(host == domain or host.endswith(f".{domain}") for domain in domains)
+
+
 def is_valid_tiktok_url(url: str) -> bool:
     """التحقق من صحة رابط تيك توك"""
-    tiktok_domains = ['tiktok.com', 'vm.tiktok.com', 'www.tiktok.com']
-    return any(domain in url for domain in tiktok_domains)
+    return is_platform_url(url, ('tiktok.com',))
 
 
 def is_valid_twitter_url(url: str) -> bool:
     """التحقق من صحة رابط تويتر/X"""
-    twitter_domains = ['twitter.com', 'x.com', 'www.twitter.com', 'www.x.com']
-    return any(domain in url for domain in twitter_domains)
+    return is_platform_url(url, ('twitter.com', 'x.com'))
 
 
 def is_valid_soundcloud_url(url: str) -> bool:
     """التحقق من صحة رابط ساوند كلاود"""
-    soundcloud_domains = ['soundcloud.com', 'www.soundcloud.com']
-    return any(domain in url for domain in soundcloud_domains)
+    return is_platform_url(url, ('soundcloud.com',))
+
 
+async def deliver_media(message: Message, loading_msg: Message, platform: str, url: str):
+    """إرسال وسائط الرابط: بالمعرف المحفوظ إن وُجد، وإلا من المخزن أو بتحميل جديد"""
+    from modules.download_pipeline import DownloadError, media_downloader
+    from modules.file_cache import file_cache
 
-async def simulate_download(loading_msg: Message, platform: str, url: str):
-    """محاكاة عملية التحميل"""
+    key = f"media:{url}"
     try:
-        import asyncio
-        await asyncio.sleep(2)  # محاكاة وقت التحميل
-        
-        # في التطبيق الحقيقي، هنا سيتم استخدام مكتبة مثل yt-dlp
-        await loading_msg.edit_text(
-            f"❌ **عذراً، التحميل من {platform} غير متاح حالياً**\n\n"
-            f"🔗 الرابط: {url}\n"
-            f"💡 هذه الميزة تحتاج لإعداد إضافي من المطور"
-        )
-        
+        # الملف محمي من إخراج المخزن حتى تنتهي الكتلة بعد اكتمال رفعه
+        async with AsyncExitStack() as pinned:
+            field = file_cache.kind(key)
+            media = None
+            if field is None:
+                media = await pinned.enter_async_context(media_downloader.acquire(url))
+                field = media.field
+
+            # قد تُعطل المجموعة التحميل أثناء انتظار الطلب في الطابور
+            if not download_settings.get(message.chat.id, False):
+                await loading_msg.edit_text("❌ التحميل معطل في هذه المجموعة")
+                return
+
+            async def make_file():
+                fetched = media or await pinned.enter_async_context(media_downloader.acquire(url))
+                return FSInputFile(fetched.path)
+
+            senders = {
+                "video": message.reply_video,
+                "audio": message.reply_audio,
+                "photo": message.reply_photo,
+                "animation": message.reply_animation,
+                "document": message.reply_document
+            }
+            await file_cache.send(senders[field], field, key, "", make_file)
+        await loading_msg.delete()
+        logger.info("تم إرسال وسائط %s للمجموعة %s", platform, message.chat.id)
+
+    except DownloadError as e:
+        await loading_msg.edit_text(f"{e}\n\n🔗 الرابط: {url}")
     except Exception as e:
-        logging.error(f"خطأ في محاكاة التحميل: {e}")
+        logging.error(f"خطأ في تحميل وسائط {platform}: {e}")
         await loading_msg.edit_text("❌ حدث خطأ في عملية التحميل")
 
 
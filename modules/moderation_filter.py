@@ -0,0 +1,269 @@
+"""
+محرك فلترة الإشراف المترجم مسبقاً لكل مجموعة (الأقفال + الكلمات الممنوعة)
+Precompiled Per-Chat Moderation Filter (locks + forbidden words)
+"""
+
+import logging
+import re
+from collections import deque
+from enum import IntFlag
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+
+from aiogram.types import Message
+
+from database.operations import execute_query
+from modules.group_settings_cache import group_settings_cache
+
+
+class LockFlag(IntFlag):
+    """أنواع المحتوى القابلة للقفل (بت لكل نوع)"""
+    NONE = 0
+    PHOTOS = 1 << 0
+    VIDEO = 1 << 1
+    AUDIO = 1 << 2
+    STICKERS = 1 << 3
+    PREMIUM_STICKERS = 1 << 4
+    GIFS = 1 << 5
+    LINKS = 1 << 6
+    HASHTAGS = 1 << 7
+    MENTIONS = 1 << 8
+    FORWARDING = 1 << 9
+    INLINE = 1 << 10
+    CONTACTS = 1 << 11
+    WRITING = 1 << 12
+    LONG_MESSAGES = 1 << 13
+    PERSIAN = 1 << 14
+    EDIT = 1 << 15
+    MEDIA_EDIT = 1 << 16
+    CHAT = 1 << 17
+
+
+# ربط مفاتيح lock_* المحفوظة في group_settings بالبتات
+LOCK_KEY_FLAGS = {
+    "photos": LockFlag.PHOTOS,
+    "video": LockFlag.VIDEO,
+    "audio": LockFlag.AUDIO,
+    "stickers": LockFlag.STICKERS,
+    "premium_stickers": LockFlag.PREMIUM_STICKERS,
+    "gifs": LockFlag.GIFS,
+    "links": LockFlag.LINKS,
+    "hashtags": LockFlag.HASHTAGS,
+    "mentions": LockFlag.MENTIONS,
+    "forwarding": LockFlag.FORWARDING,
+    "inline": LockFlag.INLINE,
+    "contacts": LockFlag.CONTACTS,
+    "writing": LockFlag.WRITING,
+    "long_messages": LockFlag.LONG_MESSAGES,
+    "persian": LockFlag.PERSIAN,
+    "edit": LockFlag.EDIT,
+    "media_edit": LockFlag.MEDIA_EDIT,
+    "chat": LockFlag.CHAT,
+    "all": LockFlag(sum(LockFlag)),
+}
+
+LONG_MESSAGE_LIMIT = 800
+
+# حروف فارسية غير موجودة في العربية
+_PERSIAN_CHARS = re.compile("[پچژگکی]")
+_MEDIA_FLAGS = (LockFlag.PHOTOS | LockFlag.VIDEO | LockFlag.AUDIO | LockFlag.STICKERS
+                | LockFlag.GIFS | LockFlag.CONTACTS)
+
+
+class AhoCorasick:
+    """آلة Aho–Corasick للبحث عن جميع الكلمات الممنوعة في مرور واحد على النص"""
+
+    __slots__ = ("_goto", "_fail", "_out")
+
+    def __init__(self, words):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Optional[str]] = [None]
+
+        for word in words:
+            if not word:
+                continue
+            state = 0
+            for char in word:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(None)
+                state = next_state
+            self._out[state] = word
+
+        # بناء روابط الفشل بالعرض أولاً
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                candidate = self._goto[fail].get(char, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                if self._out[next_state] is None:
+                    self._out[next_state] = self._out[self._fail[next_state]]
+
+    def find_first(self, text: str) -> Optional[str]:
+        """إرجاع أول كلمة ممنوعة موجودة في النص أو None"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state] is not None:
+                return out[state]
+        return None
+
+
+class ChatFilter:
+    """فلتر مجموعة مترجم: قناع الأقفال وآلة الكلمات الممنوعة"""
+
+    __slots__ = ("source", "words_version", "lock_mask", "automaton")
+
+    def __init__(self, source: Mapping[str, str], words_version: int, words: Set[str]):
+        self.source = source
+        self.words_version = words_version
+        self.lock_mask = compile_lock_mask(source)
+        self.automaton = AhoCorasick(words) if words else None
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.lock_mask and self.automaton is None
+
+
+def compile_lock_mask(settings: Mapping[str, str]) -> LockFlag:
+    """تحويل إعدادات lock_* إلى قناع بتات"""
+    mask = LockFlag.NONE
+    for key, value in settings.items():
+        if key.startswith("lock_") and value == "True":
+            mask |= LOCK_KEY_FLAGS.get(key[5:], LockFlag.NONE)
+    return mask
+
+
+def classify_message(message: Message, edited: bool = False) -> LockFlag:
+    """حساب أنواع المحتوى الموجودة في الرسالة كقناع بتات"""
+    flags = LockFlag.CHAT
+    if message.photo:
+        flags |= LockFlag.PHOTOS
+    if message.video or message.video_note:
+        flags |= LockFlag.VIDEO
+    if message.audio or message.voice:
+        flags |= LockFlag.AUDIO
+    if message.sticker:
+        flags |= LockFlag.STICKERS
+        if message.sticker.premium_animation:
+            flags |= LockFlag.PREMIUM_STICKERS
+    if message.animation:
+        flags |= LockFlag.GIFS
+    if message.contact:
+        flags |= LockFlag.CONTACTS
+    if message.forward_origin:
+        flags |= LockFlag.FORWARDING
+    if message.via_bot:
+        flags |= LockFlag.INLINE
+
+    text = message.text or message.caption or ""
+    if message.text:
+        flags |= LockFlag.WRITING
+    if len(text) > LONG_MESSAGE_LIMIT:
+        flags |= LockFlag.LONG_MESSAGES
+    if text and _PERSIAN_CHARS.search(text):
+        flags |= LockFlag.PERSIAN
+
+    for entity in message.entities or message.caption_entities or ():
+        if entity.type in ("url", "text_link"):
+            flags |= LockFlag.LINKS
+        elif entity.type == "hashtag":
+            flags |= LockFlag.HASHTAGS
+        elif entity.type in ("mention", "text_mention"):
+            flags |= LockFlag.MENTIONS
+
+    if edited:
+        flags |= LockFlag.EDIT
+        if flags & _MEDIA_FLAGS:
+            flags |= LockFlag.MEDIA_EDIT
+    return flags
+
+
+class ModerationFilter:
+    """سجل الفلاتر المترجمة لكل مجموعة - يعاد البناء فقط عند تغير الإعدادات"""
+
+    def __init__(self):
+        self._words: Dict[int, Set[str]] = {}
+        self._words_version: Dict[int, int] = {}
+        self._compiled: Dict[int, ChatFilter] = {}
+
+    async def load(self) -> int:
+        """تحميل جميع الكلمات الممنوعة في استعلام واحد عند بدء التشغيل"""
+        rows = await execute_query(
+            "SELECT chat_id, word FROM forbidden_words UNION SELECT chat_id, word FROM banned_words",
+            fetch_all=True
+        )
+        if rows is None:
+            logging.error("خطأ في تحميل الكلمات الممنوعة")
+            return 0
+
+        words: Dict[int, Set[str]] = {}
+        for row in rows:
+            if row['word']:
+                words.setdefault(row['chat_id'], set()).add(row['word'].lower())
+        self._words = words
+        self._compiled.clear()
+        logging.info(f"تم تحميل {len(rows)} كلمة ممنوعة لـ {len(words)} مجموعة")
+        return len(rows)
+
+    def _touch_words(self, chat_id: int) -> None:
+        self._words_version[chat_id] = self._words_version.get(chat_id, 0) + 1
+
+    def add_word(self, chat_id: int, word: str) -> None:
+        """إضافة كلمة ممنوعة (بعد حفظها في قاعدة البيانات)"""
+        self._words.setdefault(chat_id, set()).add(word.lower())
+        self._touch_words(chat_id)
+
+    def remove_word(self, chat_id: int, word: str) -> None:
+        """إزالة كلمة ممنوعة (بعد حذفها من قاعدة البيانات)"""
+        self._words.get(chat_id, set()).discard(word.lower())
+        self._touch_words(chat_id)
+
+    def clear_words(self, chat_id: int) -> None:
+        """مسح جميع الكلمات الممنوعة للمجموعة"""
+        self._words.pop(chat_id, None)
+        self._touch_words(chat_id)
+
+    def get(self, chat_id: int) -> ChatFilter:
+        """الحصول على فلتر المجموعة المترجم وإعادة بنائه إذا تغيرت الإعدادات"""
+        settings = group_settings_cache.chat(chat_id)
+        words_version = self._words_version.get(chat_id, 0)
+        compiled = self._compiled.get(chat_id)
+        if compiled is None or compiled.source is not settings or compiled.words_version != words_version:
+            compiled = ChatFilter(settings, words_version, self._words.get(chat_id, set()))
+            self._compiled[chat_id] = compiled
+        return compiled
+
+    def check(self, chat_id: int, message: Message, edited: bool = False) -> Optional[Tuple[str, str]]:
+        """فحص الرسالة وإرجاع (السبب، التفاصيل) إذا كانت مخالفة"""
+        chat_filter = self.get(chat_id)
+        if chat_filter.is_empty:
+            return None
+
+        if chat_filter.lock_mask:
+            violated = classify_message(message, edited) & chat_filter.lock_mask
+            if violated:
+                return "lock", violated.name or str(int(violated))
+
+        if chat_filter.automaton is not None:
+            text = message.text or message.caption
+            if text:
+                word = chat_filter.automaton.find_first(text.lower())
+                if word:
+                    return "word", word
+        return None
+
+
+moderation_filter = ModerationFilter()
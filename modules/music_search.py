@@ -10,6 +10,8 @@ import os
 from typing import Optional, Dict, Any, List
 from aiogram.types import Message
 
+from utils.text_normalizer import normalized_text
+
 # قاموس الأغاني والروابط (يمكن توسيعه)
 MUSIC_DATABASE = {
     "جاب العيد": "https://www.youtube.com/watch?v=xRWJAusCpGU",
@@ -113,41 +115,20 @@ async def handle_eid_music_trigger(message: Message) -> bool:
         if not message.text:
             return False
         
-        text = message.text.lower().strip()
-        
         # البحث عن عبارة "جاب العيد"
-        if "جاب العيد" in text:
+        if normalized_text(message).contains("جاب العيد"):
             eid_url = MUSIC_DATABASE.get("جاب العيد")
             
             if eid_url:
-                # إرسال الموسيقى كملف صوتي بدلاً من الرابط
-                from aiogram.types import URLInputFile
+                # إرسال الموسيقى كملف صوتي بدلاً من الرابط (تُحمّل وتُرفع مرة واحدة فقط)
+                from modules.file_cache import file_cache
                 
                 try:
                     # إرسال الملف الصوتي مباشرة بدون نص
-                    from aiogram.types import InputFile, FSInputFile
-                    import aiohttp
-                    import tempfile
-                    import os
-                    
-                    # تحميل الملف مؤقتاً
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(eid_url) as response:
-                            if response.status == 200:
-                                # إنشاء ملف مؤقت
-                                with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_file:
-                                    temp_file.write(await response.read())
-                                    temp_path = temp_file.name
-                                
-                                # إرسال الملف الصوتي بدون أي نص
-                                audio_file = FSInputFile(temp_path)
-                                await message.reply_audio(audio=audio_file)
-                                
-                                # حذف الملف المؤقت
-                                os.unlink(temp_path)
-                            else:
-                                # فشل التحميل - أرسل رسالة بدون رابط
-                                await message.reply("🎵 العيد جاب العيد! 🎉")
+                    sent = await file_cache.send_url(message.reply_audio, 'audio', eid_url, filename='eid.mp3')
+                    if sent is None:
+                        # فشل التحميل - أرسل رسالة بدون رابط
+                        await message.reply("🎵 العيد جاب العيد! 🎉")
                     
                 except Exception as e:
                     logging.error(f"خطأ في إرسال موسيقى العيد: {e}")
@@ -173,25 +154,13 @@ async def handle_music_search(message: Message) -> bool:
         if not message.text:
             return False
         
-        text = message.text.strip()
-        
-        # البحث عن أوامر البحث عن الموسيقى
-        music_commands = [
-            'ابحث عن اغنية', 'ابحث اغنية', 'بحث اغنية', 'بحث عن اغنية',
+        # البحث عن أوامر البحث عن الموسيقى (الاستعلام يبقى كما كتبه المستخدم)
+        query = normalized_text(message).strip_prefix(
             'ابحث عن أغنية', 'ابحث أغنية', 'بحث أغنية', 'بحث عن أغنية',
-            'شغل اغنية', 'شغل أغنية', 'تشغيل اغنية', 'تشغيل أغنية'
-        ]
-        
-        found_command = None
-        query = None
-        
-        for cmd in music_commands:
-            if text.startswith(cmd):
-                found_command = cmd
-                query = text[len(cmd):].strip()
-                break
+            'شغل أغنية', 'تشغيل أغنية'
+        )
         
-        if not found_command or not query:
+        if not query:
             return False
         
         # البحث في قاعدة البيانات المحلية أولاً
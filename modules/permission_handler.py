@@ -10,6 +10,7 @@ from modules.permission_responses import (
     is_master_command, is_owner_command, is_moderator_command, 
     get_permission_denial_response
 )
+from utils.text_normalizer import normalized_text
 
 async def handle_permission_check(message: Message) -> bool:
     """
@@ -24,7 +25,7 @@ async def handle_permission_check(message: Message) -> bool:
     user_id = message.from_user.id
     group_id = message.chat.id if message.chat.type in ['group', 'supergroup'] else None
     user_level = get_user_admin_level(user_id, group_id)
-    text = message.text
+    text = normalized_text(message)
     
     try:
         # فحص أوامر الأسياد
@@ -4,7 +4,10 @@ Permission Denial Responses - Insulting and Degrading Messages
 """
 
 import random
+from typing import Union
+
 from config.hierarchy import MASTERS, AdminLevel, get_user_admin_level
+from utils.text_normalizer import NormalizedText, as_normalized
 
 # ردود مهينة للأعضاء العاديين الذين يحاولون الوصول لأوامر الأسياد
 MEMBER_TO_MASTER_RESPONSES = [
@@ -103,36 +106,29 @@ def get_permission_denial_response(user_id: int, group_id: int, attempted_level:
     # رد افتراضي
     return "❌ **ليس لديك صلاحية لهذا الأمر!**\n🚫 اعرف مكانك!"
 
-def is_master_command(text: str) -> bool:
+def is_master_command(text: Union[str, NormalizedText]) -> bool:
     """فحص إذا كان النص يحتوي على أمر من أوامر الأسياد"""
-    master_commands = [
+    return as_normalized(text).contains(
         'يوكي قم بإعادة التشغيل', 'يوكي اعد التشغيل', 'restart bot',
         'يوكي قم بإيقاف التشغيل', 'يوكي اوقف البوت', 'shutdown bot',
         'يوكي قم بالتدمير الذاتي', 'يوكي دمر المجموعة', 'self destruct',
         'يوكي قم بمغادرة المجموعة', 'يوكي اخرج', 'يوكي غادر',
         'يوكي رقي مالك مجموعة', 'رقية مالك',
         'يوكي نزل مالك المجموعة', 'تنزيل مالك',
-        'اضف فلوس', 'أضف فلوس', 'add money'
-    ]
-    text_lower = text.lower().strip()
-    return any(cmd in text_lower for cmd in master_commands)
+        'أضف فلوس', 'add money'
+    )
 
-def is_owner_command(text: str) -> bool:
+def is_owner_command(text: Union[str, NormalizedText]) -> bool:
     """فحص إذا كان النص يحتوي على أمر من أوامر مالكي المجموعات"""
-    owner_commands = [
-        'ترقية مشرف', 'تنزيل مشرف', 'رفع مشرف', 'تنزيل مشرف', 'رقي مشرف', 'نزل مشرف',
+    return as_normalized(text).contains(
+        'ترقية مشرف', 'تنزيل مشرف', 'رفع مشرف', 'رقي مشرف', 'نزل مشرف',
         'مسح الرتب', 'قائمة المشرفين', 'إعدادات المجموعة', 'رفع مدير', 'رفع ادمن',
         'تنزيل مدير', 'تنزيل ادمن', 'رفع منشئ', 'رفع مالك'
-    ]
-    text_lower = text.lower().strip()
-    return any(cmd in text_lower for cmd in owner_commands)
+    )
 
-def is_moderator_command(text: str) -> bool:
+def is_moderator_command(text: Union[str, NormalizedText]) -> bool:
     """فحص إذا كان النص يحتوي على أمر من أوامر المشرفين"""
-    moderator_commands = [
+    return as_normalized(text).contains(
         'حظر', 'طرد', 'كتم', 'تحذير', 'مسح', 'تنظيف',
-        'قفل', 'فتح', 'تفعيل', 'تعطيل', 'الغاء حظر', 'إلغاء حظر', 
-        'الغاء كتم', 'إلغاء كتم', 'المحظورين', 'المكتومين', 'الاعدادات'
-    ]
-    text_lower = text.lower().strip()
-    return any(cmd in text_lower for cmd in moderator_commands)
\ No newline at end of file
+        'قفل', 'فتح', 'تفعيل', 'تعطيل', 'المحظورين', 'المكتومين', 'الإعدادات'
+    )
\ No newline at end of file
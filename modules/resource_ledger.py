@@ -0,0 +1,131 @@
+"""
+دفتر موارد القلاع - فحص وخصم الموارد والمال ذرياً مع ذاكرة مؤقتة لكل مستخدم
+Castle Resource Ledger - atomic multi-resource debits with a per-user cache
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from config.database import connect_database
+from database.operations import execute_query
+
+# أعمدة جدول user_resources (المال "money" يُحفظ في رصيد users)
+RESOURCE_COLUMNS = ("gold", "stones", "workers")
+EMPTY_RESOURCES = {'money': 0, 'gold': 0, 'stones': 0, 'workers': 0}
+
+RESOURCE_CACHE_TTL = 30  # بالثواني
+_RESOURCE_CACHE: Dict[int, Tuple[float, Dict]] = {}
+
+
+def invalidate_resources(*user_ids: int) -> None:
+    """إسقاط موارد المستخدمين من الذاكرة المؤقتة بعد أي كتابة"""
+    for user_id in user_ids:
+        _RESOURCE_CACHE.pop(user_id, None)
+
+
+USER_RESOURCES_QUERY = "SELECT * FROM user_resources WHERE user_id = ?"
+
+
+async def get_resources(user_id: int) -> dict:
+    """قراءة موارد المستخدم من الذاكرة المؤقتة أو من قاعدة البيانات"""
+    cached = _RESOURCE_CACHE.get(user_id)
+    if cached and time.monotonic() - cached[0] < RESOURCE_CACHE_TTL:
+        return dict(cached[1])
+
+    result = await execute_query(
+        USER_RESOURCES_QUERY,
+        (user_id,),
+        fetch_one=True
+    )
+    if result:
+        resources = {key: result[key] or 0 for key in EMPTY_RESOURCES}
+    else:
+        # إنشاء موارد جديدة إذا لم تكن موجودة
+        await execute_query(
+            """
+            INSERT INTO user_resources (user_id, money, gold, stones, workers)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (user_id, 0, 0, 0, 0)
+        )
+        resources = dict(EMPTY_RESOURCES)
+
+    _RESOURCE_CACHE[user_id] = (time.monotonic(), resources)
+    return dict(resources)
+
+
+async def apply_resources(user_id: int, resources: Dict[str, float], cash: float = 0,
+                          transaction: Optional[Tuple[str, float, str]] = None,
+                          guarded: Iterable[Tuple[str, tuple]] = ()) -> bool:
+    """تطبيق تغييرات الموارد والمال في معاملة واحدة - تفشل كلها إذا نقص أي مورد"""
+    # resources: تغيير لكل مورد (سالب للخصم)، و"money" يُضاف إلى رصيد المستخدم
+    # transaction: (النوع، المبلغ، الوصف) تُسجل في transactions
+    # guarded: استعلامات إضافية يجب أن تعدل صفاً واحداً على الأقل وإلا أُلغيت المعاملة
+    cash += resources.get('money', 0)
+    deltas = [(column, resources.get(column, 0)) for column in RESOURCE_COLUMNS if resources.get(column)]
+    unknown = set(resources) - set(RESOURCE_COLUMNS) - {'money'}
+    if unknown:
+        logging.error(f"موارد غير معروفة: {unknown}")
+        return False
+
+    try:
+        async with connect_database() as db:
+            if deltas:
+                await db.execute(
+                    """
+                    INSERT INTO user_resources (user_id, money, gold, stones, workers)
+                    SELECT ?, 0, 0, 0, 0
+                    WHERE NOT EXISTS (SELECT 1 FROM user_resources WHERE user_id = ?)
+                    """,
+                    (user_id, user_id)
+                )
+                # فحص وخصم جميع الموارد في استعلام شرطي واحد - الشرط على الخصم فقط حتى لا يُرفض إيداع لرصيد سالب
+                assignments = ", ".join(f"{column} = COALESCE({column}, 0) + ?" for column, _ in deltas)
+                debits = [(column, delta) for column, delta in deltas if delta < 0]
+                conditions = "".join(f" AND COALESCE({column}, 0) + ? >= 0" for column, _ in debits)
+                cursor = await db.execute(
+                    f"UPDATE user_resources SET {assignments}, updated_at = ? WHERE user_id = ?{conditions}",
+                    (*(delta for _, delta in deltas), datetime.now().isoformat(), user_id,
+                     *(delta for _, delta in debits))
+                )
+                if cursor.rowcount == 0:
+                    await db.rollback()
+                    return False
+
+            if cash:
+                # الإيداع يُقبل حتى لرصيد سالب (غرامة سرقة فاشلة مثلاً)، والخصم لا يُنزل الرصيد تحت الصفر
+                guard = " AND balance + ? >= 0" if cash < 0 else ""
+                cursor = await db.execute(
+                    f"UPDATE users SET balance = balance + ?, updated_at = ? WHERE user_id = ?{guard}",
+                    (cash, datetime.now().isoformat(), user_id, *((cash,) if cash < 0 else ()))
+                )
+                if cursor.rowcount == 0:
+                    await db.rollback()
+                    return False
+
+            for query, params in guarded:
+                cursor = await db.execute(query, params)
+                if cursor.rowcount == 0:
+                    await db.rollback()
+                    return False
+
+            if transaction:
+                transaction_type, amount, description = transaction
+                await db.execute(
+                    """
+                    INSERT INTO transactions (user_id, transaction_type, amount, description, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (user_id, transaction_type, amount, description, datetime.now().isoformat())
+                )
+
+            await db.commit()
+            return True
+
+    except Exception as e:
+        logging.error(f"خطأ في تطبيق موارد المستخدم {user_id}: {e}")
+        return False
+    finally:
+        invalidate_resources(user_id)
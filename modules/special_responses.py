@@ -5,7 +5,9 @@ Special User Responses System
 
 import random
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
+
+from utils.text_normalizer import NormalizedText, as_normalized
 
 # الردود الخاصة لكل مستخدم
 SPECIAL_RESPONSES = {
@@ -109,42 +111,33 @@ TRIGGER_KEYWORDS = {
 }
 
 
-def get_response(user_id: int, message_text: str = "") -> Optional[str]:
+def get_response(user_id: int, message_text: Union[str, NormalizedText] = "") -> Optional[str]:
     """
     الحصول على رد مناسب للمستخدم (خاص أو عام)
     
     Args:
         user_id: معرف المستخدم
-        message_text: نص الرسالة للتحقق من وجود كلمات مفتاحية
+        message_text: نص الرسالة (أو نصها المطبّع من المعالج) للتحقق من وجود كلمات مفتاحية
         
     Returns:
         نص الرد المناسب أو None
     """
     try:
-        message_lower = message_text.lower().strip()
+        text = as_normalized(message_text)
         
         # تجاهل الرسائل التي تحتوي على أوامر إدارية أو أوامر خاصة
-        admin_keywords = [
+        if text.contains(
             "قم بإعادة التشغيل", "اعد التشغيل", "قم بالتدمير الذاتي", "دمر المجموعة",
             "قم بمغادرة المجموعة", "اخرج", "غادر", "رقي مالك مجموعة", "نزل مالك",
             "ترقية مشرف", "تنزيل مشرف", "restart", "self destruct", "leave"
-        ]
-        
-        if any(admin_cmd in message_lower for admin_cmd in admin_keywords):
+        ):
             return None
         
         # تحديد نوع الرد المطلوب - يجب أن تكون الكلمة منفصلة أو في بداية/نهاية الجملة
         response_type = None
         for msg_type, keywords in TRIGGER_KEYWORDS.items():
-            for keyword in keywords:
-                # فحص أدق: الكلمة يجب أن تكون منفصلة أو في بداية/نهاية الجملة
-                if (message_lower == keyword or 
-                    message_lower.startswith(keyword + " ") or 
-                    message_lower.endswith(" " + keyword) or
-                    f" {keyword} " in message_lower):
-                    response_type = msg_type
-                    break
-            if response_type:
+            if text.has_phrase(*keywords):
+                response_type = msg_type
                 break
         
         if not response_type:
@@ -167,7 +160,7 @@ def get_response(user_id: int, message_text: str = "") -> Optional[str]:
         return None
 
 
-def get_special_response(user_id: int, message_text: str = "") -> Optional[str]:
+def get_special_response(user_id: int, message_text: Union[str, NormalizedText] = "") -> Optional[str]:
     """للتوافق مع الكود القديم"""
     return get_response(user_id, message_text)
 
@@ -762,16 +762,20 @@ async def get_current_stock_prices():
         return {symbol: info['base_price'] for symbol, info in GAME_STOCKS.items()}
 
 
+USER_STOCK_QUERY = "SELECT * FROM stocks WHERE user_id = ? AND symbol = ?"
+USER_STOCKS_QUERY = "SELECT * FROM stocks WHERE user_id = ? ORDER BY id DESC"
+
+
 async def get_user_stocks(user_id: int, symbol: str = None):
     """الحصول على أسهم المستخدم"""
     try:
         if symbol:
-            query = "SELECT * FROM stocks WHERE user_id = ? AND symbol = ?"
+            query = USER_STOCK_QUERY
             params = (user_id, symbol)
             stocks = await execute_query(query, params, fetch_one=True)
             return stocks if stocks else None
         else:
-            query = "SELECT * FROM stocks WHERE user_id = ? ORDER BY id DESC"
+            query = USER_STOCKS_QUERY
             params = (user_id,)
             stocks = await execute_query(query, params, fetch_all=True)
             return stocks if stocks else []
@@ -786,7 +790,7 @@ async def add_user_stocks(user_id: int, symbol: str, quantity: int, price: float
     try:
         # التحقق من وجود أسهم مماثلة
         existing = await execute_query(
-            "SELECT * FROM stocks WHERE user_id = ? AND symbol = ?",
+            USER_STOCK_QUERY,
             (user_id, symbol),
             fetch_one=True
         )
@@ -819,7 +823,7 @@ async def remove_user_stocks(user_id: int, symbol: str, quantity: int):
     """إزالة أسهم من محفظة المستخدم"""
     try:
         existing = await execute_query(
-            "SELECT * FROM stocks WHERE user_id = ? AND symbol = ?",
+            USER_STOCK_QUERY,
             (user_id, symbol),
             fetch_one=True
         )
@@ -8,7 +8,10 @@ import random
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
-from database.operations import get_user, update_user_balance, execute_query, add_transaction
+from database.operations import (
+    get_user, update_user_balance, execute_query, add_transaction,
+    record_theft_success, record_theft_failure
+)
 from utils.states import TheftStates
 from utils.helpers import format_number, parse_user_mention
 from config.settings import GAME_SETTINGS
@@ -166,17 +169,16 @@ async def handle_successful_theft(message: Message, thief: dict, target: dict, t
         new_thief_balance = thief['balance'] + stolen_amount
         new_target_balance = target['balance'] - stolen_amount
         
-        await update_user_balance(message.from_user.id, new_thief_balance)
-        await update_user_balance(target_user_id, new_target_balance)
-        
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=target_user_id,
-            to_user_id=message.from_user.id,
-            transaction_type="theft_success",
-            amount=stolen_amount,
-            description=f"سرقة ناجحة من {target.get('username', 'مجهول')}"
+        # نقل المبلغ وتحديث العدادات وتسجيل المعاملة في معاملة واحدة
+        recorded = await record_theft_success(
+            message.from_user.id,
+            target_user_id,
+            stolen_amount,
+            f"سرقة ناجحة من {target.get('username', 'مجهول')}"
         )
+        if not recorded:
+            await message.reply("😅 المستخدم المستهدف لم يعد يملك هذا المبلغ!")
+            return
         
         # رسائل التهنئة المتنوعة
         success_messages = [
@@ -228,15 +230,12 @@ async def handle_failed_theft(message: Message, thief: dict, target: dict, targe
         
         new_thief_balance = thief['balance'] - penalty
         
-        await update_user_balance(message.from_user.id, new_thief_balance)
-        
-        # إضافة معاملة
-        await add_transaction(
-            from_user_id=message.from_user.id,
-            to_user_id=0,  # النظام
-            transaction_type="theft_failed",
-            amount=penalty,
-            description="غرامة فشل السرقة"
+        # خصم الغرامة وتحديث العداد وتسجيل المعاملة في معاملة واحدة
+        await record_theft_failure(
+            message.from_user.id,
+            target_user_id,
+            penalty,
+            "غرامة فشل السرقة"
         )
         
         # رسائل الفشل المتنوعة
@@ -371,34 +370,22 @@ async def show_upgrade_options(message: Message):
         await message.reply("❌ حدث خطأ في عرض خيارات الترقية")
 
 
+THEFT_STATS_QUERY = "SELECT successful_thefts, failed_thefts, times_stolen FROM users WHERE user_id = ?"
+
+
 async def get_theft_stats(user_id: int):
-    """الحصول على إحصائيات السرقة للمستخدم"""
+    """الحصول على إحصائيات السرقة للمستخدم (عدادات محدثة ذرياً مع كل سرقة)"""
     try:
-        # حساب السرقات الناجحة
-        successful = await execute_query(
-            "SELECT COUNT(*) as count FROM transactions WHERE user_id = ? AND transaction_type = 'theft_success'",
+        stats = await execute_query(
+            THEFT_STATS_QUERY,
             (user_id,),
             fetch_one=True
         )
         
-        # حساب السرقات الفاشلة
-        failed = await execute_query(
-            "SELECT COUNT(*) as count FROM transactions WHERE user_id = ? AND transaction_type = 'theft_failed'",
-            (user_id,),
-            fetch_one=True
-        )
-        
-        # حساب مرات التعرض للسرقة (عندما يكون هذا المستخدم ضحية)
-        stolen = await execute_query(
-            "SELECT COUNT(*) as count FROM transactions WHERE description LIKE ? AND transaction_type = 'theft_success'",
-            (f'%سرقة من {user_id}%',),
-            fetch_one=True
-        )
-        
         return {
-            'successful_thefts': successful['count'] if successful else 0,
-            'failed_thefts': failed['count'] if failed else 0,
-            'times_stolen': stolen['count'] if stolen else 0
+            'successful_thefts': (stats['successful_thefts'] or 0) if stats else 0,
+            'failed_thefts': (stats['failed_thefts'] or 0) if stats else 0,
+            'times_stolen': (stats['times_stolen'] or 0) if stats else 0
         }
         
     except Exception as e:
@@ -576,20 +563,21 @@ async def show_theft_stats(message: Message):
         await message.reply("❌ حدث خطأ في عرض الإحصائيات")
 
 
+TOP_THIEVES_QUERY = """
+    SELECT username, first_name, successful_thefts as thefts
+    FROM users
+    WHERE successful_thefts > 0
+    ORDER BY successful_thefts DESC
+    LIMIT 10
+"""
+
+
 async def show_top_thieves(message: Message):
     """عرض أفضل اللصوص"""
     try:
-        # الحصول على أفضل اللصوص من المعاملات
+        # الحصول على أفضل اللصوص من العدادات المفهرسة
         top_thieves = await execute_query(
-            """
-            SELECT users.username, users.first_name, COUNT(*) as thefts
-            FROM transactions 
-            JOIN users ON transactions.user_id = users.user_id
-            WHERE transactions.transaction_type = 'theft_success'
-            GROUP BY transactions.user_id
-            ORDER BY thefts DESC
-            LIMIT 10
-            """,
+            TOP_THIEVES_QUERY,
             (),
             fetch_all=True
         )
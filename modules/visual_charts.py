@@ -238,6 +238,37 @@ class TextChartGenerator:
         return result
 
 
+    @staticmethod
+    def create_activity_trends_chart(trends: Dict[str, Dict[str, int]], width: int = 15) -> str:
+        """رسم اتجاهات النشاط كما تعيدها GroupAnalytics.get_activity_trends (الأحدث أولاً)"""
+        if not trends:
+            return "❌ لا توجد بيانات متاحة\n"
+        
+        dates = sorted(trends.keys(), reverse=True)
+        max_activity = max(trends[date]['active_users'] for date in dates)
+        
+        chart = ""
+        for date in dates:
+            active_users = trends[date]['active_users']
+            transactions = trends[date]['transactions']
+            bar_length = int((active_users / max_activity) * width) if max_activity > 0 else 0
+            bar = "█" * bar_length + "░" * (width - bar_length)
+            chart += f"{date[5:]}: {bar} {active_users} مستخدم, {transactions} معاملة\n"
+        
+        return chart
+
+    @staticmethod
+    def create_trend_sparklines(trends: Dict[str, Dict[str, int]]) -> str:
+        """خطوط صغيرة لكل مقياس من اتجاهات النشاط (الأقدم إلى الأحدث)"""
+        dates = sorted(trends.keys())
+        active = [trends[date]['active_users'] for date in dates]
+        transactions = [trends[date]['transactions'] for date in dates]
+        return (
+            TextChartGenerator.create_sparkline(active, "النشطون") + "\n" +
+            TextChartGenerator.create_sparkline(transactions, "المعاملات")
+        )
+
+
 class DashboardStats:
     """إحصائيات لوحة التحكم المتقدمة"""
     
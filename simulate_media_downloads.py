@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+محاكاة خط تحميل الوسائط أمام خادم HTTP محلي يقدم ملفات وسائط
+Media Download Simulation - pipeline against a local HTTP stub serving media files
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Audio, Chat, InputFile, Message, User, Video
+
+import config.database
+import config.settings
+from config.settings import MEDIA_DOWNLOAD_SETTINGS
+
+FAKE_TOKEN = "123456:MEDIA-SIMULATION"
+MB = 1024 * 1024
+
+
+def build_stub(hits: Counter, delay: float) -> web.Application:
+    """خادم يقدم مقطع فيديو وملفاً صوتياً وملفاً ضخماً بلا طول وصفحة HTML ومقطعاً بطيئاً"""
+    payloads = {
+        "clip.mp4": (os.urandom(3 * MB), "video/mp4"),
+        "song.mp3": (os.urandom(2 * MB), "audio/mpeg"),
+        "mirror.mp4": (None, "video/mp4"),  # نفس محتوى clip.mp4 من رابط آخر
+    }
+    payloads["mirror.mp4"] = (payloads["clip.mp4"][0], "video/mp4")
+
+    async def serve(request: web.Request) -> web.StreamResponse:
+        name = request.match_info["name"]
+        hits[name] += 1
+        if name == "moved.mp4":
+            raise web.HTTPFound("/clip.mp4")
+        if name == "page.html":
+            return web.Response(text="<html>not media</html>", content_type="text/html")
+        if name == "slow.mp4":
+            await asyncio.sleep(delay)
+            return web.Response(body=b"late", content_type="video/mp4")
+        if name == "huge.mp4":
+            # بدون Content-Length حتى يُكتشف تجاوز الحد أثناء التدفق
+            response = web.StreamResponse(headers={"Content-Type": "video/mp4"})
+            response.enable_chunked_encoding()
+            await response.prepare(request)
+            for _ in range(64):
+                await response.write(os.urandom(MB))
+            await response.write_eof()
+            return response
+        body, content_type = payloads[name]
+        # بطء بسيط حتى تتداخل الطلبات المتزامنة لنفس الرابط
+        await asyncio.sleep(0.2)
+        return web.Response(body=body, content_type=content_type)
+
+    app = web.Application()
+    app.router.add_get("/{name}", serve)
+    return app
+
+
+class UploadSession(BaseSession):
+    """جلسة تيليجرام مزيفة تعد الرفع الحقيقي مقابل الإرسال بالمعرف"""
+
+    def __init__(self):
+        super().__init__()
+        self.uploads = 0
+        self.by_file_id = 0
+
+    async def make_request(self, bot: Bot, method, timeout: int = None):
+        field = next((name for name in ("video", "audio", "photo", "animation", "document")
+                      if getattr(method, name, None) is not None), None)
+        extra = {}
+        if field is not None:
+            value = getattr(method, field)
+            if isinstance(value, InputFile):
+                self.uploads += 1
+            else:
+                self.by_file_id += 1
+            media_id = value if isinstance(value, str) else f"FILE{self.uploads}"
+            if field == "video":
+                extra["video"] = Video(file_id=media_id, file_unique_id=media_id, width=1, height=1, duration=1)
+            elif field == "audio":
+                extra["audio"] = Audio(file_id=media_id, file_unique_id=media_id, duration=1)
+        if method.__returning__ is bool:
+            return True
+        return Message(message_id=1, date=datetime.now(), chat=Chat(id=-100, type="supergroup"),
+                       text=getattr(method, "text", None), **extra).as_(bot)
+
+    async def stream_content(self, *args, **kwargs):
+        return
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+async def strict_attempt(downloader, url: str, error_type):
+    try:
+        return await downloader.fetch(url)
+    except error_type as e:
+        return e
+
+
+def report(label: str, ok: bool, detail: str = "") -> bool:
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+async def simulate(args) -> bool:
+    hits = Counter()
+    runner = web.AppRunner(build_stub(hits, args.timeout * 3))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    # الخادم المحلي على 127.0.0.1 فيُسمح بالعناوين الداخلية إلا في سيناريو الرفض
+    MEDIA_DOWNLOAD_SETTINGS.update(
+        cache_dir=os.path.join(args.tmp, "media_cache"), timeout=args.timeout,
+        max_file_bytes=8 * MB, max_cache_bytes=4 * MB, workers=2, queue_size=3,
+        allow_private_hosts=True
+    )
+    from modules.download_pipeline import DownloadError, MediaDownloader
+
+    ok = True
+    downloader = MediaDownloader(MEDIA_DOWNLOAD_SETTINGS)
+
+    async def attempt(url: str):
+        try:
+            return await downloader.fetch(url)
+        except DownloadError as e:
+            return e
+
+    # طلب واحد للخادم مهما تكرر الرابط في نفس اللحظة
+    started = time.perf_counter()
+    results = await asyncio.gather(*(attempt(f"{base}/clip.mp4") for _ in range(args.concurrent)))
+    paths = {result.path for result in results if not isinstance(result, Exception)}
+    ok &= report("طلب واحد لكل رابط", hits["clip.mp4"] == 1 and len(paths) == 1,
+                 f"{args.concurrent} طلب متزامن ← {hits['clip.mp4']} تحميل في {time.perf_counter() - started:.2f}s")
+
+    await downloader.fetch(f"{base}/clip.mp4")
+    ok &= report("تكرار الرابط من المخزن", hits["clip.mp4"] == 1, f"إصابات المخزن: {downloader.cache_hits}")
+
+    moved = await downloader.fetch(f"{base}/moved.mp4")
+    ok &= report("اتباع التحويلات", moved.path in paths, f"clip.mp4 حُمّل {hits['clip.mp4']} مرة")
+
+    mirror = await downloader.fetch(f"{base}/mirror.mp4")
+    ok &= report("المحتوى المكرر يُخزن مرة واحدة", mirror.path in paths, os.path.basename(mirror.path))
+
+    huge = await attempt(f"{base}/huge.mp4")
+    ok &= report("حد الحجم أثناء التدفق", isinstance(huge, DownloadError), str(huge))
+
+    page = await attempt(f"{base}/page.html")
+    ok &= report("رفض الروابط التي ليست وسائط", isinstance(page, DownloadError), str(page))
+
+    slow = await attempt(f"{base}/slow.mp4")
+    ok &= report("حد الزمن", isinstance(slow, DownloadError), str(slow))
+
+    song = await downloader.fetch(f"{base}/song.mp3")
+    ok &= report("الإخراج الأقدم استخداماً عند تجاوز حجم المخزن",
+                 downloader.cached(f"{base}/clip.mp4") is None and os.path.exists(song.path),
+                 f"{downloader.stats()['bytes'] // MB}MB في {downloader.stats()['files']} ملف")
+
+    # ملف قيد الإرسال لا يُحذف حتى لو أصبح الأقدم استخداماً
+    async with downloader.acquire(f"{base}/song.mp3") as sending:
+        await downloader.fetch(f"{base}/clip.mp4")
+        await asyncio.sleep(0.05)  # الحذف يتم في خيط منفصل
+        kept = os.path.exists(sending.path)
+    ok &= report("عدم إخراج الملفات قيد الإرسال",
+                 kept and downloader.cached(f"{base}/song.mp3") is None,
+                 f"بعد انتهاء الإرسال: {downloader.stats()['files']} ملف")
+
+    leftovers = [name for _, _, names in os.walk(MEDIA_DOWNLOAD_SETTINGS["cache_dir"])
+                 for name in names if name.endswith(".part")]
+    ok &= report("لا ملفات جزئية متبقية", not leftovers)
+
+    # امتلاء الطابور: عاملان مشغولان بمقطعين بطيئين وثلاثة في الانتظار
+    burst = await asyncio.gather(*(attempt(f"{base}/slow.mp4?n={i}") for i in range(8)))
+    busy = sum(isinstance(result, DownloadError) and "مزدحمة" in str(result) for result in burst)
+    ok &= report("رفض الطلبات عند امتلاء الطابور", busy == 3, f"{busy} من 8")
+    await downloader.close()
+
+    # بدون السماح بالعناوين الداخلية: رفض الاتصال بالخادم المحلي قبل أي طلب
+    strict = MediaDownloader(dict(MEDIA_DOWNLOAD_SETTINGS, allow_private_hosts=False,
+                                  cache_dir=os.path.join(args.tmp, "strict_cache")))
+    before = sum(hits.values())
+    blocked = [await strict_attempt(strict, url, DownloadError)
+               for url in (f"{base}/song.mp3", "http://[::ffff:127.0.0.1]:1/x", "http://10.0.0.1/x")]
+    ok &= report("رفض العناوين الداخلية",
+                 all(isinstance(result, DownloadError) for result in blocked) and sum(hits.values()) == before,
+                 str(blocked[0]))
+    await strict.close()
+
+    # المسار الكامل عبر معالج المجموعة: رفع مرة ثم إعادة استخدام file_id
+    import modules.download_pipeline as pipeline
+    from modules import media_download
+    from modules.file_cache import file_cache
+    from config.database import init_database
+
+    await init_database()
+    await file_cache.load()
+    pipeline.media_downloader = MediaDownloader(MEDIA_DOWNLOAD_SETTINGS)
+    session = UploadSession()
+    bot = Bot(token=FAKE_TOKEN, session=session)
+    chat = Chat(id=-100, type="supergroup", title="Media")
+    media_download.download_settings[chat.id] = True
+
+    def group_message(text: str) -> Message:
+        return Message(message_id=1, date=datetime.now(), chat=chat, text=text,
+                       from_user=User(id=1, is_bot=False, first_name="u")).as_(bot)
+
+    # روابط تحتوي اسم المنصة كنص فقط لا تمر من فحص الرابط
+    before = sum(hits.values())
+    spoofed = f"{base}/song.mp3?tiktok.com"
+    await media_download.download_tiktok(group_message(f"تيك {spoofed}"), url=spoofed)
+    ok &= report("رفض الروابط المنتحلة لاسم المنصة", sum(hits.values()) == before and session.uploads == 0)
+
+    # التسليم نفسه بعد فحص الرابط (الخادم المحلي ليس تيك توك)
+    url = f"{base}/song.mp3"
+    for _ in range(3):
+        message = group_message(f"تيك {url}")
+        await media_download.deliver_media(message, await message.reply("⏳"), "تيك توك", url)
+    ok &= report("إعادة الإرسال بالمعرف المحفوظ", session.uploads == 1 and session.by_file_id == 2,
+                 f"رفع {session.uploads}، بالمعرف {session.by_file_id}، تحميل {hits['song.mp3']}")
+
+    media_download.download_settings[chat.id] = False
+    before = sum(hits.values())
+    await media_download.download_tiktok(group_message("تيك https://www.tiktok.com/@u/video/1"))
+    ok &= report("احترام تعطيل التحميل في المجموعة", sum(hits.values()) == before)
+
+    await pipeline.media_downloader.close()
+    await runner.cleanup()
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="محاكاة خط تحميل الوسائط")
+    parser.add_argument("--concurrent", type=int, default=10, help="طلبات متزامنة لنفس الرابط")
+    parser.add_argument("--timeout", type=float, default=1.0, help="حد زمن التحميل بالثواني")
+    args = parser.parse_args()
+
+    # الخادم المحلي يسجل قطع الاتصال المتوقع عند تجاوز حد الحجم
+    logging.getLogger().setLevel(logging.ERROR)
+    logging.getLogger("aiohttp").setLevel(logging.CRITICAL)
+
+    args.tmp = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(args.tmp, "media.db")
+        shutil.copy(config.settings.DATABASE_URL, db_path)
+        config.database.DATABASE_URL = db_path
+        config.settings.DATABASE_URL = db_path
+        return 0 if asyncio.run(simulate(args)) else 1
+    finally:
+        shutil.rmtree(args.tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
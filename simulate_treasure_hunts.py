@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+محاكاة البحث عن الكنز لموازنة الاقتصاد وقياس سرعة السحب
+Treasure Hunt Simulation - economy balancing and roll throughput
+"""
+
+import argparse
+import random
+import time
+
+from modules.castle import RESOURCE_INFO, TREASURE_HUNT_TYPES, TREASURE_LOOT_TABLE
+
+
+def legacy_roll(rng: random.Random) -> dict:
+    """السحب القديم: إعادة حساب مجموع الاحتمالات والمرور الخطي في كل بحث"""
+    total_chance = sum(hunt_type['chance'] for hunt_type in TREASURE_HUNT_TYPES.values())
+    random_num = rng.randint(1, total_chance)
+    cumulative_chance = 0
+    for hunt_type, hunt_info in TREASURE_HUNT_TYPES.items():
+        cumulative_chance += hunt_info['chance']
+        if random_num <= cumulative_chance:
+            if hunt_type == 'nothing':
+                return {"found": False, "resources": {}, "hunt_type": "nothing"}
+            if hunt_type == 'single_resource':
+                resource_chance = sum(res['chance'] for res in hunt_info['resources'].values())
+                resource_random = rng.randint(1, resource_chance)
+                resource_cumulative = 0
+                for resource_type, resource_info in hunt_info['resources'].items():
+                    resource_cumulative += resource_info['chance']
+                    if resource_random <= resource_cumulative:
+                        amount = rng.randint(resource_info['min'], resource_info['max'])
+                        return {"found": True, "resources": {resource_type: amount}, "hunt_type": "single"}
+            selected_combo = rng.choice(hunt_info['combinations'])
+            resources_found = {}
+            for resource_type in selected_combo['resources']:
+                base_info = RESOURCE_INFO[resource_type]
+                multiplier = selected_combo['multiplier']
+                resources_found[resource_type] = rng.randint(
+                    int(base_info['min'] * multiplier), int(base_info['max'] * multiplier)
+                )
+            return {"found": True, "resources": resources_found, "hunt_type": hunt_type.replace('_resource', '')}
+    return {"found": False, "resources": {}, "hunt_type": "nothing"}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="محاكاة البحث عن الكنز")
+    parser.add_argument("--hunts", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    for _ in range(args.hunts):
+        legacy_roll(rng)
+    legacy_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.hunts):
+        TREASURE_LOOT_TABLE.roll(rng)
+    roll_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    stats = TREASURE_LOOT_TABLE.simulate(args.hunts, rng)
+    batch_elapsed = time.perf_counter() - started
+
+    print(f"القديم:  {legacy_elapsed:.2f}s")
+    print(f"المترجم: {roll_elapsed:.2f}s  ({legacy_elapsed / roll_elapsed:.2f}x)")
+    print(f"الدفعة:  {batch_elapsed:.2f}s  ({legacy_elapsed / batch_elapsed:.2f}x)")
+    print()
+    print(f"نسبة العثور على كنز: {stats['found_rate'] * 100:.1f}%")
+    for hunt_type, count in sorted(stats['by_type'].items(), key=lambda item: -item[1]):
+        print(f"  {hunt_type}: {count / args.hunts * 100:.1f}%")
+    print("متوسط الموارد لكل بحث:")
+    for resource_type, average in stats['average_per_hunt'].items():
+        print(f"  {RESOURCE_INFO[resource_type]['emoji']} {RESOURCE_INFO[resource_type]['name']}: {average:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+موجه الـ callbacks - جدول توجيه حسب البادئة مع بيانات مضغوطة ومرقمة الإصدار
+Callback Router - prefix dispatch table with packed, versioned callback data
+"""
+
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram.types import CallbackQuery
+from aiogram.fsm.context import FSMContext
+
+# صيغة البيانات: {prefix}:{version}:{payload}
+CALLBACK_SEPARATOR = ":"
+CALLBACK_VERSION = 1
+MAX_CALLBACK_BYTES = 64  # حد تيليجرام لـ callback_data
+
+CallbackHandler = Callable[[CallbackQuery, str, FSMContext], Awaitable[None]]
+
+
+def pack_callback(prefix: str, *parts, version: int = CALLBACK_VERSION) -> str:
+    """بناء callback_data مضغوطة: البادئة ثم الإصدار ثم أجزاء الحمولة"""
+    data = CALLBACK_SEPARATOR.join([prefix, str(version), *(str(part) for part in parts)])
+    if len(data.encode("utf-8")) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"callback_data أطول من {MAX_CALLBACK_BYTES} بايت: {data}")
+    return data
+
+
+def unpack_callback(data: str) -> Optional[Tuple[str, int, str]]:
+    """تفكيك callback_data إلى (البادئة، الإصدار، الحمولة) أو None إذا لم تكن بالصيغة المضغوطة"""
+    parts = (data or "").split(CALLBACK_SEPARATOR, 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        return None
+    return parts[0], int(parts[1]), parts[2] if len(parts) == 3 else ""
+
+
+class CallbackRouter:
+    """جدول توجيه الـ callbacks: قاموس من البادئة إلى المعالج وإصداره"""
+
+    def __init__(self):
+        self._handlers: Dict[str, Tuple[CallbackHandler, int]] = {}
+
+    def register(self, prefix: str, handler: CallbackHandler, version: int = CALLBACK_VERSION) -> None:
+        """تسجيل معالج لبادئة (المعالج يستقبل الحمولة بعد البادئة والإصدار)"""
+        if CALLBACK_SEPARATOR in prefix:
+            raise ValueError(f"البادئة لا يجب أن تحتوي على '{CALLBACK_SEPARATOR}': {prefix}")
+        if prefix in self._handlers:
+            logging.warning(f"إعادة تسجيل معالج callbacks للبادئة: {prefix}")
+        self._handlers[prefix] = (handler, version)
+
+    async def dispatch(self, callback: CallbackQuery, state: FSMContext) -> bool:
+        """توجيه الـ callback لمعالجه بقراءة واحدة من القاموس (False إذا لم يوجد معالج)"""
+        unpacked = unpack_callback(callback.data)
+        if unpacked is None:
+            return False
+
+        prefix, version, payload = unpacked
+        entry = self._handlers.get(prefix)
+        if entry is None:
+            return False
+
+        handler, current_version = entry
+        if version != current_version:
+            # زر من قائمة أُرسلت قبل تغيير صيغة الحمولة
+            await callback.answer("⚠️ هذه القائمة قديمة، افتحها من جديد", show_alert=True)
+            return True
+
+        await handler(callback, payload, state)
+        return True
+
+
+callback_router = CallbackRouter()
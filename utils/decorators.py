@@ -10,6 +10,7 @@ from typing import Union, Callable, Any
 
 from database.operations import get_user, is_user_banned, update_user_activity
 from config.settings import ADMIN_IDS, SYSTEM_MESSAGES
+from utils.throttling import TokenBucketLimiter
 
 
 def group_only(func: Callable) -> Callable:
@@ -144,14 +145,12 @@ def admin_required(func: Callable) -> Callable:
 def rate_limit(max_calls: int = 5, window_seconds: int = 60):
     """ديكوريتر لتحديد معدل الاستخدام"""
     def decorator(func: Callable) -> Callable:
-        # قاموس لتتبع استخدام المستخدمين
-        user_calls = {}
+        # دلو رموز لكل مستخدم بحجم ثابت بدل قائمة أوقات تنمو بلا حد
+        limiter = TokenBucketLimiter(max_calls / window_seconds, max_calls, max_keys=10000)
         
         @wraps(func)
         async def wrapper(message_or_query: Union[Message, CallbackQuery], *args, **kwargs):
             try:
-                import time
-                
                 # تحديد المستخدم
                 if isinstance(message_or_query, CallbackQuery):
                     user_id = message_or_query.from_user.id
@@ -160,28 +159,15 @@ def rate_limit(max_calls: int = 5, window_seconds: int = 60):
                     user_id = message_or_query.from_user.id
                     chat_method = message_or_query.reply
                 
-                current_time = time.time()
-                
-                # تنظيف السجلات القديمة
-                if user_id in user_calls:
-                    user_calls[user_id] = [
-                        call_time for call_time in user_calls[user_id]
-                        if current_time - call_time < window_seconds
-                    ]
-                else:
-                    user_calls[user_id] = []
-                
                 # التحقق من تجاوز الحد المسموح
-                if len(user_calls[user_id]) >= max_calls:
+                if not limiter.consume(user_id):
+                    retry_after = max(1, round(limiter.retry_after(user_id)))
                     await chat_method(
                         f"⏰ لقد تجاوزت الحد المسموح من الاستخدام\n\n"
-                        f"يمكنك المحاولة مرة أخرى خلال {window_seconds} ثانية"
+                        f"يمكنك المحاولة مرة أخرى خلال {retry_after} ثانية"
                     )
                     return
                 
-                # إضافة الاستدعاء الحالي
-                user_calls[user_id].append(current_time)
-                
                 # تنفيذ الدالة الأصلية
                 return await func(message_or_query, *args, **kwargs)
                 
@@ -10,6 +10,8 @@ from datetime import datetime, timedelta
 from typing import Optional, Union, List, Dict, Any
 from aiogram.types import Message, User
 
+from utils.throttling import TokenBucketLimiter
+
 
 def format_number(number: Union[int, float]) -> str:
     """تنسيق الأرقام مع فواصل الآلاف"""
@@ -446,9 +448,12 @@ def clamp(value: Union[int, float], min_val: Union[int, float], max_val: Union[i
         return min_val
 
 
-def setup_logging(level: str = "INFO", log_file: str = "bot.log"):
-    """إعداد نظام التسجيل"""
+def setup_logging(level: str = "INFO", log_file: str = None):
+    """إعداد نظام التسجيل عبر طابور وخيط كتابة منفصل"""
     try:
+        from config.settings import LOGGING_SETTINGS
+        from utils.log_pipeline import setup_queue_logging
+
         # تحديد مستوى التسجيل
         log_levels = {
             "DEBUG": logging.DEBUG,
@@ -460,33 +465,19 @@ def setup_logging(level: str = "INFO", log_file: str = "bot.log"):
         
         log_level = log_levels.get(level.upper(), logging.INFO)
         
-        # إعداد التنسيق
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        listener = setup_queue_logging(
+            log_level,
+            log_file or LOGGING_SETTINGS["file"],
+            LOGGING_SETTINGS["max_bytes"],
+            LOGGING_SETTINGS["backup_count"],
+            LOGGING_SETTINGS["queue_size"],
+            LOGGING_SETTINGS["sampled_loggers"],
+            LOGGING_SETTINGS["sample_window"],
+            LOGGING_SETTINGS["sample_burst"]
         )
         
-        # إعداد معالج الملف
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setFormatter(formatter)
-        file_handler.setLevel(log_level)
-        
-        # إعداد معالج وحدة التحكم
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        console_handler.setLevel(log_level)
-        
-        # إعداد المسجل الرئيسي
-        logger = logging.getLogger()
-        logger.setLevel(log_level)
-        
-        # إزالة المعالجات القديمة
-        logger.handlers.clear()
-        
-        # إضافة المعالجات الجديدة
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-        
         logging.info("تم إعداد نظام التسجيل بنجاح")
+        return listener
         
     except Exception as e:
         print(f"خطأ في إعداد نظام التسجيل: {e}")
@@ -552,11 +543,16 @@ def parse_duration(duration_str: str) -> Optional[timedelta]:
         return None
 
 
+_action_limiters: Dict[tuple, TokenBucketLimiter] = {}
+
+
 async def rate_limit(user_id: int, action: str, limit: int = 5, window: int = 60) -> bool:
-    """تحديد معدل الاستخدام"""
-    # هذه دالة بسيطة، يمكن تطويرها باستخدام Redis أو قاعدة بيانات
-    # مؤقتاً نعيد True دائماً
-    return True
+    """تحديد معدل الاستخدام (True إذا كان مسموحاً للمستخدم تنفيذ الإجراء الآن)"""
+    key = (action, limit, window)
+    limiter = _action_limiters.get(key)
+    if limiter is None:
+        limiter = _action_limiters[key] = TokenBucketLimiter(limit / window, limit, max_keys=10000)
+    return limiter.consume(user_id)
 
 
 def generate_unique_id() -> str:
@@ -623,18 +619,14 @@ def convert_to_arabic_numbers(text: str) -> str:
         return text
 
 
+# جدول تحويل الأرقام العربية في مرور واحد على النص
+_ARABIC_TO_ENGLISH_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩', '0123456789')
+
+
 def convert_to_english_numbers(text: str) -> str:
     """تحويل الأرقام العربية إلى إنجليزية"""
     try:
-        arabic_to_english = {
-            '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
-            '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9'
-        }
-        
-        for ara, eng in arabic_to_english.items():
-            text = text.replace(ara, eng)
-        
-        return text
+        return text.translate(_ARABIC_TO_ENGLISH_DIGITS)
     except Exception:
         return text
 
@@ -3,8 +3,12 @@
 Keyboard Utilities
 """
 
+from typing import Optional
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 
+from utils.callback_router import CALLBACK_VERSION, pack_callback
+
 
 def get_main_keyboard():
     """لوحة المفاتيح الرئيسية"""
@@ -219,28 +223,43 @@ def get_confirmation_keyboard(confirm_data: str, cancel_data: str = "cancel"):
     return keyboard
 
 
-def get_pagination_keyboard(page: int, total_pages: int, callback_prefix: str):
-    """لوحة مفاتيح التصفح بين الصفحات"""
+def get_pagination_keyboard(page: int, total_pages: Optional[int], callback_prefix: str,
+                            prev_cursor: Optional[str] = None, next_cursor: Optional[str] = None,
+                            owner_id: Optional[int] = None, version: int = CALLBACK_VERSION):
+    """لوحة مفاتيح التصفح بين الصفحات (ترقيم مفتاحي عند تمرير total_pages=None مع المؤشرات)"""
+    # owner_id: صاحب الصفحات يسبق الحمولة حتى يرفض المعالج ضغطات غيره
     buttons = []
+    keyset = total_pages is None
+    owner = () if owner_id is None else (owner_id,)
     
     # زر الصفحة السابقة
-    if page > 1:
+    if keyset and prev_cursor is not None:
+        buttons.append(InlineKeyboardButton(
+            text="◀️ السابقة",
+            callback_data=pack_callback(callback_prefix, *owner, "prev", page - 1, prev_cursor, version=version)
+        ))
+    elif not keyset and page > 1:
         buttons.append(InlineKeyboardButton(
             text="◀️ السابقة", 
-            callback_data=f"{callback_prefix}_page_{page-1}"
+            callback_data=pack_callback(callback_prefix, *owner, "page", page - 1, version=version)
         ))
     
     # رقم الصفحة الحالية
     buttons.append(InlineKeyboardButton(
-        text=f"{page}/{total_pages}",
-        callback_data="current_page"
+        text=str(page) if keyset else f"{page}/{total_pages}",
+        callback_data=pack_callback("noop")
     ))
     
     # زر الصفحة التالية
-    if page < total_pages:
+    if keyset and next_cursor is not None:
+        buttons.append(InlineKeyboardButton(
+            text="▶️ التالية",
+            callback_data=pack_callback(callback_prefix, *owner, "next", page + 1, next_cursor, version=version)
+        ))
+    elif not keyset and page < total_pages:
         buttons.append(InlineKeyboardButton(
             text="▶️ التالية",
-            callback_data=f"{callback_prefix}_page_{page+1}"
+            callback_data=pack_callback(callback_prefix, *owner, "page", page + 1, version=version)
         ))
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[buttons])
@@ -0,0 +1,61 @@
+"""
+الأقفال المفهرسة - قفل غير متزامن لكل مستخدم أو قلعة يُحذف عند انتهاء استخدامه
+Keyed Locks - per-user/per-castle async locks released from memory when idle
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable, Iterable, List
+
+
+class KeyedLockManager:
+    """أقفال حسب المفتاح مع عداد مراجع: المدخل يُحذف بمجرد ألا يحمله أو ينتظره أحد"""
+
+    def __init__(self):
+        # المفتاح -> [القفل، عدد الحاملين والمنتظرين]
+        self._locks: Dict[Hashable, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def locked(self, key: Hashable) -> bool:
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    async def _acquire(self, key: Hashable) -> None:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            self._release_ref(key, entry)
+            raise
+
+    def _release_ref(self, key: Hashable, entry: list) -> None:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    def _release(self, key: Hashable) -> None:
+        entry = self._locks[key]
+        entry[0].release()
+        self._release_ref(key, entry)
+
+    @asynccontextmanager
+    async def hold(self, keys: Iterable[Hashable]) -> AsyncIterator[None]:
+        """حجز عدة مفاتيح معاً بترتيب ثابت حتى لا يتبادل تحديثان الانتظار (deadlock)"""
+        ordered: List[Hashable] = sorted(set(keys), key=repr)
+        acquired: List[Hashable] = []
+        try:
+            for key in ordered:
+                await self._acquire(key)
+                acquired.append(key)
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._release(key)
+
+
+user_locks = KeyedLockManager()
@@ -0,0 +1,103 @@
+"""
+مسار التسجيل غير الحاجب - طابور إلى خيط كتابة مع تدوير الملفات وأخذ العينات
+Non-blocking Logging Pipeline - queue listener thread, rotation and sampling
+"""
+
+import atexit
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Iterable, Tuple
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class SamplingFilter(logging.Filter):
+    """تحديد معدل السجلات لكل سطر تسجيل في المسجلات الصاخبة (الأخطاء لا تُسقط أبداً)"""
+
+    def __init__(self, logger_names: Iterable[str], window: float, burst: int):
+        super().__init__()
+        self.logger_names = frozenset(logger_names)
+        self.window = window
+        self.burst = burst
+        # (المسجل، قالب الرسالة) -> [بداية النافذة، عدد المسموح، عدد المُسقط]
+        self._windows: Dict[Tuple[str, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR or record.name not in self.logger_names:
+            return True
+
+        now = time.monotonic()
+        key = (record.name, record.msg)
+        state = self._windows.get(key)
+        if state is None or now - state[0] >= self.window:
+            dropped = state[2] if state else 0
+            self._windows[key] = [now, 1, 0]
+            if dropped:
+                record.msg = f"{record.msg} (أُسقطت {dropped} رسالة مماثلة)"
+            return True
+
+        if state[1] < self.burst:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """وضع السجلات في الطابور دون تنسيقها - التنسيق يتم في خيط الكتابة"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # الطابور داخل العملية نفسها فلا حاجة لدمج المعاملات هنا
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_queue_logging(level: int, log_file: str, max_bytes: int, backup_count: int,
+                        queue_size: int, sampled_loggers: Iterable[str] = (),
+                        sample_window: float = 60, sample_burst: int = 20) -> QueueListener:
+    """ربط المسجل الرئيسي بطابور وتشغيل خيط يكتب للملف ووحدة التحكم"""
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    # معالج ملف مع تدوير حسب الحجم
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+    file_handler.setFormatter(formatter)
+    file_handler.setLevel(level)
+
+    # معالج وحدة التحكم
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    console_handler.setLevel(level)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sampled_loggers, sample_window, sample_burst))
+
+    logger = logging.getLogger()
+    logger.setLevel(level)
+    logger.handlers.clear()
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    # تفريغ الطابور عند الخروج حتى لا تضيع آخر السجلات
+    atexit.register(stop_queue_logging, listener)
+    return listener
+
+
+def stop_queue_logging(listener: QueueListener) -> None:
+    """إيقاف خيط الكتابة بعد تفريغ الطابور (آمن عند الاستدعاء أكثر من مرة)"""
+    if listener._thread is not None:
+        listener.stop()
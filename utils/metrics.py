@@ -0,0 +1,222 @@
+"""
+مقاييس الأداء - زمن التحديثات واستعلامات قاعدة البيانات وطلبات تيليجرام
+Performance Metrics - update latency, DB queries and Telegram API calls
+"""
+
+import logging
+import re
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from config.settings import METRICS_SETTINGS
+
+# حدود مدرج الزمن بالثواني (بصيغة Prometheus)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OVERFLOW_LABEL = "other"
+
+
+@dataclass
+class UpdateTrace:
+    """ما استهلكه تحديث واحد من قاعدة البيانات وواجهة تيليجرام"""
+    db_queries: int = 0
+    db_time: float = 0.0
+    db_connections: int = 0
+    api_calls: int = 0
+    api_time: float = 0.0
+
+
+class CommandStats:
+    """مدرج الزمن والعدادات التراكمية لأمر واحد"""
+
+    def __init__(self, reservoir_size: int):
+        self.count = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.recent: Deque[float] = deque(maxlen=reservoir_size)
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.db_connections = 0
+        self.api_calls = 0
+        self.api_time = 0.0
+
+    def add(self, elapsed: float, trace: UpdateTrace, failed: bool) -> None:
+        self.count += 1
+        self.errors += failed
+        self.latency_sum += elapsed
+        self.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        self.recent.append(elapsed)
+        self.db_queries += trace.db_queries
+        self.db_time += trace.db_time
+        self.db_connections += trace.db_connections
+        self.api_calls += trace.api_calls
+        self.api_time += trace.api_time
+
+    def percentiles(self, *quantiles: float) -> List[float]:
+        """النسب المئوية من آخر القياسات المحفوظة"""
+        ordered = sorted(self.recent)
+        if not ordered:
+            return [0.0 for _ in quantiles]
+        return [ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in quantiles]
+
+
+def _normalize_sql(sql: str) -> str:
+    """توحيد نص الاستعلام ليُجمع في صف واحد مهما اختلفت المسافات"""
+    return re.sub(r"\s+", " ", sql).strip()[:160]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+class MetricsRegistry:
+    """سجل المقاييس في الذاكرة: لكل أمر مدرج زمن، ولكل استعلام زمن تراكمي"""
+
+    def __init__(self, reservoir_size: int = 1000, max_commands: int = 200, max_queries: int = 500):
+        self.reservoir_size = reservoir_size
+        self.max_commands = max_commands
+        self.max_queries = max_queries
+        self.commands: Dict[str, CommandStats] = {}
+        # الاستعلام الموحد -> [العدد، الزمن الكلي، أقصى زمن]
+        self.queries: Dict[str, list] = {}
+        self.started_at = time.time()
+        self._trace: ContextVar[Optional[UpdateTrace]] = ContextVar("update_trace", default=None)
+
+    def start_update(self):
+        """بدء تتبع تحديث جديد في السياق الحالي"""
+        return self._trace.set(UpdateTrace())
+
+    def current_trace(self) -> Optional[UpdateTrace]:
+        return self._trace.get()
+
+    def finish_update(self, token, label: str, elapsed: float, failed: bool = False) -> None:
+        """إغلاق تتبع التحديث وإضافته لإحصائيات الأمر"""
+        trace = self._trace.get() or UpdateTrace()
+        self._trace.reset(token)
+
+        stats = self.commands.get(label)
+        if stats is None:
+            if len(self.commands) >= self.max_commands:
+                label = OVERFLOW_LABEL
+                stats = self.commands.get(label)
+            if stats is None:
+                stats = self.commands[label] = CommandStats(self.reservoir_size)
+        stats.add(elapsed, trace, failed)
+
+    def record_connection(self) -> None:
+        trace = self._trace.get()
+        if trace is not None:
+            trace.db_connections += 1
+
+    def record_query(self, sql: str, elapsed: float) -> None:
+        """تسجيل استعلام واحد للتحديث الحالي ولجدول الاستعلامات البطيئة"""
+        trace = self._trace.get()
+        if trace is not None:
+            trace.db_queries += 1
+            trace.db_time += elapsed
+
+        key = _normalize_sql(sql)
+        entry = self.queries.get(key)
+        if entry is None:
+            if len(self.queries) >= self.max_queries:
+                return
+            entry = self.queries[key] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += elapsed
+        if elapsed > entry[2]:
+            entry[2] = elapsed
+
+    def record_api_call(self, elapsed: float) -> None:
+        trace = self._trace.get()
+        if trace is not None:
+            trace.api_calls += 1
+            trace.api_time += elapsed
+
+    def overall(self) -> CommandStats:
+        """دمج إحصائيات جميع الأوامر"""
+        total = CommandStats(self.reservoir_size * max(1, len(self.commands)))
+        for stats in self.commands.values():
+            total.count += stats.count
+            total.errors += stats.errors
+            total.latency_sum += stats.latency_sum
+            total.recent.extend(stats.recent)
+            total.db_queries += stats.db_queries
+            total.db_time += stats.db_time
+            total.db_connections += stats.db_connections
+            total.api_calls += stats.api_calls
+            total.api_time += stats.api_time
+        return total
+
+    def slow_queries(self, limit: int = 5) -> List[Tuple[str, int, float, float]]:
+        """أكثر الاستعلامات استهلاكاً للوقت: (الاستعلام، العدد، الزمن الكلي، أقصى زمن)"""
+        ranked = sorted(self.queries.items(), key=lambda item: item[1][1], reverse=True)
+        return [(sql, count, total, worst) for sql, (count, total, worst) in ranked[:limit]]
+
+    def render_prometheus(self) -> str:
+        """تصدير المقاييس بصيغة Prometheus النصية"""
+        lines = [
+            "# HELP bot_update_latency_seconds End-to-end update handling latency.",
+            "# TYPE bot_update_latency_seconds histogram",
+        ]
+        for label, stats in self.commands.items():
+            command = _escape_label(label)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(f'bot_update_latency_seconds_bucket{{command="{command}",le="{bound}"}} {cumulative}')
+            lines.append(f'bot_update_latency_seconds_bucket{{command="{command}",le="+Inf"}} {stats.count}')
+            lines.append(f'bot_update_latency_seconds_sum{{command="{command}"}} {stats.latency_sum:.6f}')
+            lines.append(f'bot_update_latency_seconds_count{{command="{command}"}} {stats.count}')
+
+        counters = (
+            ("bot_update_errors_total", "Updates whose handler raised.", "errors"),
+            ("bot_update_db_queries_total", "Database statements executed while handling updates.", "db_queries"),
+            ("bot_update_db_seconds_total", "Database time spent while handling updates.", "db_time"),
+            ("bot_update_db_connections_total", "Database connections opened while handling updates.", "db_connections"),
+            ("bot_update_api_calls_total", "Telegram API calls made while handling updates.", "api_calls"),
+            ("bot_update_api_seconds_total", "Telegram API time spent while handling updates.", "api_time"),
+        )
+        for name, help_text, attribute in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for label, stats in self.commands.items():
+                lines.append(f'{name}{{command="{_escape_label(label)}"}} {getattr(stats, attribute)}')
+
+        lines.append("# HELP bot_db_query_seconds_total Time spent per normalized query.")
+        lines.append("# TYPE bot_db_query_seconds_total counter")
+        for sql, count, total, _ in self.slow_queries(20):
+            lines.append(f'bot_db_query_seconds_total{{query="{_escape_label(sql)}"}} {total:.6f}')
+
+        lines.append("# HELP bot_uptime_seconds Seconds since the metrics registry was created.")
+        lines.append("# TYPE bot_uptime_seconds gauge")
+        lines.append(f"bot_uptime_seconds {time.time() - self.started_at:.0f}")
+        return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(registry: MetricsRegistry, host: str, port: int) -> Optional[web.AppRunner]:
+    """تشغيل خادم HTTP محلي يعرض /metrics"""
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    try:
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logging.info(f"📈 خادم المقاييس يعمل على http://{host}:{port}/metrics")
+        return runner
+    except Exception as e:
+        logging.error(f"خطأ في تشغيل خادم المقاييس: {e}")
+        return None
+
+
+metrics = MetricsRegistry(
+    METRICS_SETTINGS["reservoir_size"], METRICS_SETTINGS["max_commands"], METRICS_SETTINGS["max_queries"]
+)
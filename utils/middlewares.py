@@ -0,0 +1,266 @@
+"""
+الوسطاء (Middlewares) العامة للبوت
+Bot Middlewares
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+
+from config.hierarchy import has_permission, AdminLevel
+from config.settings import METRICS_SETTINGS
+from modules.chat_members import chat_members
+from modules.moderation_filter import moderation_filter
+from utils.callback_router import unpack_callback
+from utils.keyed_locks import KeyedLockManager, user_locks
+from utils.metrics import metrics
+from utils.text_normalizer import normalize_arabic, normalized_text
+from utils.throttling import TokenBucketLimiter
+
+
+class ChatActivityMiddleware(BaseMiddleware):
+    """تسجيل عضوية المرسل في المجموعة لكل رسالة (في الذاكرة، تُكتب دورياً)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Message) and event.chat.type in ("group", "supergroup"):
+            user = event.from_user
+            if user is not None and not user.is_bot:
+                chat_members.record(event.chat.id, user.id)
+        return await handler(event, data)
+
+
+class ModerationMiddleware(BaseMiddleware):
+    """تطبيق أقفال المجموعة والكلمات الممنوعة قبل وصول الرسالة للمعالجات"""
+
+    def __init__(self, edited: bool = False, flush_delay: float = 0.5):
+        self.edited = edited
+        self.flush_delay = flush_delay
+        self._pending: Dict[int, List[int]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, Message) or event.chat.type not in ("group", "supergroup"):
+            return await handler(event, data)
+
+        user = event.from_user
+        if user is None or user.is_bot or has_permission(user.id, AdminLevel.MODERATOR, event.chat.id):
+            return await handler(event, data)
+
+        try:
+            violation = moderation_filter.check(event.chat.id, event, self.edited)
+        except Exception as e:
+            logging.error(f"خطأ في فلتر الإشراف: {e}")
+            return await handler(event, data)
+
+        if violation is None:
+            return await handler(event, data)
+
+        reason, detail = violation
+        logging.info(f"حذف رسالة مخالفة ({reason}: {detail}) من {user.id} في {event.chat.id}")
+        self._queue_delete(data["bot"], event.chat.id, event.message_id)
+        return None
+
+    def _queue_delete(self, bot: Bot, chat_id: int, message_id: int) -> None:
+        """إضافة الرسالة لدفعة الحذف الخاصة بالمجموعة"""
+        pending = self._pending.get(chat_id)
+        if pending is None:
+            self._pending[chat_id] = [message_id]
+            asyncio.create_task(self._flush_later(bot, chat_id))
+        else:
+            pending.append(message_id)
+
+    async def _flush_later(self, bot: Bot, chat_id: int) -> None:
+        """حذف الرسائل المتراكمة دفعة واحدة (حتى 100 رسالة لكل طلب)"""
+        await asyncio.sleep(self.flush_delay)
+        message_ids = self._pending.pop(chat_id, [])
+        for start in range(0, len(message_ids), 100):
+            batch = message_ids[start:start + 100]
+            try:
+                await bot.delete_messages(chat_id, batch)
+            except Exception as e:
+                logging.error(f"خطأ في حذف الرسائل المخالفة في {chat_id}: {e}")
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """إسقاط رسائل وضغطات المستخدم المُغرق قبل أي قراءة من قاعدة البيانات"""
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.limiter = TokenBucketLimiter(settings["rate"], settings["burst"], settings["max_users"])
+
+    def cost(self, event: TelegramObject) -> float:
+        if isinstance(event, CallbackQuery):
+            return self.settings["callback_cost"]
+        text = event.text or event.caption or ""
+        first_word = text.split(maxsplit=1)[0] if text.strip() else ""
+        return self.settings["command_costs"].get(first_word, self.settings["default_cost"])
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = getattr(event, "from_user", None)
+        if user is None or user.is_bot:
+            return await handler(event, data)
+
+        cost = self.cost(event)
+        if self.limiter.consume(user.id, cost):
+            return await handler(event, data)
+
+        chat = event.message.chat if isinstance(event, CallbackQuery) and event.message else getattr(event, "chat", None)
+        chat_id = chat.id if chat is not None else None
+        # المشرفون لا يُحد معدلهم (فحص في الذاكرة فقط عند تجاوز الحد)
+        if has_permission(user.id, AdminLevel.MODERATOR, chat_id):
+            return await handler(event, data)
+
+        retry_after = max(1, round(self.limiter.retry_after(user.id, cost)))
+        if isinstance(event, CallbackQuery):
+            await event.answer(f"⏰ تمهل قليلاً، حاول بعد {retry_after} ثانية")
+        elif self.limiter.should_warn(user.id):
+            try:
+                await event.reply(f"⏰ أنت ترسل بسرعة كبيرة، سيتم تجاهل رسائلك لمدة {retry_after} ثانية")
+            except Exception as e:
+                logging.error(f"خطأ في إرسال تحذير الإغراق: {e}")
+        return None
+
+
+# كلمات الأوامر بعد التطبيع حتى تُجمع "ايداع" و"إيداع" تحت تسمية واحدة
+_COMMAND_WORDS = frozenset(normalize_arabic(word) for word in METRICS_SETTINGS["command_words"])
+
+
+def resolve_command_label(update: Update, answered: bool) -> str:
+    """تسمية التحديث بالأمر الذي نفذه (لتجميع المقاييس)"""
+    if update.callback_query is not None:
+        unpacked = unpack_callback(update.callback_query.data)
+        return f"callback:{unpacked[0] if unpacked else 'legacy'}"
+
+    message = update.message or update.edited_message
+    if message is None:
+        return update.event_type
+
+    if not message.text:
+        return f"message:{message.content_type}"
+    # رسالة لم يرد عليها البوت ليست أمراً - لا نضيف نصها كتسمية
+    if not answered:
+        return "message:unhandled"
+    first_word = message.text.split(maxsplit=1)[0] if message.text.strip() else ""
+    if first_word.startswith("/"):
+        # أوامر الشرطة التي رد عليها البوت مسجلة في المعالجات فعددها محدود
+        return first_word.split("@")[0][:32]
+    # الكلمة الأولى فقط ومن قائمة ثابتة: المبالغ ومعرفات القلاع لا تصبح تسميات
+    first_word = normalize_arabic(first_word)
+    return first_word if first_word in _COMMAND_WORDS else "message:other"
+
+
+class TextNormalizationMiddleware(BaseMiddleware):
+    """تطبيع نص الرسالة مرة واحدة وتمريره للمعالجات كـ normalized"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Message) and (event.text or event.caption):
+            # يُحفظ في سياق التحديث فتعيد normalized_text نفس النتيجة لأي وحدة تستدعيها
+            data["normalized"] = normalized_text(event)
+        return await handler(event, data)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """قياس زمن كل تحديث وعدد استعلاماته وطلبات تيليجرام التي أرسلها"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        token = metrics.start_update()
+        trace = metrics.current_trace()
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.finish_update(token, resolve_command_label(event, trace.api_calls > 0), elapsed, failed)
+
+
+def resolve_lock_keys(update: Update, max_keys: int = 4) -> List[tuple]:
+    """المفاتيح التي يجب حجزها للتحديث: المرسل والطرف المقابل (رد، معرف رقمي، قلعة مستهدفة)"""
+    if update.callback_query is not None:
+        return [("user", update.callback_query.from_user.id)]
+
+    message = update.message or update.edited_message
+    if message is None or message.from_user is None:
+        return []
+
+    keys = [("user", message.from_user.id)]
+    reply = message.reply_to_message
+    if reply is not None and reply.from_user is not None and not reply.from_user.is_bot:
+        keys.append(("user", reply.from_user.id))
+
+    words = (message.text or "").split()
+    if len(words) >= 2 and words[0] == "هجوم":
+        keys.append(("castle", words[1].upper()))
+    # معرفات المستخدمين المكتوبة في الأمر (تحويل، سرقة...) - المفتاح الزائد لا يضر
+    # isdecimal لا isdigit: الأرقام العلوية مثل ¹²³ أرقام لكن int() يرفضها
+    keys.extend(("user", int(word)) for word in words[1:] if word.isdecimal() and len(word) >= 6)
+    return keys[:max_keys]
+
+
+class UserLockMiddleware(BaseMiddleware):
+    """ترتيب تحديثات المستخدم الواحد وأطرافها المقابلة بينما تُعالج بقية التحديثات بالتوازي"""
+
+    def __init__(self, locks: KeyedLockManager = user_locks, max_keys: int = 4):
+        self.locks = locks
+        self.max_keys = max_keys
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        keys = resolve_lock_keys(event, self.max_keys) if isinstance(event, Update) else []
+        if not keys:
+            return await handler(event, data)
+        async with self.locks.hold(keys):
+            return await handler(event, data)
+
+
+class ApiCallMetricsMiddleware(BaseRequestMiddleware):
+    """عد طلبات واجهة تيليجرام وزمنها للتحديث الجاري"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod
+    ):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            metrics.record_api_call(time.perf_counter() - started)
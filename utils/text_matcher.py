@@ -0,0 +1,94 @@
+"""
+مطابقة الكلمات المفتاحية - مُطابق Aho-Corasick لأول كلمة محتواة مع قاموس للتطابق التام
+Keyword Matching - an Aho-Corasick automaton for the first contained keyword with an exact-match fast path
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+_NO_MATCH = 1 << 62
+
+
+class AhoCorasick:
+    """آلة Aho-Corasick تعيد أقل ترتيب لكلمة موجودة داخل النص في مرور واحد"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, int]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # أقل ترتيب لكلمة تنتهي عند العقدة أو عند أي لاحقة لها
+        self._best: List[int] = [_NO_MATCH]
+
+        for pattern, order in patterns:
+            node = 0
+            for char in pattern:
+                child = self._goto[node].get(char)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][char] = child
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(_NO_MATCH)
+                node = child
+            self._best[node] = min(self._best[node], order)
+
+        # بناء روابط الفشل بالعرض حتى تكون روابط الآباء جاهزة قبل الأبناء
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._best[child] = min(self._best[child], self._best[self._fail[child]])
+                queue.append(child)
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def first_match(self, text: str) -> Optional[int]:
+        """أقل ترتيب بين الكلمات الموجودة في النص (None إذا لم توجد أي كلمة)"""
+        goto, fail, best_at = self._goto, self._fail, self._best
+        best = best_at[0]
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if best_at[node] < best:
+                best = best_at[node]
+        return best if best != _NO_MATCH else None
+
+
+class KeywordMatcher:
+    """فهرس مُجمّع لكلمات مجموعة واحدة: أول كلمة مضافة موجودة في النص"""
+
+    def __init__(self, keywords: Iterable[str], normalize: Callable[[str], str] = str.lower):
+        self.keywords: List[str] = list(keywords)
+        self._normalize = normalize
+        # الكلمة بعد التطبيع -> أول ترتيب لها
+        first_order: Dict[str, int] = {}
+        for order, keyword in enumerate(self.keywords):
+            normalized = normalize(keyword).strip()
+            # كلمة فارغة بعد التطبيع كانت ستطابق كل رسالة
+            if normalized:
+                first_order.setdefault(normalized, order)
+        self._automaton = AhoCorasick(first_order.items())
+        # مسار سريع للرسالة المطابقة لكلمة تماماً: نتيجتها محسوبة مسبقاً بالمُطابق نفسه
+        # (كلمة أقدم قد تكون جزءاً منها) فلا يغير المسار السريع الأمر المختار
+        self._exact: Dict[str, int] = {
+            normalized: self._automaton.first_match(normalized) for normalized in first_order
+        }
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def match(self, text: str) -> Optional[str]:
+        """الكلمة المفتاحية المطابقة للنص أو None"""
+        return self.match_normalized(self._normalize(text).strip())
+
+    def match_normalized(self, text: str) -> Optional[str]:
+        """المطابقة على نص مطبّع مسبقاً بنفس دالة التطبيع"""
+        order = self._exact.get(text)
+        if order is None:
+            order = self._automaton.first_match(text)
+        return self.keywords[order] if order is not None else None
@@ -0,0 +1,110 @@
+"""
+تطبيع النص العربي - يُحسب مرة واحدة لكل تحديث وتستخدمه كل المطابقات
+Arabic Text Normalization - computed once per update and shared by every matcher
+"""
+
+import re
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import FrozenSet, Optional, Tuple, Union
+
+from aiogram.types import Message
+
+from utils.helpers import convert_to_english_numbers
+
+# توحيد أشكال الهمزة والألف المقصورة والتاء المربوطة وحذف التطويل والتشكيل
+_ARABIC_TABLE = str.maketrans(
+    {
+        "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+        "ؤ": "و", "ئ": "ي", "ى": "ي", "ة": "ه",
+        "ـ": None,
+        **{chr(code): None for code in range(0x064B, 0x0660)},
+        "ٰ": None,
+    }
+)
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_arabic(text: str) -> str:
+    """النص بأحرف صغيرة وأرقام إنجليزية وحروف عربية موحدة ومسافات مفردة"""
+    text = convert_to_english_numbers(text.lower()).translate(_ARABIC_TABLE)
+    return _SPACES.sub(" ", text).strip()
+
+
+@lru_cache(maxsize=1024)
+def _normalized_phrases(phrases: Tuple[str, ...]) -> Tuple[str, ...]:
+    """تطبيع عبارات الأوامر الثابتة مرة واحدة (بنفس ترتيبها وبدون تكرار)"""
+    return tuple(dict.fromkeys(normalize_arabic(phrase) for phrase in phrases))
+
+
+@dataclass(frozen=True)
+class NormalizedText:
+    """نص الرسالة بصيغه المختلفة: الأصلي، بأحرف صغيرة، والمطبّع مع كلماته"""
+
+    raw: str
+    lower: str  # للاستخراج: الأسماء والمبالغ تبقى كما كتبها المستخدم
+    words: Tuple[str, ...]
+    normalized: str  # للمطابقة فقط
+    tokens: Tuple[str, ...]
+    token_set: FrozenSet[str]
+
+    @classmethod
+    def from_text(cls, text: str) -> "NormalizedText":
+        lower = text.lower().strip()
+        normalized = normalize_arabic(text)
+        tokens = tuple(normalized.split())
+        return cls(text, lower, tuple(lower.split()), normalized, tokens, frozenset(tokens))
+
+    def equals(self, *phrases: str) -> bool:
+        """النص كاملاً يطابق إحدى العبارات بعد التطبيع"""
+        return self.normalized in _normalized_phrases(phrases)
+
+    def has_word(self, *words: str) -> bool:
+        """إحدى الكلمات موجودة ككلمة مستقلة في النص"""
+        return not self.token_set.isdisjoint(_normalized_phrases(words))
+
+    def has_phrase(self, *phrases: str) -> bool:
+        """إحدى العبارات موجودة بكلماتها كاملة (لا كجزء من كلمة أخرى)"""
+        padded = f" {self.normalized} "
+        return any(f" {phrase} " in padded for phrase in _normalized_phrases(phrases))
+
+    def contains(self, *phrases: str) -> bool:
+        """إحدى العبارات موجودة في أي موضع من النص"""
+        return any(phrase in self.normalized for phrase in _normalized_phrases(phrases))
+
+    def startswith(self, *prefixes: str) -> bool:
+        return self.normalized.startswith(_normalized_phrases(prefixes))
+
+    def starts_with_words(self, *prefixes: str) -> bool:
+        """النص هو البادئة نفسها أو يبدأ بها متبوعة بمسافة"""
+        return f"{self.normalized} ".startswith(tuple(f"{prefix} " for prefix in _normalized_phrases(prefixes)))
+
+    def strip_prefix(self, *prefixes: str) -> Optional[str]:
+        """باقي النص الأصلي بعد أول بادئة مطابقة بكلماتها (None إذا لم تطابق أي بادئة)"""
+        for prefix in _normalized_phrases(prefixes):
+            prefix_tokens = tuple(prefix.split())
+            if self.tokens[:len(prefix_tokens)] == prefix_tokens:
+                return " ".join(self.raw.split()[len(prefix_tokens):])
+        return None
+
+
+def as_normalized(text: Union[str, NormalizedText]) -> NormalizedText:
+    """قبول النص المطبّع مسبقاً من المعالج أو تطبيع نص عادي"""
+    return text if isinstance(text, NormalizedText) else NormalizedText.from_text(text or "")
+
+
+# النص المطبّع للتحديث الجاري - كل تحديث يُعالج في مهمة وسياق مستقلين
+_current: ContextVar[Optional[Tuple[Message, NormalizedText]]] = ContextVar("normalized_text", default=None)
+
+
+def normalized_text(message: Message) -> NormalizedText:
+    """النص المطبّع للرسالة، يُحسب أول مرة فقط خلال معالجة التحديث"""
+    cached = _current.get()
+    if cached is not None and cached[0] is message:
+        return cached[1]
+
+    normalized = NormalizedText.from_text(message.text or message.caption or "")
+    _current.set((message, normalized))
+    return normalized
@@ -0,0 +1,64 @@
+"""
+الحد من الإغراق - دلو رموز لكل مستخدم بذاكرة محدودة (إخراج الأقدم استخداماً)
+Anti-flood Throttling - per-key token buckets in a fixed-size LRU table
+"""
+
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class TokenBucketLimiter:
+    """دلو رموز لكل مفتاح: يمتلئ بمعدل ثابت حتى سعة الدفعة، وكل طلب يستهلك تكلفته"""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 50000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # المفتاح -> [الرموز المتبقية، آخر تحديث، هل أُرسل تحذير في هذه الموجة]
+        self._buckets: "OrderedDict[Hashable, list]" = OrderedDict()
+        self.allowed = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _bucket(self, key: Hashable, now: float) -> list:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                # المستخدم الأقدم نشاطاً دلوه ممتلئ غالباً فلا يضر نسيانه
+                self._buckets.popitem(last=False)
+            bucket = self._buckets[key] = [self.burst, now, False]
+            return bucket
+
+        self._buckets.move_to_end(key)
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        return bucket
+
+    def consume(self, key: Hashable, cost: float = 1, now: Optional[float] = None) -> bool:
+        """استهلاك رموز الطلب (False إذا لم يكفِ الرصيد - الطلب يُسقط ولا يُخصم شيء)"""
+        bucket = self._bucket(key, time.monotonic() if now is None else now)
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            bucket[2] = False
+            self.allowed += 1
+            return True
+        self.dropped += 1
+        return False
+
+    def should_warn(self, key: Hashable) -> bool:
+        """True مرة واحدة فقط لكل موجة إغراق حتى لا يتحول التحذير نفسه لإغراق"""
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket[2]:
+            return False
+        bucket[2] = True
+        return True
+
+    def retry_after(self, key: Hashable, cost: float = 1) -> float:
+        """الثواني حتى يكفي الرصيد لطلب بهذه التكلفة"""
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket[0] >= cost:
+            return 0.0
+        return (cost - bucket[0]) / self.rate
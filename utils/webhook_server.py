@@ -0,0 +1,168 @@
+"""
+خادم الـ webhook - استقبال التحديثات عبر aiohttp مع حد للتحديثات الجارية وإيقاف هادئ
+Webhook Server - aiohttp update intake with bounded in-flight work and graceful drain
+"""
+
+import asyncio
+import logging
+import secrets
+import signal
+from typing import Any, Dict, Optional, Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+HEALTH_PATH = "/health"
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """معالج طلبات الـ webhook: يرد فوراً ويعالج في الخلفية بحد أقصى للتحديثات الجارية والمنتظرة"""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: Optional[str] = None,
+                 max_in_flight: int = 32, max_pending: int = 500, drain_timeout: float = 30, **data: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token or None, **data)
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+        self.drain_timeout = drain_timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks: Set[asyncio.Task] = set()
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.draining = False
+
+    @property
+    def pending(self) -> int:
+        """تحديثات مقبولة لم تبدأ معالجتها بعد"""
+        return len(self._tasks) - self.in_flight
+
+    async def _process(self, bot: Bot, update: Dict[str, Any]) -> None:
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                await self._background_feed_update(bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"خطأ في معالجة تحديث webhook: {e}")
+            finally:
+                self.in_flight -= 1
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        # الضغط العكسي: رفض التحديث يجعل تيليجرام يعيد إرساله لاحقاً بدل تكديسه في الذاكرة
+        if self.draining or len(self._tasks) >= self.max_in_flight + self.max_pending:
+            self.rejected += 1
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        try:
+            update = await request.json(loads=bot.session.json_loads)
+        except ValueError:
+            return web.Response(status=400, text="Bad Request")
+
+        task = asyncio.create_task(self._process(bot, update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def drain(self) -> None:
+        """إيقاف قبول التحديثات وانتظار الجارية حتى المهلة ثم إلغاء الباقي"""
+        self.draining = True
+        if not self._tasks:
+            return
+
+        logging.info(f"⏳ إنهاء {len(self._tasks)} تحديث جارٍ قبل الإيقاف...")
+        done, not_done = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            await asyncio.gather(*not_done, return_exceptions=True)
+            logging.warning(f"⚠️ أُلغي {len(not_done)} تحديث لم ينتهِ خلال {self.drain_timeout} ثانية")
+
+    async def close(self) -> None:
+        # جلسة البوت تُغلق في main بعد انتهاء كل المهام الأخرى
+        await self.drain()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "status": "draining" if self.draining else "ok",
+            "in_flight": self.in_flight,
+            "pending": self.pending,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, settings: Dict[str, Any]) -> web.Application:
+    """بناء تطبيق aiohttp بمسار الـ webhook ومسار الفحص الصحي وأحداث بدء وإيقاف الموزع"""
+    # بدون رمز سري يقبل aiogram أي طلب، فيستطيع أي أحد حقن تحديثات بمرسل مزور
+    if not settings["secret_token"]:
+        raise ValueError("خادم الـ webhook يتطلب secret_token")
+
+    app = web.Application()
+    handler = BoundedRequestHandler(
+        dp, bot,
+        secret_token=settings["secret_token"],
+        max_in_flight=settings["max_in_flight"],
+        max_pending=settings["max_pending"],
+        drain_timeout=settings["drain_timeout"]
+    )
+    # التسجيل قبل setup_application حتى يُفرغ الطابور قبل حدث إيقاف الموزع
+    handler.register(app, path=settings["path"])
+    setup_application(app, dp, bot=bot)
+
+    async def handle_health(request: web.Request) -> web.Response:
+        stats = handler.stats()
+        return web.json_response(stats, status=503 if handler.draining else 200)
+
+    app.router.add_get(HEALTH_PATH, handle_health)
+    app["webhook_handler"] = handler
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, settings: Dict[str, Any]) -> None:
+    """تسجيل الـ webhook لدى تيليجرام وتشغيل الخادم حتى إشارة الإيقاف ثم الإيقاف الهادئ"""
+    if not settings["secret_token"]:
+        # رمز عشوائي لهذا التشغيل يُسجل مع الـ webhook أدناه فلا يعرفه إلا تيليجرام
+        settings = dict(settings, secret_token=secrets.token_urlsafe(32))
+        logging.warning("⚠️ لم يُحدد WEBHOOK_SECRET - تم توليد رمز سري عشوائي لهذا التشغيل")
+    app = build_webhook_app(dp, bot, settings)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, settings["host"], settings["port"]).start()
+    logging.info(f"🌐 خادم الـ webhook يعمل على {settings['host']}:{settings['port']}{settings['path']}")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # ويندوز لا يدعم معالجات الإشارات في الحلقة - يبقى KeyboardInterrupt
+            pass
+
+    try:
+        if settings["base_url"]:
+            await bot.set_webhook(
+                url=settings["base_url"].rstrip("/") + settings["path"],
+                secret_token=settings["secret_token"],
+                max_connections=settings["max_connections"],
+                allowed_updates=dp.resolve_used_update_types(),
+                drop_pending_updates=settings["drop_pending_updates"]
+            )
+            logging.info("✅ تم تسجيل الـ webhook لدى تيليجرام")
+        else:
+            logging.warning("⚠️ لم يُحدد WEBHOOK_BASE_URL - الخادم يعمل دون تسجيل الـ webhook")
+
+        await stop_event.wait()
+        logging.info("🛑 استلام إشارة الإيقاف، جارٍ إنهاء التحديثات الجارية...")
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
+        # يوقف استقبال الاتصالات ثم يستدعي on_shutdown (التفريغ ثم إيقاف الموزع)
+        await runner.cleanup()